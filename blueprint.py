@@ -19,15 +19,22 @@
 # SOFTWARE.
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import graphene
 from flask import Blueprint
-from flask_graphql import GraphQLView
 
 from lmcommon.configuration import Configuration
 from lmsrvcore.middleware import AuthorizationMiddleware, LabBookLoaderMiddleware, time_all_resolvers_middleware, \
-    error_middleware
+    ErrorLoggingMiddleware, ResolverProfilerMiddleware
+from lmsrvcore.middleware.metric import RESOLVER_PROFILER_REQUEST_SAMPLE_RATE
+from lmsrvcore.view import LabManagerGraphQLView, CachedGraphQLBackend, AdmissionController, persisted_query_store
+from lmsrvcore.view.cost import QUERY_COST_BUDGET, QUERY_COST_QUEUE_THRESHOLD
+from lmsrvcore.view.executor import RESOLVER_POOL_MAX_WORKERS
 from lmsrvlabbook.api import LabbookQuery, LabbookMutations
+from lmsrvlabbook.dataloader.state import LabBookStateFingerprinter
+from lmsrvlabbook.files.download import download_file
+from lmsrvlabbook.files.manifest import section_manifest
 
 
 # ** This blueprint is the combined full LabBook service with all components served together from a single schema ** #
@@ -42,16 +49,58 @@ complete_labbook_service = Blueprint('complete_labbook_service', __name__)
 # Create Schema
 full_schema = graphene.Schema(query=LabbookQuery, mutation=LabbookMutations)
 
+# Parsed and validated documents are cached across requests, and executed subject to query cost admission control
+admission_controller = AdmissionController(budget=config.config["flask"].get("query_cost_budget", QUERY_COST_BUDGET),
+                                           queue_threshold=config.config["flask"].get("query_cost_queue_threshold",
+                                                                                      QUERY_COST_QUEUE_THRESHOLD))
+document_backend = CachedGraphQLBackend(admission=admission_controller)
+
+# Opt-in concurrent execution of blocking resolver work
+resolver_pool = None
+if config.config["flask"].get("concurrent_resolvers", False):
+    resolver_pool = ThreadPoolExecutor(max_workers=config.config["flask"].get("resolver_pool_max_workers",
+                                                                              RESOLVER_POOL_MAX_WORKERS))
+
+# Pin the queries shipped with the UI, if a persisted query manifest is configured
+persisted_queries_file = config.config["flask"].get("persisted_queries_file")
+if persisted_queries_file and os.path.exists(persisted_queries_file):
+    persisted_query_store.load(persisted_queries_file)
+
 # Add route and require authentication
 complete_labbook_service.add_url_rule(f'{config.config["proxy"]["labmanager_api_prefix"]}/labbook/',
-                                      view_func=GraphQLView.as_view('graphql', schema=full_schema,
-                                                                    graphiql=config.config["flask"]["DEBUG"],
-                                                                    middleware=[error_middleware,
-                                                                                #time_all_resolvers_middleware,
-                                                                                AuthorizationMiddleware(),
-                                                                                LabBookLoaderMiddleware()]),
+                                      view_func=LabManagerGraphQLView.as_view(
+                                          'graphql', schema=full_schema,
+                                          graphiql=config.config["flask"]["DEBUG"],
+                                          backend=document_backend,
+                                          resolver_pool=resolver_pool,
+                                          persisted_queries_only=config.config["flask"].get("persisted_queries_only",
+                                                                                            False),
+                                          request_middleware=[ErrorLoggingMiddleware(),
+                                                              AuthorizationMiddleware(),
+                                                              LabBookLoaderMiddleware()],
+                                          # Per-field middleware, e.g. time_all_resolvers_middleware, slows down every
+                                          # resolved field. The profiler is only attached to a sample of requests.
+                                          profiler=ResolverProfilerMiddleware(),
+                                          profiler_sample_rate=config.config["flask"].get(
+                                              "resolver_profiler_sample_rate", RESOLVER_PROFILER_REQUEST_SAMPLE_RATE),
+                                          # Polled queries are answered with 304 Not Modified while the state they
+                                          # read is unchanged
+                                          etag_provider=LabBookStateFingerprinter()
+                                          if config.config["flask"].get("conditional_requests", True) else None),
                                       methods=['GET', 'POST', 'OPTION'])
 
+# Authenticated file downloads, streamed from disk with support for Range and conditional requests
+complete_labbook_service.add_url_rule(f'{config.config["proxy"]["labmanager_api_prefix"]}/download/<owner>/'
+                                      '<labbook_name>/<section>/<path:key>',
+                                      view_func=download_file,
+                                      methods=['GET', 'HEAD'])
+
+# Manifest of a section as newline-delimited JSON, streamed from the file index
+complete_labbook_service.add_url_rule(f'{config.config["proxy"]["labmanager_api_prefix"]}/manifest/<owner>/'
+                                      '<labbook_name>/<section>',
+                                      view_func=section_manifest,
+                                      methods=['GET'])
+
 
 if __name__ == '__main__':
     # If the blueprint file is executed directly, generate a schema file
@@ -1 +1,4 @@
 from lmsrvcore.api.connections.list import ListBasedConnection
+from lmsrvcore.api.connections.keyset import KeysetConnection, decode_key_cursor, encode_key_cursor
+from lmsrvcore.api.connections.sequence import CountedConnection, SequenceConnection, decode_offset_cursor, \
+    encode_offset_cursor
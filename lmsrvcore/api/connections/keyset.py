@@ -0,0 +1,173 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import base64
+import binascii
+import itertools
+from typing import Any, Callable, Iterator, Optional
+
+import graphene
+
+
+def encode_key_cursor(key: str) -> str:
+    """Method to encode a sort key as an opaque cursor
+
+    Args:
+        key(str): The sort key of an edge
+
+    Returns:
+        str
+    """
+    return base64.b64encode(key.encode('utf-8')).decode('utf-8')
+
+
+def decode_key_cursor(cursor: str, name: str = 'after') -> str:
+    """Method to decode a cursor created by encode_key_cursor
+
+    Args:
+        cursor(str): The cursor
+        name(str): Name of the argument the cursor was passed in, for the error message
+
+    Returns:
+        str
+    """
+    try:
+        return base64.b64decode(cursor.encode('utf-8'), validate=True).decode('utf-8')
+    except (binascii.Error, UnicodeDecodeError, AttributeError):
+        raise ValueError(f"`{name}` cursor is invalid")
+
+
+class KeysetConnection(object):
+    def __init__(self, forward: Callable[[Optional[str]], Iterator[Any]], args: dict,
+                 key: Callable[[Any], str] = lambda edge: edge['key'],
+                 backward: Optional[Callable[[Optional[str]], Iterator[Any]]] = None,
+                 position: Callable[[str], Any] = lambda key: key, descending: bool = False) -> None:
+        """Class to provide Relay compliant keyset pagination, reading only the edges of the requested page
+
+        Cursors encode the sort key of an edge rather than its position, so they stay valid when edges are added or
+        removed. The edge source must be able to seek: `forward(after_key)` iterates edges in order, starting after
+        `after_key` (or from the beginning if None). `backward(before_key)` iterates in reverse order starting before
+        `before_key`. If `backward` is not provided, paging with `last` reads the full listing.
+
+        A page ends at the `before` (or, paging backward, `after`) cursor by comparing positions, so it still ends in
+        the right place if the cursor's edge has since been removed. `position(key)` must increase along the forward
+        order, or decrease if `descending` is set.
+
+        Args:
+            forward(callable): Function returning an iterator of edges after a key
+            args(dict): The input arguments to the resolve method
+            key(callable): Function returning the sort key of an edge
+            backward(callable): Function returning a reverse iterator of edges before a key
+            position(callable): Function returning a comparable position for a sort key. Defaults to the key itself.
+            descending(bool): If True, positions decrease along the forward order
+
+        Returns:
+            KeysetConnection
+        """
+        self.forward = forward
+        self.backward = backward
+        self.key = key
+        self.position = position
+        self.descending = descending
+        self.args = args
+        self.edges = list()
+        self.cursors = list()
+        self.page_info = None
+
+    def _precedes(self, key: str, other_key: str) -> bool:
+        # True if `key` comes before `other_key` in the forward order
+        if self.descending:
+            return self.position(key) > self.position(other_key)
+        return self.position(key) < self.position(other_key)
+
+    def _reverse(self, before_key: Optional[str]) -> Iterator[Any]:
+        if self.backward is not None:
+            return self.backward(before_key)
+
+        edges = list()
+        for edge in self.forward(None):
+            if before_key is not None and not self._precedes(self.key(edge), before_key):
+                break
+            edges.append(edge)
+        return reversed(edges)
+
+    def apply(self):
+        """Method to read the requested page of edges
+
+        Returns:
+            None
+        """
+        if "first" in self.args and "last" in self.args:
+            raise ValueError("`first` and `last` arguments cannot be used together")
+
+        # Verify valid slicing args
+        if "first" in self.args:
+            if int(self.args["first"]) < 0:
+                raise ValueError("`first` must be greater than 0")
+        if "last" in self.args:
+            if int(self.args["last"]) < 0:
+                raise ValueError("`last` must be greater than 0")
+
+        after_key = decode_key_cursor(self.args["after"], "after") if "after" in self.args else None
+        before_key = decode_key_cursor(self.args["before"], "before") if "before" in self.args else None
+
+        has_next_page = False
+        has_previous_page = False
+        if "last" in self.args:
+            # Read backwards from `before`, stopping at `after`
+            stop_key = after_key
+            edges = self._reverse(before_key)
+            limit = int(self.args["last"])
+        else:
+            stop_key = before_key
+            edges = self.forward(after_key)
+            limit = int(self.args["first"]) if "first" in self.args else None
+
+        if stop_key is not None:
+            if "last" in self.args:
+                edges = itertools.takewhile(lambda e: self._precedes(stop_key, self.key(e)), edges)
+            else:
+                edges = itertools.takewhile(lambda e: self._precedes(self.key(e), stop_key), edges)
+
+        if limit is None:
+            page = list(edges)
+        else:
+            # Read one extra edge to know if there is another page
+            page = list(itertools.islice(edges, limit + 1))
+            if len(page) > limit:
+                page = page[:limit]
+                # An empty page (first or last is 0) reports no further pages, like ListBasedConnection
+                if page and "last" in self.args:
+                    has_previous_page = True
+                elif page:
+                    has_next_page = True
+
+        if "last" in self.args:
+            page.reverse()
+
+        self.edges = page
+        self.cursors = [encode_key_cursor(self.key(edge)) for edge in page]
+
+        if len(self.edges) == 0:
+            start_cursor, end_cursor = None, None
+        else:
+            start_cursor, end_cursor = self.cursors[0], self.cursors[-1]
+
+        self.page_info = graphene.relay.PageInfo(has_next_page=has_next_page, has_previous_page=has_previous_page,
+                                                 start_cursor=start_cursor, end_cursor=end_cursor)
@@ -0,0 +1,155 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import base64
+import binascii
+from typing import Any, Sequence
+
+import graphene
+
+
+def encode_offset_cursor(offset: int) -> str:
+    """Method to encode a position in a list as an opaque cursor
+
+    Args:
+        offset(int): Index of the edge
+
+    Returns:
+        str
+    """
+    return base64.b64encode(str(offset).encode('utf-8')).decode('utf-8')
+
+
+def decode_offset_cursor(cursor: str, length: int, name: str = 'after') -> int:
+    """Method to decode and validate a cursor created by encode_offset_cursor, without listing any cursors
+
+    Args:
+        cursor(str): The cursor
+        length(int): Number of edges in the connection
+        name(str): Name of the argument the cursor was passed in, for the error message
+
+    Returns:
+        int
+    """
+    try:
+        offset = int(base64.b64decode(cursor.encode('utf-8'), validate=True).decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError, AttributeError, ValueError):
+        raise ValueError(f"`{name}` cursor is invalid")
+
+    if not 0 <= offset < length:
+        raise ValueError(f"`{name}` cursor is invalid")
+    return offset
+
+
+class CountedConnection(graphene.relay.Connection):
+    """A Connection that can also report the total number of edges, ignoring paging arguments
+
+    `total_count` may be set to an int or to a callable, so that it is only computed when the field is selected.
+    """
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int()
+
+    def resolve_total_count(self, info):
+        if callable(self.total_count):
+            return self.total_count()
+        return self.total_count
+
+
+class SequenceConnection(object):
+    def __init__(self, source: Sequence[Any], args: dict) -> None:
+        """Class to provide Relay compliant pagination over a sequence, touching only the edges of the requested page
+
+        Cursors are the base64 encoded position of an edge, which is the format used by ListBasedConnection, so
+        cursors issued by either class are accepted by the other. They are decoded directly to an offset and
+        validated against the length of the source, so no list of cursors is built. The source only needs to support
+        len() and slicing, so it can be a lazy sequence that loads just the slice it is asked for.
+
+        Args:
+            source(sequence): The edge data
+            args(dict): The input arguments to the resolve method
+
+        Returns:
+            SequenceConnection
+        """
+        self.source = source
+        self.args = args
+        self.edges: Sequence[Any] = list()
+        self.cursors: Sequence[str] = list()
+        self.page_info = None
+
+    @property
+    def total_count(self) -> int:
+        """Number of edges in the connection, ignoring the paging arguments"""
+        return len(self.source)
+
+    def apply(self):
+        """Method to slice the source and apply cursors to the returned edges
+
+        Returns:
+            None
+        """
+        if "first" in self.args and "last" in self.args:
+            raise ValueError("`first` and `last` arguments cannot be used together")
+
+        # Verify valid slicing args
+        if "first" in self.args:
+            if int(self.args["first"]) < 0:
+                raise ValueError("`first` must be greater than 0")
+        if "last" in self.args:
+            if int(self.args["last"]) < 0:
+                raise ValueError("`last` must be greater than 0")
+
+        # Apply cursor filters
+        length = len(self.source)
+        start, stop = 0, length
+        if "after" in self.args:
+            start = decode_offset_cursor(self.args["after"], length, 'after') + 1
+        if "before" in self.args:
+            stop = decode_offset_cursor(self.args["before"], length, 'before')
+        stop = max(start, stop)
+
+        pre_slice_len = stop - start
+
+        # Apply slicing filters
+        if "first" in self.args:
+            stop = min(stop, start + int(self.args["first"]))
+        if "last" in self.args:
+            start = max(start, stop - int(self.args["last"]))
+
+        self.edges = self.source[start:stop]
+        self.cursors = [encode_offset_cursor(offset) for offset in range(start, stop)]
+
+        # Compute page info status
+        has_previous_page = False
+        if "last" in self.args and stop > start and pre_slice_len > int(self.args["last"]):
+            has_previous_page = True
+
+        has_next_page = False
+        if "first" in self.args and stop > start and pre_slice_len > int(self.args["first"]):
+            has_next_page = True
+
+        if self.cursors:
+            start_cursor, end_cursor = self.cursors[0], self.cursors[-1]
+        else:
+            start_cursor, end_cursor = None, None
+
+        self.page_info = graphene.relay.PageInfo(has_next_page=has_next_page, has_previous_page=has_previous_page,
+                                                 start_cursor=start_cursor, end_cursor=end_cursor)
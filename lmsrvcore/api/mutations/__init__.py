@@ -1 +1,3 @@
+from lmsrvcore.api.mutations.chunkmanifest import ChunkManifest
+from lmsrvcore.api.mutations.staging import UploadStagingManager, upload_staging
 from lmsrvcore.api.mutations.chunkupload import ChunkUploadInput, ChunkUploadMutation
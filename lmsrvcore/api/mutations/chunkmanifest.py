@@ -0,0 +1,291 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import fcntl
+import hashlib
+import os
+import struct
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from lmcommon.logging import LMLogger
+
+logger = LMLogger.get_logger()
+
+# Manifest header: magic, total number of chunks, chunk size in bytes
+_HEADER = struct.Struct('<4sQQ')
+_MAGIC = b'LMCU'
+
+# Magic of the manifest of a completed upload, which is kept so late duplicate chunks do not start a new upload
+_COMPLETED_MAGIC = b'LMCD'
+
+# Size of the SHA-256 digest stored for every chunk
+CHUNK_DIGEST_SIZE = 32
+
+# Maximum number of uploads a running whole-file hash is kept for in each process
+RUNNING_HASH_MAX_UPLOADS = 64
+
+
+class ChunkManifest(object):
+    """A per-upload manifest recording which chunks of a chunked upload have been written
+
+    The manifest is a small binary file holding the upload's chunk count and chunk size, followed by a bitmap with one
+    bit per chunk and the SHA-256 digest of every chunk. Every update happens under an exclusive flock, so chunks of
+    the same upload can be written by concurrent requests, in any order, in any number of server threads or processes.
+    The request that records the last missing chunk claims the upload by marking the manifest completed, so the
+    completed upload is processed exactly once. The completed manifest is left in place until the staging reaper
+    removes it, so a retried chunk arriving after completion is rejected rather than starting a new, empty upload.
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    @contextmanager
+    def _locked(self, create: bool = False) -> Iterator[int]:
+        try:
+            fd = os.open(self.path, os.O_RDWR | (os.O_CREAT if create else 0), 0o600)
+        except FileNotFoundError:
+            raise ValueError("Upload is not in progress or has already completed")
+
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if os.fstat(fd).st_nlink == 0:
+                # Claimed by another request while waiting for the lock
+                raise ValueError("Upload has already completed")
+            yield fd
+        finally:
+            # Closing the descriptor releases the lock
+            os.close(fd)
+
+    @staticmethod
+    def _read(fd: int) -> Tuple[int, int, bytearray]:
+        header = os.pread(fd, _HEADER.size, 0)
+        if len(header) < _HEADER.size:
+            # Created by a request that has not written the header yet, or that failed before doing so
+            raise ValueError("Upload has not started")
+
+        magic, total_chunks, chunk_size = _HEADER.unpack(header)
+        if magic == _COMPLETED_MAGIC:
+            raise ValueError("Upload has already completed")
+        if magic != _MAGIC:
+            raise ValueError("Upload manifest is corrupt")
+        bitmap = bytearray(os.pread(fd, (total_chunks + 7) // 8, _HEADER.size))
+        return total_chunks, chunk_size, bitmap
+
+    @staticmethod
+    def _count(bitmap: bytearray) -> int:
+        return sum(bin(b).count('1') for b in bitmap)
+
+    def begin(self, data_path: str, total_chunks: int, chunk_size: int) -> None:
+        """Method to create the manifest and preallocate the upload's data file, or validate an existing manifest
+
+        Args:
+            data_path(str): Absolute path of the file the chunks are written into
+            total_chunks(int): Number of chunks in the upload
+            chunk_size(int): Size of every chunk but the last, in bytes
+
+        Returns:
+            None
+        """
+        with self._locked(create=True) as fd:
+            if os.fstat(fd).st_size == 0:
+                # Size the data file for every chunk up front, so chunks can be written at their offset in any order.
+                # It is truncated to the real size once the last chunk is written.
+                try:
+                    data_fd = os.open(data_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                except FileExistsError:
+                    # Never clobber a data file this manifest does not describe, e.g. one left by an interrupted upload
+                    os.unlink(self.path)
+                    raise ValueError("Upload data already exists, restart the upload with a new upload id")
+
+                try:
+                    try:
+                        os.posix_fallocate(data_fd, 0, total_chunks * chunk_size)
+                    except (AttributeError, OSError):
+                        # Not supported on every platform and filesystem. A sparse file works just as well.
+                        os.ftruncate(data_fd, total_chunks * chunk_size)
+                finally:
+                    os.close(data_fd)
+
+                os.pwrite(fd, _HEADER.pack(_MAGIC, total_chunks, chunk_size) +
+                          bytes((total_chunks + 7) // 8 + total_chunks * CHUNK_DIGEST_SIZE), 0)
+                return
+
+            existing_total, existing_size, _ = self._read(fd)
+            if (existing_total, existing_size) != (total_chunks, chunk_size):
+                raise ValueError("Chunk parameters do not match the upload in progress")
+
+    def add_chunk(self, chunk_index: int, digest: bytes) -> Optional[List[bytes]]:
+        """Method to record that a chunk has been written
+
+        Args:
+            chunk_index(int): Index of the chunk, starting at 0
+            digest(bytes): SHA-256 digest of the chunk
+
+        Returns:
+            list(bytes): If this was the last missing chunk, the digests of all chunks in order. The manifest is marked
+                         completed and the caller owns the upload. Otherwise None.
+        """
+        with self._locked() as fd:
+            total_chunks, _, bitmap = self._read(fd)
+            if not 0 <= chunk_index < total_chunks:
+                raise ValueError("Invalid args. chunk_index >= total_chunks")
+
+            digests_offset = _HEADER.size + len(bitmap)
+            os.pwrite(fd, digest, digests_offset + chunk_index * CHUNK_DIGEST_SIZE)
+
+            byte_index = chunk_index // 8
+            bitmap[byte_index] |= 1 << (chunk_index % 8)
+            os.pwrite(fd, bytes(bitmap[byte_index:byte_index + 1]), _HEADER.size + byte_index)
+
+            if self._count(bitmap) == total_chunks:
+                digests = os.pread(fd, total_chunks * CHUNK_DIGEST_SIZE, digests_offset)
+                os.pwrite(fd, _HEADER.pack(_COMPLETED_MAGIC, total_chunks, 0), 0)
+                os.ftruncate(fd, _HEADER.size)
+                return [digests[i:i + CHUNK_DIGEST_SIZE] for i in range(0, len(digests), CHUNK_DIGEST_SIZE)]
+            return None
+
+    def status(self) -> Dict[str, Any]:
+        """Method to get the chunk count, chunk size and received chunks of the upload
+
+        Returns:
+            dict
+        """
+        with self._locked() as fd:
+            total_chunks, chunk_size, bitmap = self._read(fd)
+        return {"total_chunks": total_chunks,
+                "chunk_size": chunk_size,
+                "received_chunks": [i for i in range(total_chunks) if bitmap[i // 8] & (1 << (i % 8))]}
+
+    def received_chunks(self) -> List[int]:
+        """Method to list the chunks that have been written so far
+
+        Returns:
+            list(int)
+        """
+        return self.status()['received_chunks']
+
+
+def write_chunk(data_path: str, offset: int, data: bytes) -> None:
+    """Method to write a chunk into an upload's data file at its offset
+
+    Args:
+        data_path(str): Absolute path of the preallocated data file
+        offset(int): Offset of the chunk in bytes
+        data(bytes): Contents of the chunk
+
+    Returns:
+        None
+    """
+    fd = os.open(data_path, os.O_WRONLY)
+    try:
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+    finally:
+        os.close(fd)
+
+
+class RunningHashes(object):
+    """In-process, running SHA-256 hashes of the uploads whose chunks arrive in order
+
+    A hash advances only when the next chunk of its upload arrives, so the file never has to be read again to hash it.
+    As soon as a chunk arrives out of order, in parallel, or in another process, the upload's running hash is dropped
+    and the whole-file hash is instead derived from the per-chunk digests in the ChunkManifest.
+    """
+    def __init__(self, max_uploads: int = RUNNING_HASH_MAX_UPLOADS) -> None:
+        self.max_uploads = max_uploads
+        self._hashes: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def update(self, key: str, chunk_index: int, data: bytes) -> None:
+        """Method to advance the running hash of an upload with a chunk that has been written
+
+        Args:
+            key(str): Unique key of the upload
+            chunk_index(int): Index of the chunk, starting at 0
+            data(bytes): Contents of the chunk
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if chunk_index == 0:
+                entry = [0, hashlib.sha256()]
+                self._hashes[key] = entry
+                while len(self._hashes) > self.max_uploads:
+                    self._hashes.popitem(last=False)
+            else:
+                entry = self._hashes.get(key)
+                if entry is None or entry[0] != chunk_index:
+                    self._hashes.pop(key, None)
+                    return
+
+            # Claim the next index before hashing, so a concurrent chunk drops the hash rather than skipping ahead
+            entry[0] = None
+        digest = entry[1]
+        digest.update(data)
+        with self._lock:
+            if self._hashes.get(key) is entry:
+                entry[0] = chunk_index + 1
+
+    def pop(self, key: str, total_chunks: int) -> Optional[str]:
+        """Method to remove the running hash of a completed upload
+
+        Args:
+            key(str): Unique key of the upload
+            total_chunks(int): Number of chunks in the upload
+
+        Returns:
+            str: The hex SHA-256 of the whole file, or None if its chunks did not all arrive in order
+        """
+        with self._lock:
+            entry = self._hashes.pop(key, None)
+        if entry is None or entry[0] != total_chunks:
+            return None
+        return entry[1].hexdigest()
+
+
+# Process-wide running upload hashes
+running_hashes = RunningHashes()
+
+
+def upload_hash(running_digest: Optional[str], chunk_digests: List[bytes], chunk_size: int) -> str:
+    """Method to get the whole-file hash of a completed upload
+
+    If the chunks arrived in order, or there is only one chunk, this is the SHA-256 of the file, as `sha256:<hex>`.
+    Otherwise it is the SHA-256 of the concatenated per-chunk digests, as `sha256-chunked-<chunk_size>:<hex>`, which
+    is just as strong for verifying the file but only comparable with hashes computed with the same chunk size.
+
+    Args:
+        running_digest(str): The running hex SHA-256 of the file, if its chunks arrived in order
+        chunk_digests(list(bytes)): SHA-256 digest of every chunk, in order
+        chunk_size(int): Size of every chunk but the last, in bytes
+
+    Returns:
+        str
+    """
+    if running_digest:
+        return f"sha256:{running_digest}"
+    if len(chunk_digests) == 1:
+        return f"sha256:{chunk_digests[0].hex()}"
+    return f"sha256-chunked-{chunk_size}:{hashlib.sha256(b''.join(chunk_digests)).hexdigest()}"
@@ -20,11 +20,15 @@
 import graphene
 import abc
 
+import hashlib
 import os
-import tempfile
 from lmcommon.logging import LMLogger
 from werkzeug.utils import secure_filename
 
+from lmsrvcore.api.mutations.chunkmanifest import ChunkManifest, running_hashes, upload_hash, write_chunk
+from lmsrvcore.api.mutations.staging import MANIFEST_SUFFIX, upload_staging
+from lmsrvcore.auth.user import get_logged_in_username
+
 
 logger = LMLogger.get_logger()
 
@@ -44,7 +48,8 @@ class ChunkUploadInput(graphene.InputObjectType):
     # Total number of chunks in the file
     total_chunks = graphene.Int(required=True)
 
-    # An index value for which chunk is currently being uploaded, starting at 0
+    # An index value for which chunk is currently being uploaded, starting at 0. Chunks may be sent in any order and
+    # in parallel.
     chunk_index = graphene.Int(required=True)
 
     # The name of the file being uploaded
@@ -53,10 +58,18 @@ class ChunkUploadInput(graphene.InputObjectType):
     # A UUID for an entire upload job
     upload_id = graphene.String(required=True)
 
+    # Optional hex encoded SHA-256 of this chunk. If set, the chunk is rejected if it does not match.
+    chunk_checksum = graphene.String(required=False)
+
 
 class ChunkUploadMutation(object):
     """Abstract class for performing chunked uploads
 
+    Every chunk is written at its offset into a preallocated file, and a per-upload ChunkManifest records which chunks
+    have arrived, so chunks can be sent in parallel and in any order. The request that delivers the last missing chunk
+    calls `mutate_and_process_upload`, with the path of the assembled file, the desired filename, and the whole-file
+    hash computed while the chunks were written (see `upload_hash`).
+
     To use, inherit from this class when writing your mutation and add the required ChunkUploadInput field:
 
         from lmsrvcore.api.mutations import ChunkUploadMutation, ChunkUploadInput
@@ -66,7 +79,7 @@ class ChunkUploadMutation(object):
                 chunk_upload_params = ChunkUploadInput(required=True)
 
             @classmethod
-            def mutate_and_process_upload(cls, input, context, info):
+            def mutate_and_process_upload(cls, info, upload_file_path, upload_filename, upload_hash, **kwargs):
                 ...
                 return MyMutation()
 
@@ -76,12 +89,6 @@ class ChunkUploadMutation(object):
     class Arguments:
         chunk_upload_params = ChunkUploadInput(required=True)
 
-    # The uploaded temporary absolute file path
-    upload_file_path = None
-
-    # The desired filename
-    filename = None
-
     @staticmethod
     def validate_args(args):
         """Method to validate the input chunking arguments"""
@@ -103,11 +110,51 @@ class ChunkUploadMutation(object):
             logger.info(f"Renaming unsafe filename `{filename}` to `{safe_fname}`")
         return safe_fname
 
+    @staticmethod
+    def get_staging_directory():
+        """Method to get the directory the logged in user's uploads are assembled in, creating it if needed"""
+        return upload_staging.directory(ChunkUploadMutation.py_secure_filename(get_logged_in_username()))
+
     @staticmethod
     def get_temp_filename(upload_id, filename):
         """Method to generate the temporary filename"""
-        return os.path.join(tempfile.gettempdir(), "{}-{}".format(ChunkUploadMutation.py_secure_filename(upload_id),
-                                                                  ChunkUploadMutation.py_secure_filename(filename)))
+        return os.path.join(ChunkUploadMutation.get_staging_directory(),
+                            "{}-{}".format(ChunkUploadMutation.py_secure_filename(upload_id),
+                                           ChunkUploadMutation.py_secure_filename(filename)))
+
+    @staticmethod
+    def get_manifest_filename(upload_id, filename):
+        """Method to generate the filename of the manifest tracking which chunks have been received"""
+        return f"{ChunkUploadMutation.get_temp_filename(upload_id, filename)}{MANIFEST_SUFFIX}"
+
+    @staticmethod
+    def get_upload_status(upload_id, filename):
+        """Method to get the progress of an upload, so an interrupted upload can be resumed by sending only the
+        missing chunks
+
+        Args:
+            upload_id(str): The UUID of the upload
+            filename(str): The name of the file being uploaded
+
+        Returns:
+            dict, or None if the upload is not in progress
+        """
+        manifest_path = ChunkUploadMutation.get_manifest_filename(upload_id, filename)
+        try:
+            status = ChunkManifest(manifest_path).status()
+            upload_size = os.path.getsize(ChunkUploadMutation.get_temp_filename(upload_id, filename))
+        except (ValueError, FileNotFoundError):
+            return None
+
+        received = status['received_chunks']
+        bytes_received = len(received) * status['chunk_size']
+        if received and received[-1] == status['total_chunks'] - 1:
+            # The data file has been truncated to the real size of the last chunk
+            bytes_received += upload_size - status['total_chunks'] * status['chunk_size']
+
+        status['missing_chunks'] = sorted(set(range(status['total_chunks'])) - set(received))
+        status['bytes_received'] = bytes_received
+        return status
 
     @staticmethod
     def get_filename(filename):
@@ -129,18 +176,44 @@ class ChunkUploadMutation(object):
             # Validate input arguments
             cls.validate_args(chunk_params)
 
-            # Write chunk to file
-            with open(cls.get_temp_filename(chunk_params['upload_id'], chunk_params['filename']), 'ab') as f:
-                f.seek(chunk_params['chunk_index'] * chunk_params['chunk_size'])
-                f.write(info.context.files.get('uploadChunk').stream.read())
+            chunk_data = info.context.files.get('uploadChunk').stream.read()
+            is_last_chunk = chunk_params['chunk_index'] == chunk_params['total_chunks'] - 1
+            if len(chunk_data) > chunk_params['chunk_size'] or \
+                    (not is_last_chunk and len(chunk_data) != chunk_params['chunk_size']):
+                raise ValueError(f"Invalid chunk. Chunk {chunk_params['chunk_index']} is {len(chunk_data)} bytes")
+
+            # Verify the chunk before it is written
+            chunk_digest = hashlib.sha256(chunk_data).digest()
+            if chunk_params.get('chunk_checksum') and \
+                    chunk_params['chunk_checksum'].lower() != chunk_digest.hex():
+                raise ValueError(f"Invalid chunk. Chunk {chunk_params['chunk_index']} does not match its checksum")
+
+            # Write chunk to file at its offset
+            upload_file_path = cls.get_temp_filename(chunk_params['upload_id'], chunk_params['filename'])
+            manifest = ChunkManifest(cls.get_manifest_filename(chunk_params['upload_id'], chunk_params['filename']))
+            if not os.path.exists(manifest.path):
+                # A new upload, which preallocates space for every chunk
+                upload_staging.check_quota(os.path.basename(os.path.dirname(upload_file_path)),
+                                           chunk_params['total_chunks'] * chunk_params['chunk_size'])
+            manifest.begin(upload_file_path, chunk_params['total_chunks'], chunk_params['chunk_size'])
+
+            offset = chunk_params['chunk_index'] * chunk_params['chunk_size']
+            write_chunk(upload_file_path, offset, chunk_data)
+            if is_last_chunk:
+                # Drop the space preallocated for the unused part of the last chunk
+                os.truncate(upload_file_path, offset + len(chunk_data))
+
+            running_hashes.update(manifest.path, chunk_params['chunk_index'], chunk_data)
 
-            # If last chunk, move on to mutation
             logger.debug(f"Write for chunk {chunk_params['chunk_index']} complete")
-            if chunk_params['chunk_index'] == chunk_params['total_chunks'] - 1:
-                # Assume last chunk. Let mutation process
-                cls.upload_file_path = cls.get_temp_filename(chunk_params['upload_id'], chunk_params['filename'])
-                cls.filename = cls.get_filename(chunk_params['filename'])
-                return cls.mutate_and_process_upload(info, **kwargs)
+            chunk_digests = manifest.add_chunk(chunk_params['chunk_index'], chunk_digest)
+            if chunk_digests:
+                # Every chunk has arrived, and this request owns the upload. Let mutation process
+                file_hash = upload_hash(running_hashes.pop(manifest.path, chunk_params['total_chunks']),
+                                        chunk_digests, chunk_params['chunk_size'])
+                return cls.mutate_and_process_upload(info, upload_file_path=upload_file_path,
+                                                     upload_filename=cls.get_filename(chunk_params['filename']),
+                                                     upload_hash=file_hash, **kwargs)
             else:
                 # Assume more chunks to go. Short circuit request
                 return cls.mutate_and_wait_for_chunks(info, **kwargs)
@@ -161,8 +234,12 @@ class ChunkUploadMutation(object):
             raise
 
     @abc.abstractclassmethod
-    def mutate_and_process_upload(cls, info, **kwargs):
-        """Method to implement to process the upload. Must return a Mutation type"""
+    def mutate_and_process_upload(cls, info, upload_file_path, upload_filename, upload_hash, **kwargs):
+        """Method to implement to process the upload, once every chunk has been received. Must return a Mutation type
+
+        `upload_file_path` is the absolute path of the assembled file, `upload_filename` is the desired filename and
+        `upload_hash` is the whole-file hash, so the file never has to be read again just to hash it
+        """
         raise NotImplemented
 
     @abc.abstractclassmethod
@@ -0,0 +1,293 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import fcntl
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+from lmcommon.configuration import Configuration
+from lmcommon.logging import LMLogger
+
+logger = LMLogger.get_logger()
+
+# Directory, relative to the LabManager working directory, chunked uploads are assembled in. It is on the same
+# filesystem as the LabBooks, so a completed upload is moved into place with a rename rather than copied.
+UPLOAD_STAGING_DIRECTORY = os.path.join('.labmanager', 'upload-staging')
+
+# Maximum number of bytes all in-progress uploads may occupy
+UPLOAD_STAGING_QUOTA_BYTES = 100 * 1024 ** 3
+
+# Maximum number of bytes the in-progress uploads of a single user may occupy
+UPLOAD_STAGING_USER_QUOTA_BYTES = 25 * 1024 ** 3
+
+# Uploads that have not been written to for this many seconds are considered abandoned and deleted
+UPLOAD_STAGING_MAX_AGE = 24 * 60 * 60
+
+# Number of seconds between runs of the background reaper
+UPLOAD_STAGING_REAP_INTERVAL = 15 * 60
+
+# Suffix of the ChunkManifest of an upload, relative to its data file
+MANIFEST_SUFFIX = '.chunks'
+
+
+def _disk_usage(file_stat: os.stat_result) -> int:
+    # Preallocated and sparse files take up their allocated blocks, not their apparent size
+    return file_stat.st_blocks * 512
+
+
+class UploadStagingManager(object):
+    """Manager for the directory chunked uploads are assembled in
+
+    Each user has their own subdirectory, holding the data file and ChunkManifest of each of their in-progress
+    uploads, and the ChunkManifest of each of their recently completed uploads. A new upload is only accepted if the
+    space it preallocates fits within both the global and the user's quota, and a background reaper deletes uploads
+    that have not been written to for `max_age` seconds.
+
+    Quotas are checked against what is on disk, so concurrent uploads started in different server processes at the
+    same moment can exceed a quota by at most one upload each.
+    """
+    def __init__(self, quota_bytes: int = UPLOAD_STAGING_QUOTA_BYTES,
+                 user_quota_bytes: int = UPLOAD_STAGING_USER_QUOTA_BYTES,
+                 max_age: float = UPLOAD_STAGING_MAX_AGE,
+                 reap_interval: float = UPLOAD_STAGING_REAP_INTERVAL) -> None:
+        self.quota_bytes = quota_bytes
+        self.user_quota_bytes = user_quota_bytes
+        self.max_age = max_age
+        self.reap_interval = reap_interval
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reaper: Optional[threading.Thread] = None
+
+        self.rejected_uploads = 0
+        self.reaped_uploads = 0
+        self.reaped_bytes = 0
+
+    @staticmethod
+    def root_directory() -> str:
+        """Method to get the root of the staging area
+
+        Returns:
+            str
+        """
+        working_directory = Configuration().config['git']['working_directory']
+        return os.path.join(os.path.expanduser(working_directory), UPLOAD_STAGING_DIRECTORY)
+
+    def directory(self, username: str) -> str:
+        """Method to get a user's staging directory, creating it if needed
+
+        Args:
+            username(str): The user's (already sanitized) username
+
+        Returns:
+            str
+        """
+        user_directory = os.path.join(self.root_directory(), username)
+        os.makedirs(user_directory, exist_ok=True)
+        return user_directory
+
+    def usage(self) -> Dict[str, int]:
+        """Method to get the number of bytes every user's in-progress uploads occupy
+
+        Returns:
+            dict
+        """
+        usage: Dict[str, int] = defaultdict(int)
+        try:
+            user_entries = list(os.scandir(self.root_directory()))
+        except FileNotFoundError:
+            return usage
+
+        for user_entry in user_entries:
+            if not user_entry.is_dir(follow_symlinks=False):
+                continue
+            try:
+                with os.scandir(user_entry.path) as it:
+                    for entry in it:
+                        try:
+                            usage[user_entry.name] += _disk_usage(entry.stat(follow_symlinks=False))
+                        except FileNotFoundError:
+                            pass
+            except FileNotFoundError:
+                pass
+        return usage
+
+    def check_quota(self, username: str, upload_bytes: int) -> None:
+        """Method to check a new upload fits in the staging area, before any of it is accepted
+
+        Args:
+            username(str): The user's (already sanitized) username
+            upload_bytes(int): Number of bytes the upload will preallocate
+
+        Returns:
+            None
+        """
+        usage = self.usage()
+        if usage[username] + upload_bytes > self.user_quota_bytes:
+            with self._lock:
+                self.rejected_uploads += 1
+            raise ValueError(f"Upload rejected. It would exceed your upload quota of {self.user_quota_bytes} bytes, "
+                             f"with {usage[username]} bytes already in use by other uploads")
+        if sum(usage.values()) + upload_bytes > self.quota_bytes:
+            with self._lock:
+                self.rejected_uploads += 1
+            raise ValueError("Upload rejected. There is not enough space available for uploads, try again later")
+
+    def _remove_upload(self, data_path: str) -> int:
+        """Method to delete an upload's manifest and data file, unless a request is updating the manifest
+
+        Returns:
+            int: Number of bytes freed
+        """
+        freed = 0
+        manifest_path = f"{data_path}{MANIFEST_SUFFIX}"
+        try:
+            fd = os.open(manifest_path, os.O_RDWR)
+        except FileNotFoundError:
+            fd = None
+
+        try:
+            if fd is not None:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # A chunk is arriving right now, so the upload is not abandoned after all
+                    return 0
+                freed += _disk_usage(os.fstat(fd))
+                os.unlink(manifest_path)
+
+            try:
+                freed += _disk_usage(os.stat(data_path))
+                os.unlink(data_path)
+            except FileNotFoundError:
+                pass
+        finally:
+            if fd is not None:
+                os.close(fd)
+        return freed
+
+    def reap(self, now: Optional[float] = None) -> int:
+        """Method to delete every upload that has not been written to for `max_age` seconds
+
+        Args:
+            now(float): Current time, in seconds since the epoch
+
+        Returns:
+            int: Number of uploads deleted
+        """
+        stale_before = (now or time.time()) - self.max_age
+        try:
+            user_entries = list(os.scandir(self.root_directory()))
+        except FileNotFoundError:
+            return 0
+
+        reaped = 0
+        for user_entry in user_entries:
+            if not user_entry.is_dir(follow_symlinks=False):
+                continue
+
+            # Group each data file with its manifest, and find when either was last written
+            last_written: Dict[str, float] = dict()
+            try:
+                with os.scandir(user_entry.path) as it:
+                    for entry in it:
+                        data_path = entry.path[:-len(MANIFEST_SUFFIX)] if entry.name.endswith(MANIFEST_SUFFIX) \
+                            else entry.path
+                        try:
+                            mtime = entry.stat(follow_symlinks=False).st_mtime
+                        except FileNotFoundError:
+                            continue
+                        last_written[data_path] = max(mtime, last_written.get(data_path, 0))
+            except FileNotFoundError:
+                continue
+
+            for data_path, mtime in last_written.items():
+                if mtime >= stale_before:
+                    continue
+                # A manifest without a data file belongs to an upload that completed, and is not counted as reaped
+                completed = not os.path.exists(data_path)
+                try:
+                    freed = self._remove_upload(data_path)
+                except OSError as err:
+                    logger.warning(f"Failed to remove abandoned upload {data_path}: {err}")
+                    continue
+                if completed:
+                    continue
+                if freed or not os.path.exists(data_path):
+                    logger.info(f"Removed abandoned upload {data_path}, freeing {freed} bytes")
+                    reaped += 1
+                    with self._lock:
+                        self.reaped_uploads += 1
+                        self.reaped_bytes += freed
+        return reaped
+
+    def _run_reaper(self) -> None:
+        while not self._stop.wait(self.reap_interval):
+            try:
+                self.reap()
+            except Exception as err:
+                logger.exception(f"Upload staging reaper failed: {err}")
+
+    def start_reaper(self) -> None:
+        """Method to remove abandoned uploads now, and then every `reap_interval` seconds in a daemon thread
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._reaper is not None and self._reaper.is_alive():
+                return
+            self._stop.clear()
+            self._reaper = threading.Thread(target=self._run_reaper, name="upload-staging-reaper", daemon=True)
+
+        try:
+            self.reap()
+        except OSError as err:
+            logger.warning(f"Failed to remove abandoned uploads: {err}")
+        self._reaper.start()
+
+    def stop_reaper(self) -> None:
+        """Method to stop the background reaper"""
+        self._stop.set()
+        if self._reaper is not None:
+            self._reaper.join()
+            self._reaper = None
+
+    def stats(self) -> Dict[str, int]:
+        """Method to get the current staging area usage and counters
+
+        Returns:
+            dict
+        """
+        usage = self.usage()
+        with self._lock:
+            return {"bytes": sum(usage.values()),
+                    "users": len([v for v in usage.values() if v]),
+                    "quota_bytes": self.quota_bytes,
+                    "user_quota_bytes": self.user_quota_bytes,
+                    "rejected_uploads": self.rejected_uploads,
+                    "reaped_uploads": self.reaped_uploads,
+                    "reaped_bytes": self.reaped_bytes}
+
+
+# Process-wide upload staging manager
+upload_staging = UploadStagingManager()
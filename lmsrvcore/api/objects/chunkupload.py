@@ -0,0 +1,45 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import graphene
+
+
+class ChunkUploadStatus(graphene.ObjectType):
+    """A type representing the progress of a chunked upload, used to resume an interrupted upload by sending only the
+    missing chunks"""
+    # A UUID for an entire upload job
+    upload_id = graphene.String(required=True)
+
+    # The name of the file being uploaded
+    filename = graphene.String(required=True)
+
+    # Number of bytes in a single chunk
+    chunk_size = graphene.Int()
+
+    # Total number of chunks in the file
+    total_chunks = graphene.Int()
+
+    # Indices of the chunks that have been written
+    received_chunks = graphene.List(graphene.Int)
+
+    # Indices of the chunks that still have to be sent
+    missing_chunks = graphene.List(graphene.Int)
+
+    # Number of bytes written so far, encoded as a string.
+    bytes_received = graphene.String()
@@ -0,0 +1,218 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from lmcommon.auth.identity import AuthenticationError
+from lmcommon.logging import LMLogger
+
+logger = LMLogger.get_logger()
+
+# Maximum number of token pairs kept in the cache
+TOKEN_CACHE_MAX_SIZE = 256
+
+# Seconds a validated token pair is trusted if no expiration can be read from the tokens
+TOKEN_CACHE_DEFAULT_TTL = 300
+
+# Seconds a token pair that failed validation is rejected without re-checking
+TOKEN_CACHE_NEGATIVE_TTL = 30
+
+
+def token_cache_key(access_token: Optional[str], id_token: Optional[str]) -> Optional[str]:
+    """Method to compute the cache key for a pair of tokens
+
+    Args:
+        access_token(str): The bearer token from the Authorization header
+        id_token(str): The token from the Identity header
+
+    Returns:
+        str, or None if there are no tokens to key on
+    """
+    if not access_token and not id_token:
+        return None
+
+    return hashlib.sha256(f"{access_token or ''}\n{id_token or ''}".encode('utf-8')).hexdigest()
+
+
+def token_expiration(*tokens: Optional[str]) -> Optional[float]:
+    """Method to read the earliest `exp` claim from a set of JWTs, without verifying them
+
+    Verification is left to the identity manager. This is only used to bound how long its result is cached.
+
+    Args:
+        *tokens(str): JWTs, any of which may be None or opaque
+
+    Returns:
+        float, or None if no token carries an expiration
+    """
+    expiration = None
+    for token in tokens:
+        if not token or token.count('.') != 2:
+            continue
+        try:
+            payload = token.split('.')[1]
+            claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)).decode('utf-8'))
+            exp = float(claims['exp'])
+        except (ValueError, KeyError, TypeError):
+            continue
+        expiration = exp if expiration is None else min(expiration, exp)
+
+    return expiration
+
+
+class TokenCacheEntry(object):
+    """The cached result of authenticating a token pair"""
+    def __init__(self, expires_at: float, error: Optional[AuthenticationError] = None) -> None:
+        self.expires_at = expires_at
+        self.error = error
+        self.user: Any = None
+
+    @property
+    def authenticated(self) -> bool:
+        return self.error is None
+
+
+class TokenCache(object):
+    """A process-wide cache of token validation results and user profiles
+
+    Entries are keyed by a hash of the access and ID tokens. Valid tokens are cached until they expire, so the
+    identity manager validates a token and fetches its profile once per token lifetime. Tokens that fail validation
+    are negatively cached for a short time.
+    """
+    def __init__(self, max_size: int = TOKEN_CACHE_MAX_SIZE) -> None:
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Optional[str]) -> Optional[TokenCacheEntry]:
+        """Method to get an unexpired entry
+
+        Args:
+            key(str): Key from token_cache_key()
+
+        Returns:
+            TokenCacheEntry
+        """
+        if key is None:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.time():
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key: str, entry: TokenCacheEntry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def put_authenticated(self, key: Optional[str], expires_at: Optional[float] = None) -> None:
+        """Method to record that a token pair authenticated successfully
+
+        Args:
+            key(str): Key from token_cache_key()
+            expires_at(float): Unix time the tokens expire, if known
+
+        Returns:
+            None
+        """
+        if key is None:
+            return
+
+        if expires_at is None:
+            expires_at = time.time() + TOKEN_CACHE_DEFAULT_TTL
+        elif expires_at <= time.time():
+            return
+
+        self._put(key, TokenCacheEntry(expires_at))
+
+    def put_failure(self, key: Optional[str], error: AuthenticationError) -> None:
+        """Method to record that a token pair failed authentication
+
+        Args:
+            key(str): Key from token_cache_key()
+            error(AuthenticationError): The error raised by the identity manager
+
+        Returns:
+            None
+        """
+        if key is None:
+            return
+
+        self._put(key, TokenCacheEntry(time.time() + TOKEN_CACHE_NEGATIVE_TTL, error))
+
+    def set_user(self, key: Optional[str], user: Any) -> None:
+        """Method to store the user profile loaded for an authenticated token pair
+
+        Args:
+            key(str): Key from token_cache_key()
+            user(User): The user's profile
+
+        Returns:
+            None
+        """
+        entry = self.get(key)
+        if entry is not None and entry.authenticated:
+            entry.user = user
+
+    def invalidate(self, key: Optional[str]) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Method to get the current cache counters
+
+        Returns:
+            dict
+        """
+        with self._lock:
+            return {"size": len(self._entries),
+                    "max_size": self.max_size,
+                    "hits": self.hits,
+                    "misses": self.misses}
+
+
+# Process-wide token validation cache
+token_cache = TokenCache()
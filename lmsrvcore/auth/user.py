@@ -23,17 +23,26 @@ from lmcommon.logging import LMLogger
 from lmcommon.auth.user import User
 from lmcommon.gitlib.git import GitAuthor
 from lmsrvcore.auth.identity import get_identity_manager_instance
+from lmsrvcore.auth.cache import token_cache, token_cache_key
 
 
 def get_logged_in_user() -> User:
     """A method to get the current logged in User object"""
-    # Check for user in redis cache
     access_token = flask.g.get('access_token', None)
     id_token = flask.g.get('id_token', None)
 
     request_scoped_user = flask.g.get('user_obj', None)
     if not request_scoped_user:
-        request_scoped_user = get_identity_manager_instance().get_user_profile(access_token, id_token)
+        # Check for the profile loaded by a previous request with the same tokens
+        cache_key = token_cache_key(access_token, id_token)
+        cached = token_cache.get(cache_key)
+        if cached is not None and cached.authenticated and cached.user:
+            request_scoped_user = cached.user
+        else:
+            request_scoped_user = get_identity_manager_instance().get_user_profile(access_token, id_token)
+            if request_scoped_user:
+                token_cache.set_user(cache_key, request_scoped_user)
+
         flask.g.user_obj = request_scoped_user
 
     return request_scoped_user
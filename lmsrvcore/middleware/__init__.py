@@ -1,4 +1,4 @@
 from lmsrvcore.middleware.authorization import AuthorizationMiddleware
 from lmsrvcore.middleware.dataloader import LabBookLoaderMiddleware
-from lmsrvcore.middleware.error import error_middleware
-from lmsrvcore.middleware.metric import time_all_resolvers_middleware
+from lmsrvcore.middleware.error import error_middleware, ErrorLoggingMiddleware
+from lmsrvcore.middleware.metric import time_all_resolvers_middleware, ResolverProfilerMiddleware, resolver_profiler
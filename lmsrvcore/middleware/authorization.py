@@ -18,34 +18,61 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 from lmsrvcore.auth.identity import get_identity_manager_instance, AuthenticationError, parse_token
+from lmsrvcore.auth.cache import token_cache, token_cache_key, token_expiration
 import flask
 
 
 class AuthorizationMiddleware(object):
-    """Middleware to enforce authentication requirements and parse JWT"""
+    """Middleware to enforce authentication requirements and parse JWT
+
+    Used as request middleware by the GraphQL view, authenticating once before execution. It can also be used as
+    graphene field middleware, in which case it authenticates on the first field resolved in the request.
+    """
     identity_mgr = None
 
-    def resolve(self, next, root, info, **args):
+    def authenticate(self, context) -> None:
+        """Method to authenticate the request, if it has not been already
+
+        Args:
+            context: The request context
+
+        Returns:
+            None
+        """
         if not self.identity_mgr:
             self.identity_mgr = get_identity_manager_instance()
 
-        # On first field processed in request, authenticate
-        if not hasattr(info.context, "auth_middleware_complete"):
+        if not hasattr(context, "auth_middleware_complete"):
             # Pull the token out of the header if available
             token = None
-            if "Authorization" in info.context.headers:
-                token = parse_token(info.context.headers["Authorization"])
+            if "Authorization" in context.headers:
+                token = parse_token(context.headers["Authorization"])
 
             # Save token to the request context for future use (e.g. look up a user's profile information if needed)
             flask.g.access_token = token
-            flask.g.id_token = info.context.headers.get("Identity", None)
+            flask.g.id_token = context.headers.get("Identity", None)
 
-            # Check if you are authenticated
-            try:
-                self.identity_mgr.is_authenticated(token, flask.g.id_token)
-            except AuthenticationError:
+            # Check if you are authenticated, re-using the result for tokens that have already been validated
+            cache_key = token_cache_key(token, flask.g.id_token)
+            cached = token_cache.get(cache_key)
+            if cached is None:
+                try:
+                    self.identity_mgr.is_authenticated(token, flask.g.id_token)
+                except AuthenticationError as err:
+                    token_cache.put_failure(cache_key, err)
+                    raise AuthenticationError("User not authenticated", 401)
+
+                token_cache.put_authenticated(cache_key, token_expiration(token, flask.g.id_token))
+            elif not cached.authenticated:
                 raise AuthenticationError("User not authenticated", 401)
 
-            info.context.auth_middleware_complete = True
+            context.auth_middleware_complete = True
+
+    def before_execute(self, context) -> None:
+        self.authenticate(context)
+
+    def resolve(self, next, root, info, **args):
+        # On first field processed in request, authenticate
+        self.authenticate(info.context)
 
         return next(root, info, **args)
@@ -17,16 +17,100 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
-from lmsrvlabbook.dataloader.labbook import LabBookLoader
+from typing import Iterator, Tuple
+
+from graphql.execution.values import get_argument_values, get_variable_values
+from graphql.language import ast
+from graphql.utils.get_operation_ast import get_operation_ast
+
+from lmcommon.logging import LMLogger
+from lmsrvlabbook.dataloader.favorites import FavoritesLoader
+from lmsrvlabbook.dataloader.fileinfo import FileInfoLoader
+from lmsrvlabbook.dataloader.labbook import LabBookLoader, labbook_cache
+
+logger = LMLogger.get_logger()
+
+
+def mutated_labbooks(schema, document_ast, operation_name=None, variables=None) -> Iterator[Tuple[str, str]]:
+    """Method to find the LabBooks targeted by the root fields of a mutation operation
+
+    Args:
+        schema(GraphQLSchema): Schema the document was executed against
+        document_ast(Document): The parsed document
+        operation_name(str): The executed operation
+        variables(dict): Variable values provided with the request
+
+    Returns:
+        iterator of (owner, labbook_name) tuples
+    """
+    operation = get_operation_ast(document_ast, operation_name)
+    mutation_type = schema.get_mutation_type()
+    if operation is None or operation.operation != 'mutation' or mutation_type is None:
+        return
+
+    variable_values = get_variable_values(schema, operation.variable_definitions or [], variables or {})
+    for selection in operation.selection_set.selections:
+        if not isinstance(selection, ast.Field):
+            continue
+
+        field_def = mutation_type.fields.get(selection.name.value)
+        if field_def is None:
+            continue
+
+        mutation_input = get_argument_values(field_def.args, selection.arguments, variable_values).get('input') or {}
+        if mutation_input.get('owner') and mutation_input.get('labbook_name'):
+            yield mutation_input['owner'], mutation_input['labbook_name']
 
 
 class LabBookLoaderMiddleware(object):
-    """Middleware to insert an instance of the LabBookLoader dataloader into the request context"""
-    def resolve(self, next, root, info, **args):
-        if hasattr(info.context, "labbook_loader"):
-            if not info.context.labbook_loader:
-                info.context.labbook_loader = LabBookLoader()
+    """Middleware to insert instances of the LabBookLoader, FileInfoLoader and FavoritesLoader dataloaders into the
+    request context
+
+    Also drops a LabBook from the process-wide LabBook cache once a mutation on it has run, so subsequent requests
+    never see an instance loaded before the mutation.
+
+    Used as request middleware by the GraphQL view, running once before and after execution. It can also be used as
+    graphene field middleware.
+    """
+    @staticmethod
+    def insert_loader(context) -> None:
+        if hasattr(context, "labbook_loader"):
+            if not context.labbook_loader:
+                context.labbook_loader = LabBookLoader()
         else:
-            info.context.labbook_loader = LabBookLoader()
+            context.labbook_loader = LabBookLoader()
+
+        if not getattr(context, "file_info_loader", None):
+            context.file_info_loader = FileInfoLoader(context.labbook_loader)
+
+        if not getattr(context, "favorites_loader", None):
+            context.favorites_loader = FavoritesLoader(context.labbook_loader)
+
+    def before_execute(self, context) -> None:
+        self.insert_loader(context)
+
+    def after_execute(self, context, document, params, result) -> None:
+        if document is None:
+            return
+
+        try:
+            for owner, labbook_name in mutated_labbooks(document.schema, document.document_ast,
+                                                        params.operation_name, params.variables):
+                labbook_cache.invalidate(owner, labbook_name)
+        except Exception as err:
+            # Invalid variables have already been reported by execution. Drop everything to be safe.
+            logger.warning(f"Could not determine mutated LabBooks, clearing LabBook cache: {err}")
+            labbook_cache.clear()
+
+    def resolve(self, next, root, info, **args):
+        self.insert_loader(info.context)
+
+        if root is None and info.operation.operation == 'mutation':
+            mutation_input = args.get('input') or {}
+            try:
+                return next(root, info, **args)
+            finally:
+                if mutation_input.get('owner') and mutation_input.get('labbook_name'):
+                    labbook_cache.invalidate(mutation_input['owner'], mutation_input['labbook_name'])
 
         return next(root, info, **args)
@@ -31,3 +31,19 @@ def error_middleware(next, root, info, **args):
         raise
 
     return return_value
+
+
+class ErrorLoggingMiddleware(object):
+    """Request middleware to log all exceptions raised during execution
+
+    Equivalent to `error_middleware`, but runs once per request on the execution result instead of wrapping every
+    resolved field.
+    """
+    def after_execute(self, context, document, params, result) -> None:
+        if result is None or not result.errors:
+            return
+
+        for err in result.errors:
+            original_error = getattr(err, 'original_error', None) or err
+            logger.error(err, exc_info=(type(original_error), original_error,
+                                        getattr(err, 'stack', None) or original_error.__traceback__))
@@ -17,12 +17,28 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import bisect
+import random
+import threading
+from typing import Dict, List, Tuple
+
+from promise import is_thenable
+
 from lmcommon.logging import LMLogger
 from time import time as timer
 import json
 
 logger = LMLogger.get_logger()
 
+# Upper bounds, in seconds, of the resolver latency histogram buckets
+RESOLVER_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Fraction of resolver calls that are timed by the ResolverProfilerMiddleware
+RESOLVER_PROFILER_SAMPLE_RATE = 1.0
+
+# Fraction of GraphQL requests the view attaches the ResolverProfilerMiddleware to
+RESOLVER_PROFILER_REQUEST_SAMPLE_RATE = 0.1
+
 
 def time_all_resolvers_middleware(next, root, info, **args):
     """Middleware to time and log all resolvers"""
@@ -37,3 +53,134 @@ def time_all_resolvers_middleware(next, root, info, **args):
 
     logger.info(f"METRIC :: {json.dumps(data)}")
     return return_value
+
+
+class ResolverHistogram(object):
+    """Latency histogram and call counters for a single (parent_type, field) pair"""
+    def __init__(self) -> None:
+        self.buckets = [0] * (len(RESOLVER_LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+
+    def observe(self, duration: float, error: bool = False) -> None:
+        self.buckets[bisect.bisect_left(RESOLVER_LATENCY_BUCKETS, duration)] += 1
+        self.count += 1
+        self.total += duration
+        if error:
+            self.errors += 1
+
+
+class ResolverProfiler(object):
+    """Process-wide aggregation of resolver latencies
+
+    Rather than logging a line per resolved field, observations are folded into fixed-bucket histograms keyed by
+    (parent_type, field) so the profiler can be left on in production and scraped through the /metrics endpoint.
+    """
+    def __init__(self) -> None:
+        self._histograms: Dict[Tuple[str, str], ResolverHistogram] = dict()
+        self._lock = threading.Lock()
+
+    def observe(self, parent_type: str, field_name: str, duration: float, error: bool = False) -> None:
+        """Method to record a single resolver call
+
+        Args:
+            parent_type(str): Name of the GraphQL type the field belongs to
+            field_name(str): Name of the resolved field
+            duration(float): Time spent resolving the field, in seconds
+            error(bool): True if the resolver raised or rejected
+
+        Returns:
+            None
+        """
+        with self._lock:
+            histogram = self._histograms.get((parent_type, field_name))
+            if histogram is None:
+                histogram = self._histograms[(parent_type, field_name)] = ResolverHistogram()
+            histogram.observe(duration, error)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+
+    def snapshot(self) -> List[dict]:
+        """Method to get a copy of all histograms, slowest total time first
+
+        Returns:
+            list
+        """
+        with self._lock:
+            data = [{"parent_type": key[0],
+                     "field_name": key[1],
+                     "buckets": list(h.buckets),
+                     "count": h.count,
+                     "errors": h.errors,
+                     "total": h.total} for key, h in self._histograms.items()]
+
+        return sorted(data, key=lambda x: x['total'], reverse=True)
+
+    def render_prometheus(self) -> str:
+        """Method to render all histograms in the Prometheus text exposition format
+
+        Returns:
+            str
+        """
+        lines = ["# HELP labmanager_resolver_duration_seconds GraphQL field resolver latency",
+                 "# TYPE labmanager_resolver_duration_seconds histogram"]
+        errors = ["# HELP labmanager_resolver_errors_total GraphQL field resolver errors",
+                  "# TYPE labmanager_resolver_errors_total counter"]
+        for item in self.snapshot():
+            labels = f'parent_type="{item["parent_type"]}",field_name="{item["field_name"]}"'
+            cumulative = 0
+            for bound, count in zip(RESOLVER_LATENCY_BUCKETS, item['buckets']):
+                cumulative += count
+                lines.append(f'labmanager_resolver_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'labmanager_resolver_duration_seconds_bucket{{{labels},le="+Inf"}} {item["count"]}')
+            lines.append(f'labmanager_resolver_duration_seconds_sum{{{labels}}} {item["total"]:.6f}')
+            lines.append(f'labmanager_resolver_duration_seconds_count{{{labels}}} {item["count"]}')
+            errors.append(f'labmanager_resolver_errors_total{{{labels}}} {item["errors"]}')
+
+        return "\n".join(lines + errors) + "\n"
+
+
+# Process-wide resolver profiler
+resolver_profiler = ResolverProfiler()
+
+
+class ResolverProfilerMiddleware(object):
+    """Middleware to record sampled resolver latencies into the process-wide ResolverProfiler
+
+    Resolvers that return a promise (e.g. anything going through the LabBookLoader) are timed until the promise
+    settles, so the recorded latency includes the deferred work.
+    """
+    def __init__(self, sample_rate: float = RESOLVER_PROFILER_SAMPLE_RATE,
+                 profiler: ResolverProfiler = resolver_profiler) -> None:
+        self.sample_rate = sample_rate
+        self.profiler = profiler
+
+    def resolve(self, next, root, info, **args):
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return next(root, info, **args)
+
+        parent_type = info.parent_type.name if info.parent_type else ''
+        field_name = info.field_name
+        start = timer()
+        try:
+            return_value = next(root, info, **args)
+        except Exception:
+            self.profiler.observe(parent_type, field_name, timer() - start, error=True)
+            raise
+
+        if is_thenable(return_value):
+            def on_resolve(value):
+                self.profiler.observe(parent_type, field_name, timer() - start)
+                return value
+
+            def on_reject(err):
+                self.profiler.observe(parent_type, field_name, timer() - start, error=True)
+                raise err
+
+            return return_value.then(on_resolve, on_reject)
+
+        self.profiler.observe(parent_type, field_name, timer() - start)
+        return return_value
@@ -17,11 +17,18 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import hashlib
+import io
+import math
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 import graphene
 
 from lmsrvcore.tests.fixtures import fixture_working_dir_with_cached_user
-from lmsrvcore.api.mutations import ChunkUploadMutation
+from lmsrvcore.api.mutations import ChunkManifest, ChunkUploadMutation
 
 
 class MyMutation(graphene.relay.ClientIDMutation, ChunkUploadMutation):
@@ -29,15 +36,17 @@ class MyMutation(graphene.relay.ClientIDMutation, ChunkUploadMutation):
         var = graphene.String()
 
     @classmethod
-    def mutate_and_process_upload(cls, info, **kwargs):
+    def mutate_and_process_upload(cls, info, upload_file_path, upload_filename, upload_hash, **kwargs):
         return "success"
 
 
 class TestChunkUpload(object):
-    def test_get_temp_filename(self):
+    def test_get_temp_filename(self, fixture_working_dir_with_cached_user):
         """Test getting the filename"""
         mut = MyMutation()
-        assert mut.get_temp_filename("asdf", "1234.txt") == "/tmp/asdf-1234.txt"
+        assert mut.get_temp_filename("asdf", "1234.txt") == \
+            os.path.join(fixture_working_dir_with_cached_user[1], '.labmanager', 'upload-staging', 'default',
+                         'asdf-1234.txt')
 
     def test_validate_args(self):
         """Test errors on bad args"""
@@ -90,3 +99,181 @@ class TestChunkUpload(object):
 
         with pytest.raises(ValueError):
             mut.mutate_and_get_payload(None, DummyInfo(), **{"chunk_upload_params": args})
+
+    def test_chunks_out_of_order(self, fixture_working_dir_with_cached_user):
+        """Test chunks sent in any order and in parallel are assembled, and the upload is processed exactly once"""
+        class DummyFile(object):
+            def __init__(self, data):
+                self.stream = io.BytesIO(data)
+
+        class DummyContext(object):
+            def __init__(self, data):
+                self.files = {'uploadChunk': DummyFile(data)}
+
+        class DummyInfo(object):
+            def __init__(self, data):
+                self.context = DummyContext(data)
+
+        processed = list()
+
+        class AssembleMutation(graphene.relay.ClientIDMutation, ChunkUploadMutation):
+            @classmethod
+            def mutate_and_process_upload(cls, info, upload_file_path, upload_filename, upload_hash, **kwargs):
+                with open(upload_file_path, 'rb') as uf:
+                    processed.append((uf.read(), upload_filename, upload_hash))
+                os.remove(upload_file_path)
+                return "done"
+
+            @classmethod
+            def mutate_and_wait_for_chunks(cls, info, **kwargs):
+                return "waiting"
+
+        data = os.urandom(10 * 1024 * 10 + 123)
+        chunk_size = 10 * 1024
+        total_chunks = int(math.ceil(len(data) / chunk_size))
+        upload_id = f"upload-{uuid.uuid4().hex}"
+
+        def send(chunk_index):
+            args = {"upload_id": upload_id,
+                    "chunk_size": chunk_size,
+                    "total_chunks": total_chunks,
+                    "chunk_index": chunk_index,
+                    "file_size_kb": 0,
+                    "filename": "test.bin"}
+            chunk = data[chunk_index * chunk_size:(chunk_index + 1) * chunk_size]
+            return AssembleMutation.mutate_and_get_payload(None, DummyInfo(chunk), **{"chunk_upload_params": args})
+
+        order = list(reversed(range(total_chunks)))
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(send, order))
+
+        assert results.count("done") == 1
+        assert results.count("waiting") == total_chunks - 1
+        chunk_digests = [hashlib.sha256(data[i:i + chunk_size]).digest() for i in range(0, len(data), chunk_size)]
+        assert processed == [(data, "test.bin",
+                              f"sha256-chunked-{chunk_size}:{hashlib.sha256(b''.join(chunk_digests)).hexdigest()}")]
+        assert AssembleMutation.get_upload_status(upload_id, "test.bin") is None
+
+        # A retried chunk arriving after completion does not start a new upload
+        with pytest.raises(ValueError):
+            send(0)
+        assert not os.path.exists(AssembleMutation.get_temp_filename(upload_id, "test.bin"))
+        assert len(processed) == 1
+
+    def test_chunk_manifest(self, tmpdir):
+        """Test the manifest records received chunks and rejects mismatched parameters"""
+        data_path = os.path.join(str(tmpdir), "upload.bin")
+        manifest = ChunkManifest(os.path.join(str(tmpdir), "upload.bin.chunks"))
+
+        manifest.begin(data_path, 3, 100)
+        assert os.path.getsize(data_path) == 300
+        manifest.begin(data_path, 3, 100)
+        with pytest.raises(ValueError):
+            manifest.begin(data_path, 4, 100)
+
+        assert manifest.add_chunk(2, b'2' * 32) is None
+        assert manifest.add_chunk(0, b'0' * 32) is None
+        assert manifest.received_chunks() == [0, 2]
+        assert manifest.add_chunk(1, b'1' * 32) == [b'0' * 32, b'1' * 32, b'2' * 32]
+
+        # Once complete, the upload can not be restarted over the top of the assembled file
+        with pytest.raises(ValueError):
+            manifest.add_chunk(1, b'1' * 32)
+        with pytest.raises(ValueError):
+            manifest.begin(data_path, 3, 100)
+
+    def test_manifest_not_started(self, tmpdir):
+        """Test a manifest whose header has not been written is reported as not started"""
+        manifest = ChunkManifest(os.path.join(str(tmpdir), "upload.bin.chunks"))
+        open(manifest.path, 'wb').close()
+
+        with pytest.raises(ValueError):
+            manifest.status()
+        with pytest.raises(ValueError):
+            manifest.add_chunk(0, b'0' * 32)
+
+    def test_upload_status(self, fixture_working_dir_with_cached_user):
+        """Test an interrupted upload reports its progress and can be resumed with only the missing chunks"""
+        class DummyFile(object):
+            def __init__(self, data):
+                self.stream = io.BytesIO(data)
+
+        class DummyInfo(object):
+            def __init__(self, data):
+                self.context = type('DummyContext', (object,), {'files': {'uploadChunk': DummyFile(data)}})()
+
+        class ResumeMutation(graphene.relay.ClientIDMutation, ChunkUploadMutation):
+            @classmethod
+            def mutate_and_process_upload(cls, info, upload_file_path, upload_filename, **kwargs):
+                with open(upload_file_path, 'rb') as uf:
+                    assert uf.read() == data
+                os.remove(upload_file_path)
+                return "done"
+
+            @classmethod
+            def mutate_and_wait_for_chunks(cls, info, **kwargs):
+                return "waiting"
+
+        data = os.urandom(1000 * 4 + 10)
+        upload_id = f"upload-{uuid.uuid4().hex}"
+
+        def send(chunk_index):
+            args = {"upload_id": upload_id, "chunk_size": 1000, "total_chunks": 5, "chunk_index": chunk_index,
+                    "file_size_kb": 0, "filename": "test.bin"}
+            chunk = data[chunk_index * 1000:(chunk_index + 1) * 1000]
+            return ResumeMutation.mutate_and_get_payload(None, DummyInfo(chunk), **{"chunk_upload_params": args})
+
+        assert ChunkUploadMutation.get_upload_status(upload_id, "test.bin") is None
+
+        send(0)
+        send(4)
+        status = ChunkUploadMutation.get_upload_status(upload_id, "test.bin")
+        assert status['chunk_size'] == 1000
+        assert status['total_chunks'] == 5
+        assert status['received_chunks'] == [0, 4]
+        assert status['missing_chunks'] == [1, 2, 3]
+        assert status['bytes_received'] == 1010
+
+        assert [send(i) for i in status['missing_chunks']] == ["waiting", "waiting", "done"]
+        assert ChunkUploadMutation.get_upload_status(upload_id, "test.bin") is None
+
+    def test_checksums(self, fixture_working_dir_with_cached_user):
+        """Test chunk checksums are verified, and the whole-file hash of an in-order upload is its SHA-256"""
+        class DummyFile(object):
+            def __init__(self, data):
+                self.stream = io.BytesIO(data)
+
+        class DummyInfo(object):
+            def __init__(self, data):
+                self.context = type('DummyContext', (object,), {'files': {'uploadChunk': DummyFile(data)}})()
+
+        hashes = list()
+
+        class HashMutation(graphene.relay.ClientIDMutation, ChunkUploadMutation):
+            @classmethod
+            def mutate_and_process_upload(cls, info, upload_file_path, upload_filename, upload_hash, **kwargs):
+                hashes.append(upload_hash)
+                os.remove(upload_file_path)
+                return "done"
+
+            @classmethod
+            def mutate_and_wait_for_chunks(cls, info, **kwargs):
+                return "waiting"
+
+        data = os.urandom(1000 * 3 + 10)
+        upload_id = f"upload-{uuid.uuid4().hex}"
+
+        def send(chunk_index, checksum=None):
+            chunk = data[chunk_index * 1000:(chunk_index + 1) * 1000]
+            args = {"upload_id": upload_id, "chunk_size": 1000, "total_chunks": 4, "chunk_index": chunk_index,
+                    "file_size_kb": 0, "filename": "test.bin",
+                    "chunk_checksum": checksum or hashlib.sha256(chunk).hexdigest()}
+            return HashMutation.mutate_and_get_payload(None, DummyInfo(chunk), **{"chunk_upload_params": args})
+
+        assert send(0) == "waiting"
+        with pytest.raises(ValueError):
+            send(1, checksum=hashlib.sha256(b"corrupt").hexdigest())
+        assert ChunkUploadMutation.get_upload_status(upload_id, "test.bin")['received_chunks'] == [0]
+
+        assert [send(i) for i in (1, 2, 3)] == ["waiting", "waiting", "done"]
+        assert hashes == [f"sha256:{hashlib.sha256(data).hexdigest()}"]
@@ -0,0 +1,115 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import flask
+import graphene
+from promise import Promise
+
+from lmsrvcore.view import LabManagerGraphQLView, CachedGraphQLBackend, run_in_executor
+
+
+def _slow_user():
+    time.sleep(0.3)
+    return flask.g.username
+
+
+def _slow_header():
+    time.sleep(0.3)
+    return flask.request.headers.get('X-Test')
+
+
+def _fail():
+    raise ValueError("failed in pool")
+
+
+class Query(graphene.ObjectType):
+    user = graphene.String()
+    header = graphene.String()
+    chained = graphene.String()
+    broken = graphene.String()
+
+    def resolve_user(self, info):
+        return run_in_executor(info, _slow_user)
+
+    def resolve_header(self, info):
+        return run_in_executor(info, _slow_header)
+
+    def resolve_chained(self, info):
+        return Promise.resolve("a").then(lambda x: run_in_executor(info, lambda: x + "b"))
+
+    def resolve_broken(self, info):
+        return run_in_executor(info, _fail)
+
+
+schema = graphene.Schema(query=Query)
+
+
+def _client(resolver_pool):
+    app = flask.Flask("lmsrvlabbook")
+
+    @app.before_request
+    def set_user():
+        flask.g.username = "default"
+
+    app.add_url_rule('/labbook/', view_func=LabManagerGraphQLView.as_view('graphql', schema=schema,
+                                                                          backend=CachedGraphQLBackend(),
+                                                                          resolver_pool=resolver_pool))
+    return app.test_client()
+
+
+def _post(client, query):
+    r = client.post('/labbook/', data=json.dumps({"query": query}), content_type='application/json',
+                    headers={"X-Test": "header-value"})
+    return json.loads(r.data.decode())
+
+
+class TestPooledResolverExecutor(object):
+    def test_concurrent_with_request_context(self):
+        """Test pooled resolver work overlaps and sees the request's flask.g and headers"""
+        client = _client(ThreadPoolExecutor(max_workers=4))
+
+        start = time.time()
+        data = _post(client, "{ user header chained }")
+        duration = time.time() - start
+
+        assert data['data'] == {"user": "default", "header": "header-value", "chained": "ab"}
+        assert duration < 0.55
+
+    def test_serial_without_pool(self):
+        """Test resolver work runs inline when concurrent resolvers are not enabled"""
+        client = _client(None)
+
+        start = time.time()
+        data = _post(client, "{ user header chained }")
+        duration = time.time() - start
+
+        assert data['data'] == {"user": "default", "header": "header-value", "chained": "ab"}
+        assert duration >= 0.6
+
+    def test_error_in_pool(self):
+        """Test an exception raised on the pool is reported as a field error"""
+        client = _client(ThreadPoolExecutor(max_workers=2))
+
+        data = _post(client, "{ broken user }")
+        assert data['data'] == {"broken": None, "user": "default"}
+        assert data['errors'][0]['message'] == "failed in pool"
@@ -0,0 +1,322 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import json
+import os
+import tempfile
+
+import flask
+import graphene
+import pytest
+
+from lmsrvcore.view import LabManagerGraphQLView, CachedGraphQLBackend, PersistedQueryStore, query_hash
+
+
+class Query(graphene.ObjectType):
+    hello = graphene.String()
+
+    def resolve_hello(self, info):
+        return "world"
+
+
+schema = graphene.Schema(query=Query)
+
+QUERY = "{ hello }"
+
+
+def _client(store, backend=None, persisted_queries_only=False):
+    app = flask.Flask("lmsrvlabbook")
+    app.add_url_rule('/labbook/', view_func=LabManagerGraphQLView.as_view('graphql', schema=schema,
+                                                                          backend=backend or CachedGraphQLBackend(),
+                                                                          persisted_queries=store,
+                                                                          persisted_queries_only=persisted_queries_only))
+    return app.test_client()
+
+
+def _post(client, body):
+    r = client.post('/labbook/', data=json.dumps(body), content_type='application/json')
+    return r.status_code, json.loads(r.data.decode())
+
+
+def _persisted(sha256_hash):
+    return {"persistedQuery": {"version": 1, "sha256Hash": sha256_hash}}
+
+
+class TestCachedGraphQLBackend(object):
+    def test_document_cached(self):
+        """Test a document is only parsed and validated once"""
+        backend = CachedGraphQLBackend()
+        doc1 = backend.document_from_string(schema, QUERY)
+        doc2 = backend.document_from_string(schema, QUERY)
+        assert doc1 is doc2
+        assert backend.stats()['hits'] == 1
+        assert backend.stats()['misses'] == 1
+        assert doc1.execute().data == {"hello": "world"}
+
+    def test_invalid_document_cached(self):
+        """Test a document failing validation is cached and returns its errors"""
+        backend = CachedGraphQLBackend()
+        doc = backend.document_from_string(schema, "{ goodbye }")
+        result = doc.execute()
+        assert result.invalid is True
+        assert "goodbye" in str(result.errors[0])
+        assert backend.document_from_string(schema, "{ goodbye }") is doc
+
+    def test_eviction(self):
+        """Test the least recently used document is dropped"""
+        backend = CachedGraphQLBackend(max_size=2)
+        doc = backend.document_from_string(schema, "{ hello }")
+        backend.document_from_string(schema, "query A { hello }")
+        backend.document_from_string(schema, "query B { hello }")
+        assert len(backend) == 2
+        assert backend.document_from_string(schema, "{ hello }") is not doc
+
+
+class TestPersistedQueries(object):
+    def test_register_and_execute_by_hash(self):
+        """Test automatic registration, then execution by hash alone"""
+        store = PersistedQueryStore()
+        client = _client(store)
+        sha256_hash = query_hash(QUERY)
+
+        status, data = _post(client, {"extensions": _persisted(sha256_hash)})
+        assert status == 400
+        assert data['errors'][0]['message'] == "PersistedQueryNotFound"
+
+        status, data = _post(client, {"query": QUERY, "extensions": _persisted(sha256_hash)})
+        assert status == 200
+        assert data['data'] == {"hello": "world"}
+
+        status, data = _post(client, {"extensions": _persisted(sha256_hash)})
+        assert status == 200
+        assert data['data'] == {"hello": "world"}
+
+    def test_hash_mismatch(self):
+        """Test a query is not registered under a hash that does not match it"""
+        store = PersistedQueryStore()
+        client = _client(store)
+
+        status, data = _post(client, {"query": QUERY, "extensions": _persisted(query_hash("{ other }"))})
+        assert status == 400
+        assert len(store) == 0
+
+    def test_persisted_queries_only(self):
+        """Test unregistered queries are rejected when only persisted queries are allowed"""
+        store = PersistedQueryStore()
+        with tempfile.NamedTemporaryFile('wt', suffix='.json', delete=False) as mf:
+            json.dump({query_hash(QUERY): QUERY}, mf)
+        try:
+            assert store.load(mf.name) == 1
+        finally:
+            os.remove(mf.name)
+
+        client = _client(store, persisted_queries_only=True)
+
+        status, data = _post(client, {"extensions": _persisted(query_hash(QUERY))})
+        assert status == 200
+        assert data['data'] == {"hello": "world"}
+
+        status, data = _post(client, {"query": QUERY})
+        assert status == 200
+
+        status, data = _post(client, {"query": "query Other { hello }"})
+        assert status == 403
+        assert data['errors'][0]['message'] == "PersistedQueryNotAllowed"
+
+    def test_store_eviction_keeps_pinned(self):
+        """Test automatically registered queries are evicted but pinned ones are not"""
+        store = PersistedQueryStore(max_size=1)
+        pinned = store.register(QUERY, pinned=True)
+        first = store.register("query A { hello }")
+        store.register("query B { hello }")
+
+        assert pinned in store
+        assert first not in store
+        assert len(store) == 2
+
+
+class CountingMiddleware(object):
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.before = 0
+        self.after = []
+
+    def before_execute(self, context):
+        self.before += 1
+        if self.fail:
+            from lmcommon.auth.identity import AuthenticationError
+            raise AuthenticationError("User not authenticated", 401)
+
+    def after_execute(self, context, document, params, result):
+        self.after.append((document, params, result))
+
+
+class Item(graphene.ObjectType):
+    name = graphene.String()
+
+
+class ListQuery(graphene.ObjectType):
+    items = graphene.List(Item)
+
+    def resolve_items(self, info):
+        return [Item(name=str(i)) for i in range(100)]
+
+
+class UpdateInput(graphene.InputObjectType):
+    owner = graphene.String()
+    labbook_name = graphene.String()
+
+
+class Update(graphene.Mutation):
+    class Arguments:
+        input = UpdateInput()
+
+    ok = graphene.Boolean()
+
+    def mutate(self, info, input):
+        return Update(ok=True)
+
+
+class Mutation(graphene.ObjectType):
+    update = Update.Field()
+
+
+class TestRequestMiddleware(object):
+    def test_runs_once_per_request(self):
+        """Test request middleware runs once, however many fields are resolved"""
+        mw = CountingMiddleware()
+        app = flask.Flask("lmsrvlabbook")
+        app.add_url_rule('/labbook/', view_func=LabManagerGraphQLView.as_view(
+            'graphql', schema=graphene.Schema(query=ListQuery), request_middleware=[mw]))
+
+        status, data = _post(app.test_client(), {"query": "{ items { name } }"})
+        assert status == 200
+        assert len(data['data']['items']) == 100
+        assert mw.before == 1
+        assert len(mw.after) == 1
+        document, params, result = mw.after[0]
+        assert document.document_string == "{ items { name } }"
+        assert result.errors is None
+
+    def test_authentication_error(self):
+        """Test a failure before execution is reported as a GraphQL error without executing"""
+        mw = CountingMiddleware(fail=True)
+        app = flask.Flask("lmsrvlabbook")
+        app.add_url_rule('/labbook/', view_func=LabManagerGraphQLView.as_view(
+            'graphql', schema=graphene.Schema(query=ListQuery), request_middleware=[mw]))
+
+        status, data = _post(app.test_client(), {"query": "{ items { name } }"})
+        assert status == 200
+        assert data['data'] is None
+        assert "User not authenticated" in data['errors'][0]['message']
+        assert mw.after == []
+
+    def test_mutated_labbooks(self):
+        """Test LabBooks targeted by a mutation are found from the document and variables"""
+        from lmsrvcore.middleware.dataloader import mutated_labbooks
+
+        mutation_schema = graphene.Schema(query=ListQuery, mutation=Mutation)
+        document = CachedGraphQLBackend().document_from_string(mutation_schema, """
+            mutation M($input: UpdateInput) {
+                a: update(input: $input) { ok }
+                b: update(input: {owner: "test", labbookName: "lb2"}) { ok }
+            }""")
+
+        targets = list(mutated_labbooks(mutation_schema, document.document_ast, "M",
+                                        {"input": {"owner": "default", "labbookName": "lb1"}}))
+        assert targets == [("default", "lb1"), ("test", "lb2")]
+
+        query_document = CachedGraphQLBackend().document_from_string(mutation_schema, "{ items { name } }")
+        assert list(mutated_labbooks(mutation_schema, query_document.document_ast)) == []
+
+
+class CountingQuery(graphene.ObjectType):
+    count = graphene.Int()
+
+    def resolve_count(self, info):
+        CountingQuery.executions += 1
+        return CountingQuery.executions
+
+
+CountingQuery.executions = 0
+
+
+class StaticFingerprint(object):
+    def __init__(self):
+        self.state = "a"
+
+    def fingerprint(self, context, document, params):
+        return self.state
+
+
+class TestConditionalRequests(object):
+    def _client(self, provider):
+        app = flask.Flask("lmsrvlabbook")
+        app.add_url_rule('/labbook/', view_func=LabManagerGraphQLView.as_view(
+            'graphql', schema=graphene.Schema(query=CountingQuery), etag_provider=provider))
+        return app.test_client()
+
+    def test_not_modified(self):
+        """Test a request matching the ETag is answered with 304 without executing, until the state changes"""
+        provider = StaticFingerprint()
+        client = self._client(provider)
+        body = json.dumps({"query": "{ count }"})
+
+        r = client.post('/labbook/', data=body, content_type='application/json')
+        assert r.status_code == 200
+        etag = r.headers['ETag']
+        assert etag.startswith('W/')
+        executions = CountingQuery.executions
+
+        r = client.post('/labbook/', data=body, content_type='application/json', headers={'If-None-Match': etag})
+        assert r.status_code == 304
+        assert r.headers['ETag'] == etag
+        assert r.data == b''
+        assert CountingQuery.executions == executions
+
+        provider.state = "b"
+        r = client.post('/labbook/', data=body, content_type='application/json', headers={'If-None-Match': etag})
+        assert r.status_code == 200
+        assert r.headers['ETag'] != etag
+        assert CountingQuery.executions == executions + 1
+
+    def test_etag_depends_on_request(self):
+        """Test different queries and variables over the same state get different ETags"""
+        client = self._client(StaticFingerprint())
+
+        r1 = client.post('/labbook/', data=json.dumps({"query": "{ count }"}), content_type='application/json')
+        r2 = client.post('/labbook/', data=json.dumps({"query": "query A { count }"}),
+                         content_type='application/json')
+        assert r1.headers['ETag'] != r2.headers['ETag']
+
+    def test_no_etag(self):
+        """Test no ETag is sent without a provider, or when the provider cannot fingerprint the request"""
+        provider = StaticFingerprint()
+        provider.state = None
+        for client in (self._client(None), self._client(provider)):
+            r = client.post('/labbook/', data=json.dumps({"query": "{ count }"}), content_type='application/json')
+            assert r.status_code == 200
+            assert 'ETag' not in r.headers
+
+    def test_no_etag_on_error(self):
+        """Test responses with errors are not given an ETag"""
+        client = self._client(StaticFingerprint())
+        r = client.post('/labbook/', data=json.dumps({"query": "{ missing }"}), content_type='application/json')
+        assert r.status_code == 400
+        assert 'ETag' not in r.headers
@@ -0,0 +1,130 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import pytest
+
+from lmsrvcore.api.connections import KeysetConnection, encode_key_cursor
+
+KEYS = [f"file{i:02d}" for i in range(10)]
+
+
+def _forward(after):
+    return ({"key": k} for k in KEYS if after is None or k > after)
+
+
+def _backward(before):
+    return ({"key": k} for k in reversed(KEYS) if before is None or k < before)
+
+
+def _keys(connection):
+    return [e['key'] for e in connection.edges]
+
+
+class TestKeysetConnection(object):
+    def test_first_and_after(self):
+        """Test paging forward reads one page at a time and ends with has_next_page False"""
+        conn = KeysetConnection(_forward, {"first": 4})
+        conn.apply()
+        assert _keys(conn) == KEYS[:4]
+        assert conn.page_info.has_next_page is True
+        assert conn.page_info.end_cursor == encode_key_cursor("file03")
+
+        conn = KeysetConnection(_forward, {"first": 4, "after": conn.page_info.end_cursor})
+        conn.apply()
+        assert _keys(conn) == KEYS[4:8]
+
+        conn = KeysetConnection(_forward, {"first": 4, "after": conn.page_info.end_cursor})
+        conn.apply()
+        assert _keys(conn) == KEYS[8:]
+        assert conn.page_info.has_next_page is False
+
+    def test_reads_only_page(self):
+        """Test only one edge past the page is read from the source"""
+        read = list()
+
+        def forward(after):
+            for k in KEYS:
+                read.append(k)
+                yield {"key": k}
+
+        conn = KeysetConnection(forward, {"first": 2})
+        conn.apply()
+        assert read == KEYS[:3]
+
+    def test_cursor_survives_insert(self):
+        """Test a cursor still points to the same position after an edge is inserted before it"""
+        conn = KeysetConnection(_forward, {"first": 3})
+        conn.apply()
+        cursor = conn.page_info.end_cursor
+
+        KEYS.insert(0, "file00a")
+        try:
+            conn = KeysetConnection(_forward, {"first": 1, "after": cursor})
+            conn.apply()
+            assert _keys(conn) == ["file03"]
+        finally:
+            KEYS.remove("file00a")
+
+    def test_last_and_before(self):
+        """Test paging backward, with and without a reverse source"""
+        for backward in (_backward, None):
+            conn = KeysetConnection(_forward, {"last": 3, "before": encode_key_cursor("file05")}, backward=backward)
+            conn.apply()
+            assert _keys(conn) == ["file02", "file03", "file04"]
+            assert conn.page_info.has_previous_page is True
+            assert conn.page_info.has_next_page is False
+
+    def test_after_and_before(self):
+        """Test the page stops at the `before` cursor"""
+        conn = KeysetConnection(_forward, {"after": encode_key_cursor("file01"), "before": encode_key_cursor("file04")})
+        conn.apply()
+        assert _keys(conn) == ["file02", "file03"]
+
+    def test_removed_stop_cursor(self):
+        """Test a page still ends at a `before` or `after` cursor whose edge was removed"""
+        conn = KeysetConnection(_forward, {"after": encode_key_cursor("file01"),
+                                           "before": encode_key_cursor("file04a")})
+        conn.apply()
+        assert _keys(conn) == ["file02", "file03", "file04"]
+
+        for backward in (_backward, None):
+            conn = KeysetConnection(_forward, {"last": 5, "after": encode_key_cursor("file01a"),
+                                               "before": encode_key_cursor("file04a")}, backward=backward)
+            conn.apply()
+            assert _keys(conn) == ["file02", "file03", "file04"]
+
+    def test_descending_position(self):
+        """Test a custom position function and descending order decide where a page ends"""
+        keys = ["9", "10", "100"]
+
+        def forward(after):
+            return ({"key": k} for k in reversed(keys) if after is None or int(k) < int(after))
+
+        conn = KeysetConnection(forward, {"before": encode_key_cursor("9")}, position=int, descending=True)
+        conn.apply()
+        assert _keys(conn) == ["100", "10"]
+
+    def test_invalid_args(self):
+        """Test invalid arguments are rejected"""
+        with pytest.raises(ValueError):
+            KeysetConnection(_forward, {"first": 1, "last": 1}).apply()
+        with pytest.raises(ValueError):
+            KeysetConnection(_forward, {"first": -1}).apply()
+        with pytest.raises(ValueError):
+            KeysetConnection(_forward, {"after": "not base64!"}).apply()
@@ -0,0 +1,79 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import graphene
+from graphene.test import Client
+from promise import Promise
+
+from lmsrvcore.middleware.metric import ResolverProfiler, ResolverProfilerMiddleware
+
+
+class Query(graphene.ObjectType):
+    fast = graphene.String()
+    deferred = graphene.String()
+    broken = graphene.String()
+
+    def resolve_fast(self, info):
+        return "fast"
+
+    def resolve_deferred(self, info):
+        return Promise.resolve("deferred")
+
+    def resolve_broken(self, info):
+        raise ValueError("broken")
+
+
+class TestResolverProfiler(object):
+    def test_aggregates_calls(self):
+        """Test resolver calls are folded into per-field histograms"""
+        profiler = ResolverProfiler()
+        client = Client(graphene.Schema(query=Query), middleware=[ResolverProfilerMiddleware(profiler=profiler)])
+
+        for _ in range(3):
+            r = client.execute("{ fast deferred }")
+            assert r['data'] == {"fast": "fast", "deferred": "deferred"}
+        client.execute("{ broken }")
+
+        data = {(d['parent_type'], d['field_name']): d for d in profiler.snapshot()}
+        assert data[('Query', 'fast')]['count'] == 3
+        assert data[('Query', 'deferred')]['count'] == 3
+        assert sum(data[('Query', 'fast')]['buckets']) == 3
+        assert data[('Query', 'broken')]['errors'] == 1
+
+    def test_sampling(self):
+        """Test a sample rate of 0 records nothing"""
+        profiler = ResolverProfiler()
+        client = Client(graphene.Schema(query=Query),
+                        middleware=[ResolverProfilerMiddleware(sample_rate=0.0, profiler=profiler)])
+        client.execute("{ fast }")
+        assert profiler.snapshot() == []
+
+    def test_render_prometheus(self):
+        """Test the Prometheus text rendering"""
+        profiler = ResolverProfiler()
+        profiler.observe("Labbook", "sizeBytes", 0.2)
+        profiler.observe("Labbook", "sizeBytes", 3.0)
+
+        text = profiler.render_prometheus()
+        labels = 'parent_type="Labbook",field_name="sizeBytes"'
+        assert "# TYPE labmanager_resolver_duration_seconds histogram" in text
+        assert f'labmanager_resolver_duration_seconds_bucket{{{labels},le="0.25"}} 1' in text
+        assert f'labmanager_resolver_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+        assert f'labmanager_resolver_duration_seconds_count{{{labels}}} 2' in text
+        assert f'labmanager_resolver_errors_total{{{labels}}} 0' in text
@@ -0,0 +1,138 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import threading
+
+import graphene
+import pytest
+from graphql import parse
+
+from lmsrvcore.view import AdmissionController, CachedGraphQLBackend, QueryCostAnalyzer, QueryCostError
+
+
+class Item(graphene.ObjectType):
+    name = graphene.String()
+    size_bytes = graphene.String()
+
+    def resolve_name(self, info):
+        return "item"
+
+    def resolve_size_bytes(self, info):
+        return "10"
+
+
+class ItemConnection(graphene.relay.Connection):
+    class Meta:
+        node = Item
+
+
+class Query(graphene.ObjectType):
+    items = graphene.relay.ConnectionField(ItemConnection)
+
+    def resolve_items(self, info, **kwargs):
+        return [Item() for _ in range(3)]
+
+
+schema = graphene.Schema(query=Query)
+
+FIELD_COSTS = {("Item", "sizeBytes"): 10}
+
+
+def _estimate(query, variables=None):
+    return QueryCostAnalyzer(FIELD_COSTS).estimate(schema, parse(query), variables=variables)
+
+
+class TestQueryCostAnalyzer(object):
+    def test_scalar_fields_are_free(self):
+        """Test scalars without a configured weight do not add cost"""
+        # items: 1, edges: 1 * 5, node: 1 * 5
+        assert _estimate("{ items(first: 5) { edges { node { name } } } }") == 11
+
+    def test_weighted_field_multiplied_by_first(self):
+        """Test an expensive field is multiplied by the page size"""
+        assert _estimate("{ items(first: 5) { edges { node { sizeBytes } } } }") == 11 + 50
+        assert _estimate("{ items(last: 50) { edges { node { sizeBytes } } } }") == 101 + 500
+
+    def test_variables_and_default_page_size(self):
+        """Test page sizes are read from variables and default when missing"""
+        query = "query Q($n: Int = 2) { items(first: $n) { edges { node { sizeBytes } } } }"
+        assert _estimate(query) == 5 + 20
+        assert _estimate(query, {"n": 10}) == 21 + 100
+        assert _estimate("{ items { edges { node { sizeBytes } } } }") == 41 + 200
+
+    def test_fragments(self):
+        """Test fields selected through fragments are counted"""
+        query = """{ items(first: 5) { edges { node { ...F } } } }
+                   fragment F on Item { sizeBytes }"""
+        assert _estimate(query) == 11 + 50
+
+
+class TestAdmissionControl(object):
+    def test_cost_reported_in_extensions(self):
+        """Test the estimated cost is reported with the result"""
+        backend = CachedGraphQLBackend(admission=AdmissionController(budget=1000),
+                                       cost_analyzer=QueryCostAnalyzer(FIELD_COSTS))
+        result = backend.document_from_string(schema, "{ items(first: 5) { edges { node { sizeBytes } } } }").execute()
+        assert result.errors is None
+        assert len(result.data['items']['edges']) == 3
+        assert result.extensions['cost'] == {"requestedQueryCost": 61, "maximumAvailable": 1000}
+
+    def test_over_budget_rejected(self):
+        """Test a query above the budget is not executed"""
+        backend = CachedGraphQLBackend(admission=AdmissionController(budget=100),
+                                       cost_analyzer=QueryCostAnalyzer(FIELD_COSTS))
+        result = backend.document_from_string(schema, "{ items(first: 50) { edges { node { sizeBytes } } } }").execute()
+        assert result.invalid is True
+        assert "exceeds the maximum allowed cost" in str(result.errors[0])
+        assert result.extensions['cost']['requestedQueryCost'] == 601
+        assert backend.stats()['rejected'] == 1
+
+    def test_expensive_queries_queued(self):
+        """Test expensive queries wait for a slot and time out if none frees up"""
+        admission = AdmissionController(budget=None, queue_threshold=10, max_concurrent=1, queue_timeout=0.1)
+
+        with admission.admit(5):
+            pass
+
+        entered = threading.Event()
+        release = threading.Event()
+
+        def hold_slot():
+            with admission.admit(20):
+                entered.set()
+                release.wait()
+
+        t = threading.Thread(target=hold_slot)
+        t.start()
+        entered.wait()
+        try:
+            with pytest.raises(QueryCostError):
+                with admission.admit(20):
+                    pass
+            # Cheap queries are not queued
+            with admission.admit(5):
+                pass
+        finally:
+            release.set()
+            t.join()
+
+        with admission.admit(20):
+            pass
+        assert admission.queued == 3
+        assert admission.rejected == 1
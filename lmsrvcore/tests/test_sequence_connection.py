@@ -0,0 +1,116 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import base64
+
+import pytest
+
+from lmsrvcore.api.connections import ListBasedConnection, SequenceConnection, encode_offset_cursor
+
+ITEMS = [f"item{i}" for i in range(10)]
+
+
+class LazySequence(object):
+    """A sequence that records which slices were read"""
+    def __init__(self, items):
+        self.items = items
+        self.reads = list()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, item):
+        self.reads.append(item)
+        return self.items[item]
+
+
+def _legacy(args):
+    cursors = [base64.b64encode("{}".format(cnt).encode("UTF-8")).decode("UTF-8") for cnt, x in enumerate(ITEMS)]
+    conn = ListBasedConnection(ITEMS, cursors, args)
+    conn.apply()
+    return conn
+
+
+class TestSequenceConnection(object):
+    @pytest.mark.parametrize("args", [{},
+                                      {"first": 3},
+                                      {"first": 0},
+                                      {"first": 20},
+                                      {"last": 4},
+                                      {"after": encode_offset_cursor(2)},
+                                      {"after": encode_offset_cursor(2), "first": 3},
+                                      {"after": encode_offset_cursor(8), "first": 3},
+                                      {"after": encode_offset_cursor(9), "first": 3},
+                                      {"before": encode_offset_cursor(6), "last": 2},
+                                      {"before": encode_offset_cursor(0), "last": 2},
+                                      {"after": encode_offset_cursor(1), "before": encode_offset_cursor(7)},
+                                      {"after": encode_offset_cursor(1), "before": encode_offset_cursor(7),
+                                       "first": 2}])
+    def test_matches_list_based_connection(self, args):
+        """Test edges, cursors and page info are the same as ListBasedConnection"""
+        expected = _legacy(dict(args))
+        conn = SequenceConnection(ITEMS, dict(args))
+        conn.apply()
+
+        assert list(conn.edges) == list(expected.edges)
+        assert list(conn.cursors) == list(expected.cursors)
+        assert conn.page_info.has_next_page == expected.page_info.has_next_page
+        assert conn.page_info.has_previous_page == expected.page_info.has_previous_page
+        assert conn.page_info.start_cursor == expected.page_info.start_cursor
+        assert conn.page_info.end_cursor == expected.page_info.end_cursor
+        assert conn.total_count == len(ITEMS)
+
+    def test_reads_only_page(self):
+        """Test only the requested slice of the source is read"""
+        source = LazySequence(ITEMS)
+        conn = SequenceConnection(source, {"first": 2, "after": encode_offset_cursor(4)})
+        conn.apply()
+
+        assert conn.edges == ["item5", "item6"]
+        assert source.reads == [slice(5, 7)]
+
+    @pytest.mark.parametrize("cursor", [encode_offset_cursor(10), encode_offset_cursor(-1), "not-a-cursor",
+                                        base64.b64encode(b"abc").decode()])
+    def test_invalid_cursor(self, cursor):
+        """Test cursors that are malformed or out of range are rejected"""
+        conn = SequenceConnection(ITEMS, {"after": cursor})
+        with pytest.raises(ValueError, match="`after` cursor is invalid"):
+            conn.apply()
+
+        conn = SequenceConnection(ITEMS, {"before": cursor})
+        with pytest.raises(ValueError, match="`before` cursor is invalid"):
+            conn.apply()
+
+    def test_invalid_args(self):
+        """Test invalid slicing arguments are rejected"""
+        with pytest.raises(ValueError):
+            SequenceConnection(ITEMS, {"first": 1, "last": 1}).apply()
+        with pytest.raises(ValueError):
+            SequenceConnection(ITEMS, {"first": -1}).apply()
+        with pytest.raises(ValueError):
+            SequenceConnection(ITEMS, {"last": -1}).apply()
+
+    def test_empty(self):
+        """Test an empty source"""
+        conn = SequenceConnection([], {"first": 5})
+        conn.apply()
+        assert list(conn.edges) == []
+        assert conn.page_info.has_next_page is False
+        assert conn.page_info.start_cursor is None
+        assert conn.total_count == 0
@@ -0,0 +1,88 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import base64
+import json
+import time
+
+import pytest
+
+from lmcommon.auth.identity import AuthenticationError
+from lmsrvcore.auth.cache import TokenCache, token_cache_key, token_expiration
+
+
+def _jwt(claims):
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip('=')
+    return f"eyJhbGciOiJub25lIn0.{payload}.signature"
+
+
+class TestTokenCache(object):
+    def test_key(self):
+        """Test keys depend on both tokens and are not computed without tokens"""
+        assert token_cache_key(None, None) is None
+        assert token_cache_key("a", None) != token_cache_key(None, "a")
+        assert token_cache_key("a", "b") == token_cache_key("a", "b")
+
+    def test_expiration(self):
+        """Test the earliest exp claim is used and opaque tokens are ignored"""
+        assert token_expiration(_jwt({"exp": 200}), _jwt({"exp": 100})) == 100
+        assert token_expiration("opaque-token", None) is None
+        assert token_expiration(_jwt({"sub": "user"})) is None
+
+    def test_authenticated_until_expiration(self):
+        """Test a validated token pair is cached until it expires"""
+        cache = TokenCache()
+        cache.put_authenticated("key", time.time() + 60)
+        cache.set_user("key", "user")
+
+        entry = cache.get("key")
+        assert entry.authenticated is True
+        assert entry.user == "user"
+
+        cache.put_authenticated("expired", time.time() - 1)
+        assert cache.get("expired") is None
+
+        cache.put_authenticated("key", time.time() + 0.1)
+        time.sleep(0.2)
+        assert cache.get("key") is None
+
+    def test_negative_cache(self):
+        """Test failed validation is cached and never carries a user"""
+        cache = TokenCache()
+        cache.put_failure("key", AuthenticationError("bad token", 401))
+        cache.set_user("key", "user")
+
+        entry = cache.get("key")
+        assert entry.authenticated is False
+        assert entry.user is None
+
+    def test_eviction_and_invalidate(self):
+        """Test the least recently used entry is evicted and entries can be invalidated"""
+        cache = TokenCache(max_size=2)
+        cache.put_authenticated("a")
+        cache.put_authenticated("b")
+        cache.get("a")
+        cache.put_authenticated("c")
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+
+        cache.invalidate("a")
+        assert cache.get("a") is None
+        assert len(cache) == 1
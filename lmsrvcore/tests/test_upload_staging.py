@@ -0,0 +1,87 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import time
+
+import pytest
+
+from lmsrvcore.tests.fixtures import fixture_working_dir_with_cached_user
+from lmsrvcore.api.mutations import ChunkManifest, UploadStagingManager
+
+
+def _stage_upload(manager, username, name, size):
+    data_path = os.path.join(manager.directory(username), name)
+    ChunkManifest(f"{data_path}.chunks").begin(data_path, 1, size)
+    with open(data_path, 'r+b') as df:
+        df.write(os.urandom(size))
+    return data_path
+
+
+class TestUploadStaging(object):
+    def test_quota(self, fixture_working_dir_with_cached_user):
+        """Test new uploads are rejected once they would exceed the user or global quota"""
+        manager = UploadStagingManager(quota_bytes=1024 * 1024, user_quota_bytes=600 * 1024)
+        _stage_upload(manager, "user1", "upload1-a.bin", 500 * 1024)
+
+        assert manager.usage()["user1"] >= 500 * 1024
+        manager.check_quota("user1", 50 * 1024)
+        with pytest.raises(ValueError):
+            manager.check_quota("user1", 200 * 1024)
+
+        _stage_upload(manager, "user2", "upload2-b.bin", 500 * 1024)
+        manager.check_quota("user3", 10 * 1024)
+        with pytest.raises(ValueError):
+            manager.check_quota("user3", 100 * 1024)
+
+        stats = manager.stats()
+        assert stats['rejected_uploads'] == 2
+        assert stats['users'] == 2
+        assert stats['bytes'] >= 1000 * 1024
+
+    def test_reap(self, fixture_working_dir_with_cached_user):
+        """Test uploads not written to for longer than the maximum age are removed, and active ones are kept"""
+        manager = UploadStagingManager(max_age=3600)
+        stale = _stage_upload(manager, "user1", "upload1-a.bin", 1024)
+        active = _stage_upload(manager, "user1", "upload2-b.bin", 1024)
+        orphan = os.path.join(manager.directory("user2"), "upload3-c.bin")
+        with open(orphan, 'wb') as of:
+            of.write(b"partial")
+
+        old = time.time() - 7200
+        for path in (stale, f"{stale}.chunks", orphan):
+            os.utime(path, (old, old))
+
+        assert manager.reap() == 2
+        assert not os.path.exists(stale)
+        assert not os.path.exists(f"{stale}.chunks")
+        assert not os.path.exists(orphan)
+        assert os.path.exists(active)
+        assert os.path.exists(f"{active}.chunks")
+
+        stats = manager.stats()
+        assert stats['reaped_uploads'] == 2
+        assert stats['reaped_bytes'] > 0
+
+    def test_reaper_thread(self, fixture_working_dir_with_cached_user):
+        """Test the background reaper can be started and stopped"""
+        manager = UploadStagingManager(reap_interval=0.01)
+        manager.start_reaper()
+        manager.start_reaper()
+        manager.stop_reaper()
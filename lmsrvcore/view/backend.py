@@ -0,0 +1,155 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import threading
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Dict, Optional
+
+from graphql import parse, validate, execute
+from graphql.backend.base import GraphQLBackend, GraphQLDocument
+from graphql.execution import ExecutionResult
+
+from lmsrvcore.view.cost import AdmissionController, QueryCostAnalyzer, QueryCostError
+from lmsrvcore.view.persisted import query_hash
+
+# Maximum number of parsed and validated documents kept in memory
+DOCUMENT_CACHE_MAX_SIZE = 500
+
+
+def _invalid_document(errors, *args, **kwargs) -> ExecutionResult:
+    return ExecutionResult(errors=errors, invalid=True)
+
+
+class CachedGraphQLBackend(GraphQLBackend):
+    """GraphQL backend that parses and validates each distinct document once
+
+    Documents are keyed by the sha256 of their text and kept in an LRU. Cached documents execute without
+    re-validation. Documents that fail validation are cached too, so repeated invalid requests are rejected cheaply.
+
+    If an AdmissionController is provided, the cost of each operation is estimated before it executes, the query is
+    admitted, queued or rejected accordingly, and the estimate is reported in the `cost` response extension.
+    """
+    def __init__(self, max_size: int = DOCUMENT_CACHE_MAX_SIZE, executor: Any = None,
+                 admission: Optional[AdmissionController] = None,
+                 cost_analyzer: Optional[QueryCostAnalyzer] = None) -> None:
+        self.max_size = max_size
+        self.execute_params = {"executor": executor}
+        self.admission = admission
+        self.cost_analyzer = cost_analyzer or QueryCostAnalyzer()
+        self._documents: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def build_document(self, schema, document_string: str) -> GraphQLDocument:
+        """Method to parse and validate a document
+
+        Args:
+            schema(GraphQLSchema): Schema to validate against
+            document_string(str): The GraphQL document text
+
+        Returns:
+            GraphQLDocument
+        """
+        document_ast = parse(document_string)
+        validation_errors = validate(schema, document_ast)
+        if validation_errors:
+            execute_fn = partial(_invalid_document, validation_errors)
+        else:
+            execute_fn = partial(self.execute_document, schema, document_ast)
+
+        return GraphQLDocument(schema=schema,
+                               document_string=document_string,
+                               document_ast=document_ast,
+                               execute=execute_fn)
+
+    def execute_document(self, schema, document_ast, *args, **kwargs) -> ExecutionResult:
+        """Method to execute a validated document, subject to admission control
+
+        Args:
+            schema(GraphQLSchema): Schema the document was validated against
+            document_ast(Document): The parsed document
+            *args: Positional execution options
+            **kwargs: Keyword execution options
+
+        Returns:
+            ExecutionResult
+        """
+        execute_kwargs = dict(self.execute_params)
+        execute_kwargs.update(kwargs)
+        if self.admission is None:
+            return execute(schema, document_ast, *args, **execute_kwargs)
+
+        cost = self.cost_analyzer.estimate(schema, document_ast, kwargs.get('operation_name'), kwargs.get('variables'))
+        cost_extension = {"requestedQueryCost": cost, "maximumAvailable": self.admission.budget}
+        try:
+            with self.admission.admit(cost):
+                result = execute(schema, document_ast, *args, **execute_kwargs)
+        except QueryCostError as err:
+            return ExecutionResult(errors=[err], invalid=True, extensions={"cost": cost_extension})
+
+        if isinstance(result, ExecutionResult):
+            result.extensions["cost"] = cost_extension
+        return result
+
+    def document_from_string(self, schema, document_string: str) -> GraphQLDocument:
+        key = (id(schema), query_hash(document_string))
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+                self.hits += 1
+                return document
+            self.misses += 1
+
+        # Syntax errors propagate to the caller and are not cached
+        document = self.build_document(schema, document_string)
+
+        with self._lock:
+            self._documents[key] = document
+            while len(self._documents) > self.max_size:
+                self._documents.popitem(last=False)
+
+        return document
+
+    def clear(self) -> None:
+        with self._lock:
+            self._documents.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Method to get the current cache counters
+
+        Returns:
+            dict
+        """
+        with self._lock:
+            stats = {"size": len(self._documents),
+                     "max_size": self.max_size,
+                     "hits": self.hits,
+                     "misses": self.misses}
+
+        if self.admission is not None:
+            stats["rejected"] = self.admission.rejected
+            stats["queued"] = self.admission.queued
+        return stats
@@ -0,0 +1,234 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+from graphql.language import ast
+from graphql.type.definition import GraphQLList, GraphQLNonNull, get_named_type, is_composite_type
+
+from lmcommon.logging import LMLogger
+
+logger = LMLogger.get_logger()
+
+# Cost of resolving a single instance of a field, keyed by (parent type, field name). Fields not listed cost 1 if they
+# return an object type and 0 if they return a scalar.
+FIELD_COSTS: Dict[Tuple[str, str], int] = {
+    ("LabbookSection", "allFiles"): 50,
+    ("LabbookSection", "files"): 5,
+    ("Labbook", "sizeBytes"): 25,
+    ("Labbook", "updatesAvailableCount"): 25,
+    ("Labbook", "collaborators"): 10,
+    ("Labbook", "canManageCollaborators"): 10,
+    ("Labbook", "visibility"): 10,
+    ("Labbook", "isRepoClean"): 5,
+    ("Environment", "imageStatus"): 5,
+    ("Environment", "containerStatus"): 5,
+    ("LabbookList", "remoteLabbooks"): 20,
+}
+
+# Page size assumed for paginated fields queried without `first` or `last`
+DEFAULT_PAGE_SIZE = 20
+
+# Size assumed for plain list fields outside of a connection
+DEFAULT_LIST_SIZE = 10
+
+# Queries estimated above this cost are rejected
+QUERY_COST_BUDGET = 5000
+
+# Queries estimated above this cost wait for one of a limited number of slots before executing
+QUERY_COST_QUEUE_THRESHOLD = 500
+
+# Number of expensive queries that may execute at the same time
+EXPENSIVE_QUERY_CONCURRENCY = 2
+
+# Seconds an expensive query waits for a slot before it is rejected
+EXPENSIVE_QUERY_QUEUE_TIMEOUT = 60
+
+
+class QueryCostError(Exception):
+    """Raised when a query is refused by admission control"""
+    pass
+
+
+class QueryCostAnalyzer(object):
+    """Static cost estimator run on a validated document
+
+    Every field selected contributes its weight, multiplied by the number of times it is expected to resolve. Paginated
+    fields multiply the cost of their selections by `first`/`last` (or DEFAULT_PAGE_SIZE), and plain lists by
+    DEFAULT_LIST_SIZE.
+    """
+    def __init__(self, field_costs: Optional[Dict[Tuple[str, str], int]] = None) -> None:
+        self.field_costs = field_costs if field_costs is not None else FIELD_COSTS
+
+    def estimate(self, schema, document_ast: ast.Document, operation_name: Optional[str] = None,
+                 variables: Optional[Dict[str, Any]] = None) -> int:
+        """Method to estimate the cost of executing an operation
+
+        Args:
+            schema(GraphQLSchema): Schema the document was validated against
+            document_ast(Document): The parsed document
+            operation_name(str): Operation to execute, optional if the document has a single operation
+            variables(dict): Variable values provided with the request
+
+        Returns:
+            int
+        """
+        operation = None
+        fragments = dict()
+        for definition in document_ast.definitions:
+            if isinstance(definition, ast.OperationDefinition):
+                if not operation_name or (definition.name and definition.name.value == operation_name):
+                    operation = definition
+            elif isinstance(definition, ast.FragmentDefinition):
+                fragments[definition.name.value] = definition
+
+        if operation is None:
+            # Let execution report the missing operation
+            return 0
+
+        variable_values = dict()
+        for variable_definition in operation.variable_definitions or []:
+            if isinstance(variable_definition.default_value, ast.IntValue):
+                variable_values[variable_definition.variable.name.value] = \
+                    int(variable_definition.default_value.value)
+        variable_values.update(variables or {})
+
+        if operation.operation == 'mutation':
+            root_type = schema.get_mutation_type()
+        elif operation.operation == 'subscription':
+            root_type = schema.get_subscription_type()
+        else:
+            root_type = schema.get_query_type()
+
+        return self._selection_set_cost(schema, root_type, operation.selection_set, 1, fragments, variable_values)
+
+    def _selection_set_cost(self, schema, parent_type, selection_set, multiplier: int,
+                            fragments: dict, variables: dict) -> int:
+        if selection_set is None or parent_type is None:
+            return 0
+
+        cost = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, ast.Field):
+                cost += self._field_cost(schema, parent_type, selection, multiplier, fragments, variables)
+            elif isinstance(selection, ast.InlineFragment):
+                fragment_type = schema.get_type(selection.type_condition.name.value) \
+                    if selection.type_condition else parent_type
+                cost += self._selection_set_cost(schema, fragment_type, selection.selection_set, multiplier,
+                                                 fragments, variables)
+            elif isinstance(selection, ast.FragmentSpread):
+                fragment = fragments.get(selection.name.value)
+                if fragment:
+                    cost += self._selection_set_cost(schema, schema.get_type(fragment.type_condition.name.value),
+                                                     fragment.selection_set, multiplier, fragments, variables)
+        return cost
+
+    def _field_cost(self, schema, parent_type, field: ast.Field, multiplier: int,
+                    fragments: dict, variables: dict) -> int:
+        field_name = field.name.value
+        parent_fields = getattr(parent_type, 'fields', None)
+        if field_name.startswith('__') or not parent_fields or field_name not in parent_fields:
+            return 0
+
+        field_def = parent_fields[field_name]
+        named_type = get_named_type(field_def.type)
+        weight = self.field_costs.get((parent_type.name, field_name),
+                                      1 if is_composite_type(named_type) else 0)
+        cost = weight * multiplier
+
+        if field.selection_set:
+            cost += self._selection_set_cost(schema, named_type, field.selection_set,
+                                             multiplier * self._list_size(parent_type, field, field_def, variables),
+                                             fragments, variables)
+        return cost
+
+    @staticmethod
+    def _list_size(parent_type, field: ast.Field, field_def, variables: dict) -> int:
+        if 'first' in field_def.args or 'last' in field_def.args:
+            size = None
+            for argument in field.arguments or []:
+                if argument.name.value in ('first', 'last'):
+                    if isinstance(argument.value, ast.IntValue):
+                        size = int(argument.value.value)
+                    elif isinstance(argument.value, ast.Variable):
+                        size = variables.get(argument.value.name.value)
+            try:
+                return max(int(size), 0) if size is not None else DEFAULT_PAGE_SIZE
+            except (TypeError, ValueError):
+                # Execution reports the invalid argument
+                return DEFAULT_PAGE_SIZE
+
+        field_type = field_def.type.of_type if isinstance(field_def.type, GraphQLNonNull) else field_def.type
+        if isinstance(field_type, GraphQLList) and not parent_type.name.endswith('Connection'):
+            # Edge lists are already bounded by the connection's page size
+            return DEFAULT_LIST_SIZE
+
+        return 1
+
+
+class AdmissionController(object):
+    """Admission control for queries based on their estimated cost
+
+    Queries above `budget` are rejected. Queries above `queue_threshold` must hold one of `max_concurrent` slots while
+    they execute, waiting up to `queue_timeout` seconds for one to free up.
+    """
+    def __init__(self, budget: Optional[int] = QUERY_COST_BUDGET,
+                 queue_threshold: Optional[int] = QUERY_COST_QUEUE_THRESHOLD,
+                 max_concurrent: int = EXPENSIVE_QUERY_CONCURRENCY,
+                 queue_timeout: float = EXPENSIVE_QUERY_QUEUE_TIMEOUT) -> None:
+        self.budget = budget
+        self.queue_threshold = queue_threshold
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+
+        self.rejected = 0
+        self.queued = 0
+
+    @contextmanager
+    def admit(self, cost: int):
+        """Context manager holding the admission for a query while it executes
+
+        Args:
+            cost(int): Estimated cost of the query
+
+        Raises:
+            QueryCostError
+        """
+        if self.budget is not None and cost > self.budget:
+            with self._lock:
+                self.rejected += 1
+            raise QueryCostError(f"Query cost {cost} exceeds the maximum allowed cost of {self.budget}")
+
+        if self.queue_threshold is None or cost <= self.queue_threshold:
+            yield
+            return
+
+        with self._lock:
+            self.queued += 1
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise QueryCostError(f"Timed out waiting to execute query with cost {cost}. Try again later.")
+        try:
+            yield
+        finally:
+            self._slots.release()
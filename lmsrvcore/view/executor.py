@@ -0,0 +1,118 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict
+
+from flask.globals import _app_ctx_stack, _request_ctx_stack
+from promise import Promise
+
+from lmcommon.logging import LMLogger
+
+logger = LMLogger.get_logger()
+
+# Maximum number of threads running blocking resolver work, shared by all requests
+RESOLVER_POOL_MAX_WORKERS = 8
+
+
+def _run_in_context(app_ctx, request_ctx, fn: Callable, args: tuple, kwargs: dict) -> Any:
+    """Run a function on a worker thread with the submitting request's Flask contexts active
+
+    The context objects are pushed onto the worker's thread-local stacks directly (rather than via ctx.push()), so
+    the worker shares the request's `flask.g`, identity and headers instead of starting a new request.
+    """
+    if app_ctx is not None:
+        _app_ctx_stack.push(app_ctx)
+    if request_ctx is not None:
+        _request_ctx_stack.push(request_ctx)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        if request_ctx is not None:
+            _request_ctx_stack.pop()
+        if app_ctx is not None:
+            _app_ctx_stack.pop()
+
+
+class PooledResolverExecutor(object):
+    """graphql-core executor that runs blocking resolver work on a shared, bounded thread pool
+
+    Resolvers themselves, and all promise and DataLoader bookkeeping, stay on the request thread since the promise
+    library's scheduler is not thread-safe. Only work explicitly handed to `submit()` (via `run_in_executor`) runs on
+    the pool. Its result is settled back on the request thread in `wait_until_finished()`, so independent Docker, git
+    and GitLab calls within a request overlap instead of running back to back.
+
+    An instance holds the pending work of a single request.
+    """
+    def __init__(self, pool: ThreadPoolExecutor) -> None:
+        self.pool = pool
+        self._pending: Dict[Future, Promise] = dict()
+
+    def execute(self, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Promise:
+        """Method to run a function on the pool
+
+        Args:
+            fn(callable): Function to run
+            *args: Positional arguments for fn
+            **kwargs: Keyword arguments for fn
+
+        Returns:
+            Promise
+        """
+        promise = Promise()
+        future = self.pool.submit(_run_in_context, _app_ctx_stack.top, _request_ctx_stack.top, fn, args, kwargs)
+        self._pending[future] = promise
+        return promise
+
+    def wait_until_finished(self) -> None:
+        # Settling a promise may run callbacks that submit more work, so loop until nothing is outstanding
+        while self._pending:
+            done, _ = wait(list(self._pending.keys()), return_when=FIRST_COMPLETED)
+            for future in done:
+                promise = self._pending.pop(future)
+                err = future.exception()
+                if err is not None:
+                    promise.do_reject(err)
+                else:
+                    promise.do_resolve(future.result())
+
+    def clean(self) -> None:
+        self._pending = dict()
+
+
+def run_in_executor(info, fn: Callable, *args, **kwargs) -> Any:
+    """Method to run blocking resolver work on the request's resolver pool, if concurrent resolvers are enabled
+
+    Args:
+        info: The graphene info object for this request
+        fn(callable): Function to run
+        *args: Positional arguments for fn
+        **kwargs: Keyword arguments for fn
+
+    Returns:
+        Promise if the work was submitted to the pool, otherwise the result of fn
+    """
+    executor = getattr(info.context, "resolver_executor", None)
+    if executor is not None:
+        return executor.submit(fn, *args, **kwargs)
+
+    return fn(*args, **kwargs)
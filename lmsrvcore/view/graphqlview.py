@@ -0,0 +1,303 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import hashlib
+import json
+import random
+from collections.abc import MutableMapping
+from typing import Any, List, Optional, Tuple
+
+from flask import Response, request
+from flask_graphql import GraphQLView
+from graphql import get_default_backend
+from graphql.execution import ExecutionResult
+from graphql_server import GraphQLParams, HttpQueryError, get_graphql_params, run_http_query
+
+from lmcommon.auth.identity import AuthenticationError
+from lmcommon.logging import LMLogger
+
+from lmsrvcore.view.executor import PooledResolverExecutor
+from lmsrvcore.view.persisted import PersistedQueryStore, persisted_query_store, query_hash
+
+logger = LMLogger.get_logger()
+
+
+class LabManagerGraphQLView(GraphQLView):
+    """GraphQLView with support for persisted queries
+
+    Clients may send `extensions.persistedQuery.sha256Hash` in place of (or alongside) the query text, following the
+    Apollo automatic persisted query protocol. A hash alone is resolved from the PersistedQueryStore. A hash together
+    with the query registers the query. If `persisted_queries_only` is set, only queries already in the store are
+    accepted.
+
+    Unlike the base view, response `extensions` set during execution (e.g. the query cost) are included in the
+    response body.
+
+    If a `resolver_pool` is provided, each request gets a PooledResolverExecutor so independent blocking resolver work
+    runs concurrently.
+
+    `request_middleware` run once per request rather than once per resolved field: `before_execute(context)` is called
+    before execution and `after_execute(context, document, params, result)` after it. Field middleware is kept off
+    the hot path, since any field middleware wraps every resolved field in a promise. The `profiler` field
+    middleware is only attached to a `profiler_sample_rate` fraction of requests.
+
+    If an `etag_provider` is set, responses to queries it can fingerprint carry a weak ETag derived from the request
+    and the fingerprint of the state it reads. A request with a matching `If-None-Match` header is answered with
+    304 Not Modified without executing. The fingerprint is taken before execution, so a change made while a query
+    executes can only cause an unnecessary full response on the next request, never a stale 304.
+    """
+    persisted_queries = None
+    persisted_queries_only = False
+    resolver_pool = None
+    request_middleware = None
+    profiler = None
+    profiler_sample_rate = 1.0
+    etag_provider = None
+
+    def get_backend(self):
+        return self.backend if self.backend is not None else get_default_backend()
+
+    def get_middleware(self):
+        middleware = list(self.middleware or [])
+        if self.profiler is not None and random.random() < self.profiler_sample_rate:
+            middleware.insert(0, self.profiler)
+
+        return middleware
+
+    def before_execute(self, context) -> None:
+        for middleware in self.request_middleware or []:
+            if hasattr(middleware, 'before_execute'):
+                middleware.before_execute(context)
+
+    def after_execute(self, context, execution_results: List[Optional[ExecutionResult]],
+                      all_params: List[GraphQLParams]) -> None:
+        hooks = [m for m in self.request_middleware or [] if hasattr(m, 'after_execute')]
+        if not hooks:
+            return
+
+        for result, params in zip(execution_results, all_params):
+            document = None
+            if result is not None and not result.invalid and params.query:
+                # Already parsed and validated, so this is a cache lookup
+                document = self.get_backend().document_from_string(self.schema, params.query)
+
+            for middleware in reversed(hooks):
+                middleware.after_execute(context, document, params, result)
+
+    def get_executor(self):
+        if self.resolver_pool is None:
+            return self.executor
+
+        # Resolvers find the executor on the context to submit blocking work with `run_in_executor`
+        executor = PooledResolverExecutor(self.resolver_pool)
+        request.resolver_executor = executor
+        return executor
+
+    def get_etag(self, context, data: Any) -> Optional[str]:
+        """Method to compute the ETag of a request from the fingerprint of the state it reads
+
+        Args:
+            context: The request context, after request middleware has run
+            data(dict|list): The parsed request body
+
+        Returns:
+            str, or None if the response may not be cached
+        """
+        if self.etag_provider is None:
+            return None
+
+        is_batch = isinstance(data, list)
+        parts = list()
+        try:
+            for entry in data if is_batch else [data]:
+                params = get_graphql_params(entry, {} if is_batch else request.args)
+                if not params.query:
+                    return None
+
+                document = self.get_backend().document_from_string(self.schema, params.query)
+                fingerprint = self.etag_provider.fingerprint(context, document, params)
+                if fingerprint is None:
+                    return None
+
+                parts.append([query_hash(params.query), params.operation_name, params.variables, fingerprint])
+        except Exception as err:
+            # Malformed requests are reported by execution
+            logger.debug(f"Not computing ETag for request: {err}")
+            return None
+
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def set_etag(response: Response, etag: str) -> Response:
+        response.set_etag(etag, weak=True)
+        # Clients must revalidate before reusing a cached response
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def get_persisted_queries(self) -> PersistedQueryStore:
+        return self.persisted_queries if self.persisted_queries is not None else persisted_query_store
+
+    def format_execution_result(self, execution_result: Optional[ExecutionResult]) -> Tuple[Optional[dict], int]:
+        """Method to convert an execution result to a response dictionary and status code
+
+        Args:
+            execution_result(ExecutionResult): The result, or None if execution was skipped
+
+        Returns:
+            tuple
+        """
+        if execution_result is None:
+            return None, 200
+
+        response = execution_result.to_dict(format_error=self.format_error)
+        if execution_result.extensions:
+            response['extensions'] = execution_result.extensions
+
+        return response, 400 if execution_result.invalid else 200
+
+    def encode_execution_results(self, execution_results: List[Optional[ExecutionResult]], is_batch: bool,
+                                 pretty: bool) -> Tuple[str, int]:
+        responses = [self.format_execution_result(execution_result) for execution_result in execution_results]
+        result, status_codes = zip(*responses)
+        return self.encode(result if is_batch else result[0], pretty=pretty), max(status_codes)
+
+    def dispatch_request(self):
+        try:
+            request_method = request.method.lower()
+            data = self.parse_body()
+
+            show_graphiql = request_method == 'get' and self.should_display_graphiql()
+            pretty = self.pretty or show_graphiql or request.args.get('pretty')
+
+            context = self.get_context()
+            try:
+                if not (show_graphiql and not request.args.get('query')):
+                    # Rendering an empty GraphiQL page executes nothing
+                    self.before_execute(context)
+            except AuthenticationError as err:
+                # Reported the same way as when raised from a resolver
+                result = {'data': None, 'errors': [self.format_error(err)]}
+                return Response(self.encode([result] if isinstance(data, list) else result, pretty=pretty),
+                                status=200,
+                                content_type='application/json')
+
+            etag = None
+            if not show_graphiql:
+                etag = self.get_etag(context, data)
+                if etag is not None and request.if_none_match.contains_weak(etag):
+                    return self.set_etag(Response(status=304), etag)
+
+            extra_options = {}
+            executor = self.get_executor()
+            if executor:
+                extra_options['executor'] = executor
+
+            execution_results, all_params = run_http_query(self.schema,
+                                                           request_method,
+                                                           data,
+                                                           query_data=request.args,
+                                                           batch_enabled=self.batch,
+                                                           catch=show_graphiql,
+                                                           backend=self.get_backend(),
+                                                           root=self.get_root_value(),
+                                                           context=context,
+                                                           middleware=self.get_middleware(),
+                                                           **extra_options)
+            self.after_execute(context, execution_results, all_params)
+            result, status_code = self.encode_execution_results(execution_results,
+                                                                is_batch=isinstance(data, list),
+                                                                pretty=pretty)
+
+            if show_graphiql:
+                return self.render_graphiql(params=all_params[0], result=result)
+
+            response = Response(result, status=status_code, content_type='application/json')
+            if etag is not None and status_code == 200 and \
+                    all(r is not None and not r.errors for r in execution_results):
+                self.set_etag(response, etag)
+            return response
+
+        except HttpQueryError as e:
+            return Response(self.encode({'errors': [self.format_error(e)]}),
+                            status=e.status_code,
+                            headers=e.headers,
+                            content_type='application/json')
+
+    def parse_body(self):
+        data = super().parse_body()
+
+        if request.method.lower() == 'get' and not data and 'extensions' in request.args:
+            data = request.args.to_dict()
+
+        if isinstance(data, list):
+            return [self.resolve_persisted_query(params) for params in data]
+
+        return self.resolve_persisted_query(data)
+
+    def resolve_persisted_query(self, params: Any) -> Any:
+        """Method to fill in the query text of a request that refers to a persisted query
+
+        Args:
+            params(dict): The GraphQL request parameters
+
+        Returns:
+            dict
+        """
+        if not isinstance(params, (dict, MutableMapping)):
+            # Let graphql_server report the malformed request
+            return params
+
+        extensions = params.get('extensions')
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpQueryError(400, "Extensions are invalid JSON.")
+
+        persisted = extensions.get('persistedQuery') if isinstance(extensions, dict) else None
+        query = params.get('query')
+        store = self.get_persisted_queries()
+
+        if persisted:
+            sha256_hash = persisted.get('sha256Hash')
+            if not sha256_hash:
+                raise HttpQueryError(400, "Persisted query requests must provide sha256Hash.")
+
+            if query:
+                if self.persisted_queries_only:
+                    if sha256_hash not in store or query_hash(query) != sha256_hash:
+                        raise HttpQueryError(403, "PersistedQueryNotAllowed")
+                else:
+                    try:
+                        store.register(query, sha256_hash)
+                    except ValueError as err:
+                        raise HttpQueryError(400, str(err))
+            else:
+                query = store.get(sha256_hash)
+                if query is None:
+                    raise HttpQueryError(400, "PersistedQueryNotFound")
+
+            params = dict(params.items())
+            params['query'] = query
+
+        elif query and self.persisted_queries_only:
+            if query_hash(query) not in store:
+                raise HttpQueryError(403, "PersistedQueryNotAllowed")
+
+        return params
@@ -0,0 +1,134 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from lmcommon.logging import LMLogger
+
+logger = LMLogger.get_logger()
+
+# Maximum number of automatically registered persisted queries kept in memory
+PERSISTED_QUERY_MAX_SIZE = 1000
+
+
+def query_hash(query: str) -> str:
+    """Method to compute the persisted query id of a query document
+
+    Args:
+        query(str): The GraphQL document text
+
+    Returns:
+        str
+    """
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+class PersistedQueryStore(object):
+    """Registry mapping sha256 query hashes to query documents
+
+    Queries loaded from a manifest are pinned and never evicted. Queries registered automatically by clients (a request
+    carrying both the query text and its hash) are kept in an LRU bounded by `max_size`.
+    """
+    def __init__(self, max_size: int = PERSISTED_QUERY_MAX_SIZE) -> None:
+        self.max_size = max_size
+        self._pinned: Dict[str, str] = dict()
+        self._registered: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._pinned) + len(self._registered)
+
+    def __contains__(self, sha256_hash: str) -> bool:
+        return self.get(sha256_hash) is not None
+
+    def get(self, sha256_hash: str) -> Optional[str]:
+        """Method to look up a query document by hash
+
+        Args:
+            sha256_hash(str): Hex encoded sha256 of the query document
+
+        Returns:
+            str
+        """
+        with self._lock:
+            query = self._pinned.get(sha256_hash)
+            if query is None:
+                query = self._registered.get(sha256_hash)
+                if query is not None:
+                    self._registered.move_to_end(sha256_hash)
+            return query
+
+    def register(self, query: str, sha256_hash: Optional[str] = None, pinned: bool = False) -> str:
+        """Method to register a query document
+
+        Args:
+            query(str): The GraphQL document text
+            sha256_hash(str): Hash provided by the client, verified against the document if set
+            pinned(bool): If True the query is never evicted
+
+        Returns:
+            str
+        """
+        computed_hash = query_hash(query)
+        if sha256_hash and sha256_hash != computed_hash:
+            raise ValueError("Provided sha256 hash does not match query")
+
+        with self._lock:
+            if pinned:
+                self._pinned[computed_hash] = query
+            elif computed_hash not in self._pinned:
+                self._registered[computed_hash] = query
+                self._registered.move_to_end(computed_hash)
+                while len(self._registered) > self.max_size:
+                    self._registered.popitem(last=False)
+
+        return computed_hash
+
+    def load(self, path: str) -> int:
+        """Method to pin all queries in a persisted query manifest
+
+        The manifest is a JSON object mapping sha256 hashes to query documents, as produced by the UI build.
+
+        Args:
+            path(str): Path to the manifest file
+
+        Returns:
+            int
+        """
+        with open(path, 'rt') as mf:
+            manifest = json.load(mf)
+
+        for sha256_hash, query in manifest.items():
+            self.register(query, sha256_hash, pinned=True)
+
+        logger.info(f"Loaded {len(manifest)} persisted queries from {path}")
+        return len(manifest)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pinned.clear()
+            self._registered.clear()
+
+
+# Process-wide persisted query registry
+persisted_query_store = PersistedQueryStore()
@@ -17,25 +17,25 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
-import graphene
+from lmsrvcore.api.connections import CountedConnection
 from lmsrvlabbook.api.objects.basecomponent import BaseComponent
 from lmsrvlabbook.api.objects.packagecomponent import PackageComponent
 from lmsrvlabbook.api.objects.customcomponent import CustomComponent
 
 
-class BaseComponentConnection(graphene.relay.Connection):
+class BaseComponentConnection(CountedConnection):
     """A Connection for paging through Base components"""
     class Meta:
         node = BaseComponent
 
 
-class PackageComponentConnection(graphene.relay.Connection):
+class PackageComponentConnection(CountedConnection):
     """A Connection for paging through Package components"""
     class Meta:
         node = PackageComponent
 
 
-class CustomComponentConnection(graphene.relay.Connection):
+class CustomComponentConnection(CountedConnection):
     """A Connection for paging through Custom components"""
     class Meta:
         node = CustomComponent
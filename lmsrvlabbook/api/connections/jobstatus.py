@@ -17,11 +17,11 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
-import graphene
+from lmsrvcore.api.connections import CountedConnection
 from lmsrvlabbook.api.objects.jobstatus import JobStatus
 
 
-class JobStatusConnection(graphene.relay.Connection):
+class JobStatusConnection(CountedConnection):
     """A Connection for paging through all background jobs the system is aware of. """
     class Meta:
         node = JobStatus
@@ -17,11 +17,11 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
-import graphene
+from lmsrvcore.api.connections import CountedConnection
 from lmsrvlabbook.api.objects.labbook import Labbook
 
 
-class LabbookConnection(graphene.relay.Connection):
+class LabbookConnection(CountedConnection):
     """A Connection for paging through labbooks that exist locally. """
     class Meta:
         node = Labbook
@@ -14,17 +14,17 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import graphene
+from lmsrvcore.api.connections import CountedConnection
 from lmsrvlabbook.api.objects.labbookfile import LabbookFile, LabbookFavorite
 
 
-class LabbookFileConnection(graphene.relay.Connection):
+class LabbookFileConnection(CountedConnection):
     """A connection for paging through labbook files. """
     class Meta:
         node = LabbookFile
 
 
-class LabbookFavoriteConnection(graphene.relay.Connection):
+class LabbookFavoriteConnection(CountedConnection):
     """A connection for paging through labbook favorites. """
     class Meta:
         node = LabbookFavorite
@@ -17,11 +17,11 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
-import graphene
+from lmsrvcore.api.connections import CountedConnection
 from lmsrvlabbook.api.objects.ref import LabbookRef
 
 
-class LabbookRefConnection(graphene.relay.Connection):
+class LabbookRefConnection(CountedConnection):
     """A Connection for paging through labbook git refs (branches)"""
     class Meta:
         node = LabbookRef
@@ -25,6 +25,7 @@ from lmsrvlabbook.api.mutations import (CreateBranch, CheckoutBranch, CreateLabb
                                         ExportLabbook, AddLabbookFile, MoveLabbookFile, DeleteLabbookFile,
                                         MakeLabbookDirectory, RemoveUserIdentity,
                                         AddLabbookFavorite, RemoveLabbookFavorite, UpdateLabbookFavorite,
+                                        ReorderLabbookFavorites,
                                         AddLabbookCollaborator,
                                         DeleteLabbookCollaborator, SyncLabbook, PublishLabbook, RemoveCustomComponent,
                                         RemovePackageComponents,
@@ -135,6 +136,9 @@ class LabbookMutations(graphene.ObjectType):
     # Remove a favorite file or dir in a labbook subdirectory (code, input, output)
     remove_favorite = RemoveLabbookFavorite.Field()
 
+    # Reorder all favorites in a labbook subdirectory (code, input, output) at once
+    reorder_favorites = ReorderLabbookFavorites.Field()
+
     # Add a collaborator to a LabBook
     add_collaborator = AddLabbookCollaborator.Field()
 
@@ -5,6 +5,7 @@ from lmsrvlabbook.api.mutations.labbook import (CreateLabbook, DeleteLabbook, De
                                                 MakeLabbookDirectory, AddLabbookRemote,
                                                 AddLabbookFile, MoveLabbookFile, DeleteLabbookFile,
                                                 AddLabbookFavorite, RemoveLabbookFavorite, UpdateLabbookFavorite,
+                                                ReorderLabbookFavorites,
                                                 AddLabbookCollaborator, DeleteLabbookCollaborator,
                                                 WriteReadme, CompleteBatchUploadTransaction)
 from lmsrvlabbook.api.mutations.environment import (BuildImage, StartContainer, StopContainer)
@@ -18,7 +18,10 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 import base64
+import errno
 import os
+import sqlite3
+import subprocess
 from docker.errors import ImageNotFound
 import shutil
 
@@ -46,7 +49,11 @@ from lmsrvlabbook.api.connections.labbookfileconnection import LabbookFileConnec
 from lmsrvlabbook.api.connections.labbook import LabbookConnection
 from lmsrvlabbook.api.objects.labbook import Labbook
 from lmsrvlabbook.api.objects.labbookfile import LabbookFavorite, LabbookFile
-from lmsrvlabbook.dataloader.labbook import LabBookLoader
+from lmsrvlabbook.dataloader.contenthash import content_hash_cache
+from lmsrvlabbook.dataloader.favorites import favorites_cache, reorder_favorites
+from lmsrvlabbook.dataloader.labbook import LabBookLoader, labbook_cache
+from lmsrvlabbook.dataloader.repository import repository_pool
+from lmsrvlabbook.dataloader.fileindex import file_index_manager
 
 
 logger = LMLogger.get_logger()
@@ -147,6 +154,10 @@ class DeleteLabbook(graphene.ClientIDMutation):
             lb, docker_removed = ContainerOperations.delete_image(labbook=lb, username=username)
             if not docker_removed:
                 raise ValueError(f'Cannot delete docker image for {str(lb)} - unable to delete LB from disk')
+            # This mutation's handle is not pooled, but one borrowed by earlier queries may still be open
+            repository_pool.evict(lb.root_dir)
+            labbook_cache.invalidate(owner, labbook_name)
+            file_index_manager.remove(lb)
             shutil.rmtree(lb.root_dir, ignore_errors=True)
             if os.path.exists(lb.root_dir):
                 logger.error(f'Deleted {str(lb)} but root directory {lb.root_dir} still exists!')
@@ -273,28 +284,28 @@ class ImportLabbook(graphene.relay.ClientIDMutation, ChunkUploadMutation):
         return ImportLabbook()
 
     @classmethod
-    def mutate_and_process_upload(cls, info, **kwargs):
-        if not cls.upload_file_path:
+    def mutate_and_process_upload(cls, info, upload_file_path, upload_filename, upload_hash, **kwargs):
+        if not upload_file_path:
             logger.error('No file uploaded')
             raise ValueError('No file uploaded')
 
         username = get_logged_in_username()
         logger.info(
             f"Handling ImportLabbook mutation: user={username},"
-            f"owner={username}. Uploaded file {cls.upload_file_path}")
+            f"owner={username}. Uploaded file {upload_file_path} ({upload_hash})")
 
         job_metadata = {'method': 'import_labbook_from_zip'}
         job_kwargs = {
-            'archive_path': cls.upload_file_path,
+            'archive_path': upload_file_path,
             'username': username,
             'owner': username,
-            'base_filename': cls.filename
+            'base_filename': upload_filename
         }
         dispatcher = Dispatcher()
         job_key = dispatcher.dispatch_task(jobs.import_labboook_from_zip, kwargs=job_kwargs, metadata=job_metadata)
-        logger.info(f"Importing LabBook {cls.upload_file_path} in background job with key {job_key.key_str}")
+        logger.info(f"Importing LabBook {upload_file_path} in background job with key {job_key.key_str}")
 
-        assumed_lb_name = cls.filename.replace('.lbk', '').split('_')[0]
+        assumed_lb_name = upload_filename.replace('.lbk', '').split('_')[0]
         working_directory = Configuration().config['git']['working_directory']
         inferred_lb_directory = os.path.join(working_directory, username, username, 'labbooks',
                                              assumed_lb_name)
@@ -471,11 +482,39 @@ class AddLabbookFile(graphene.relay.ClientIDMutation, ChunkUploadMutation):
         return AddLabbookFile(new_labbook_file_edge=
             LabbookFileConnection.Edge(node=None, cursor="null"))
 
+    @staticmethod
+    def _upload_destination(labbook, section, dst_path):
+        """Method to get the absolute path an upload is moved to, refusing paths outside the section or ignored by git
+
+        Args:
+            labbook(LabBook): The LabBook
+            section(str): The section (code, input, output)
+            dst_path(str): Path of the file relative to the section
+
+        Returns:
+            str
+        """
+        if section not in ('code', 'input', 'output'):
+            raise ValueError(f"Unsupported section `{section}`")
+
+        section_dir = os.path.realpath(os.path.join(labbook.root_dir, section))
+        dst_file = os.path.realpath(os.path.join(section_dir, dst_path.lstrip(os.path.sep)))
+        if not dst_file.startswith(section_dir + os.path.sep):
+            raise ValueError(f"`{dst_path}` is not in section `{section}`")
+
+        # Like FileOperations.put_file, only the name is checked, so sections that are untracked as a whole still work
+        if subprocess.run(['git', 'check-ignore', '-q', os.path.basename(dst_file)],
+                          cwd=labbook.root_dir).returncode == 0:
+            logger.warning(f"File {dst_path} matches gitignore; not put into {str(labbook)}")
+            raise ValueError(f"`{dst_path}` matches ignored pattern")
+
+        return dst_file
+
     @classmethod
-    def mutate_and_process_upload(cls, info, owner, labbook_name, section,
-                                  file_path, chunk_upload_params,
+    def mutate_and_process_upload(cls, info, upload_file_path, upload_filename, upload_hash, owner, labbook_name,
+                                  section, file_path, chunk_upload_params,
                                   transaction_id, client_mutation_id=None):
-        if not cls.upload_file_path:
+        if not upload_file_path:
             logger.error('No file uploaded')
             raise ValueError('No file uploaded')
 
@@ -488,17 +527,36 @@ class AddLabbookFile(graphene.relay.ClientIDMutation, ChunkUploadMutation):
                                                  labbook_name)
             lb = LabBook(author=get_logged_in_author())
             lb.from_directory(inferred_lb_directory)
-            dstpath = os.path.join(os.path.dirname(file_path), cls.filename)
-
-            fops = FileOperations.put_file(labbook=lb,
-                                           section=section,
-                                           src_file=cls.upload_file_path,
-                                           dst_path=dstpath,
-                                           txid=transaction_id)
+            dstpath = os.path.join(os.path.dirname(file_path), upload_filename)
+            dst_file = cls._upload_destination(lb, section, dstpath)
+
+            # Uploads are staged on the working directory's filesystem, so the file is usually renamed into place
+            # rather than copied. It is committed with the rest of the batch by CompleteBatchUploadTransaction.
+            section_dir = os.path.realpath(os.path.join(lb.root_dir, section))
+            os.makedirs(os.path.dirname(dst_file), exist_ok=True)
+            # Staged files are private to the service, give the file the permissions of a file created in the section
+            os.chmod(upload_file_path, os.stat(section_dir).st_mode & 0o666)
+            try:
+                os.replace(upload_file_path, dst_file)
+            except OSError as err:
+                if err.errno != errno.EXDEV:
+                    raise
+                # The user's labbooks are on a separate mount from the staging directory
+                shutil.move(upload_file_path, dst_file)
+
+            fops = lb.get_file_info(section, os.path.relpath(dst_file, section_dir))
+            file_index_manager.update(lb, [os.path.join(section, fops['key'])])
+
+            # The file's hash was computed while it was uploaded, so it never has to be hashed again
+            if upload_hash.startswith('sha256:'):
+                try:
+                    content_hash_cache.put(lb, os.path.join(lb.root_dir, section, fops['key']), upload_hash[7:])
+                except (OSError, sqlite3.Error) as err:
+                    logger.warning(f"Could not record the hash of {fops['key']}: {err}")
         finally:
             try:
-                logger.debug(f"Removing temp file {cls.upload_file_path}")
-                os.remove(cls.upload_file_path)
+                logger.debug(f"Removing temp file {upload_file_path}")
+                os.remove(upload_file_path)
             except FileNotFoundError:
                 pass
 
@@ -537,6 +595,7 @@ class DeleteLabbookFile(graphene.ClientIDMutation):
         lb = LabBook(author=get_logged_in_author())
         lb.from_directory(inferred_lb_directory)
         FileOperations.delete_file(lb, section=section, relative_path=file_path)
+        file_index_manager.update(lb, [os.path.join(section, file_path)])
 
         return DeleteLabbookFile(success=True)
 
@@ -564,6 +623,7 @@ class MoveLabbookFile(graphene.ClientIDMutation):
         lb = LabBook(author=get_logged_in_author())
         lb.from_directory(inferred_lb_directory)
         file_info = FileOperations.move_file(lb, section, src_path, dst_path)
+        file_index_manager.update(lb, [os.path.join(section, src_path), os.path.join(section, dst_path)])
         logger.info(f"Moved file to `{dst_path}`")
 
         # Prime dataloader with labbook you already loaded
@@ -604,6 +664,7 @@ class MakeLabbookDirectory(graphene.ClientIDMutation):
         lb = LabBook(author=get_logged_in_author())
         lb.from_directory(inferred_lb_directory)
         FileOperations.makedir(lb, os.path.join(section, directory), create_activity_record=True)
+        file_index_manager.update(lb, [os.path.join(section, directory)])
         logger.info(f"Made new directory in `{directory}`")
 
         # Prime dataloader with labbook you already loaded
@@ -652,6 +713,7 @@ class AddLabbookFavorite(graphene.relay.ClientIDMutation):
                 key = f"{key}/"
 
         new_favorite = lb.create_favorite(section, key, description=description, is_dir=is_dir)
+        favorites_cache.invalidate(lb, section)
 
         # Create data to populate edge
         create_data = {"id": f"{owner}&{labbook_name}&{section}&{key}",
@@ -691,6 +753,7 @@ class UpdateLabbookFavorite(graphene.relay.ClientIDMutation):
         new_favorite = lb.update_favorite(section, key,
                                           new_description=updated_description,
                                           new_index=updated_index)
+        favorites_cache.invalidate(lb, section)
 
         # Create data to populate edge
         create_data = {"id": f"{owner}&{labbook_name}&{section}&{key}",
@@ -729,10 +792,45 @@ class RemoveLabbookFavorite(graphene.ClientIDMutation):
 
         # Remove Favorite
         lb.remove_favorite(section, key)
+        favorites_cache.invalidate(lb, section)
 
         return RemoveLabbookFavorite(success=True, removed_node_id=favorite_node_id)
 
 
+class ReorderLabbookFavorites(graphene.relay.ClientIDMutation):
+    """Mutation to reorder all favorites in a section with a single write, rather than one update per favorite"""
+    class Input:
+        owner = graphene.String(required=True)
+        labbook_name = graphene.String(required=True)
+        section = graphene.String(required=True)
+        keys = graphene.List(graphene.String, required=True)
+
+    updated_favorite_edges = graphene.List(LabbookFavoriteConnection.Edge)
+
+    @classmethod
+    def mutate_and_get_payload(cls, root, info, owner, labbook_name, section, keys, client_mutation_id=None):
+        username = get_logged_in_username()
+        lb = LabBook(author=get_logged_in_author())
+        lb.from_name(username, owner, labbook_name)
+
+        # Rewrite all indices at once
+        favorites = reorder_favorites(lb, section, keys)
+
+        edges = list()
+        for favorite in favorites:
+            create_data = {"id": f"{owner}&{labbook_name}&{section}&{favorite['key']}",
+                           "owner": owner,
+                           "section": section,
+                           "name": labbook_name,
+                           "key": favorite['key'],
+                           "index": favorite['index'],
+                           "_favorite_data": favorite}
+            cursor = base64.b64encode(f"{str(favorite['index'])}".encode('utf-8'))
+            edges.append(LabbookFavoriteConnection.Edge(node=LabbookFavorite(**create_data), cursor=cursor))
+
+        return ReorderLabbookFavorites(updated_favorite_edges=edges)
+
+
 class AddLabbookCollaborator(graphene.relay.ClientIDMutation):
     class Input:
         owner = graphene.String(required=True)
@@ -24,6 +24,7 @@ import graphene
 from lmsrvcore.api.objects.user import UserIdentity
 
 from lmsrvcore.auth.identity import get_identity_manager_instance
+from lmsrvcore.auth.cache import token_cache, token_cache_key
 from lmcommon.logging import LMLogger
 
 logger = LMLogger.get_logger()
@@ -46,6 +47,9 @@ class RemoveUserIdentity(graphene.relay.ClientIDMutation):
             os.remove(git_cred_file)
             logger.info("Removed git credentials on logout")
 
+        # Drop the cached validation result and profile for the current tokens
+        token_cache.invalidate(token_cache_key(flask.g.get('access_token', None), flask.g.get('id_token', None)))
+
         # Wipe current user from request context
         flask.g.user_obj = None
         flask.g.id_token = None
@@ -19,7 +19,6 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 import graphene
-import base64
 
 import docker
 from docker.errors import ImageNotFound, NotFound
@@ -33,7 +32,8 @@ from lmcommon.container.utils import infer_docker_image_name
 
 from lmsrvcore.api.interfaces import GitRepository
 from lmsrvcore.auth.user import get_logged_in_username
-from lmsrvcore.api.connections import ListBasedConnection
+from lmsrvcore.api.connections import SequenceConnection
+from lmsrvcore.view import run_in_executor
 
 from lmsrvlabbook.api.connections.environment import CustomComponentConnection, PackageComponentConnection
 from lmsrvlabbook.api.objects.basecomponent import BaseComponent
@@ -161,10 +161,10 @@ class Environment(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRepos
     def resolve_image_status(self, info):
         """Resolve the image_status field"""
         return info.context.labbook_loader.load(f"{get_logged_in_username()}&{self.owner}&{self.name}").then(
-            lambda labbook: self.helper_resolve_image_status(labbook))
+            lambda labbook: run_in_executor(info, self.helper_resolve_image_status, labbook))
 
-    def resolve_container_status(self, info):
-        """Resolve the image_status field"""
+    def helper_resolve_container_status(self):
+        """Helper to resolve the container status of a labbook"""
         # Check if the container is running by looking up the container
         labbook_key = infer_docker_image_name(labbook_name=self.name, owner=self.owner,
                                               username=get_logged_in_username())
@@ -181,6 +181,10 @@ class Environment(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRepos
 
         return container_status.value
 
+    def resolve_container_status(self, info):
+        """Resolve the container_status field"""
+        return run_in_executor(info, self.helper_resolve_container_status)
+
     @staticmethod
     def helper_resolve_base(labbook):
         """Helper to resolve the base component object"""
@@ -216,11 +220,8 @@ class Environment(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRepos
         edges = cm.get_component_list("package_manager")
 
         if edges:
-            cursors = [base64.b64encode("{}".format(cnt).encode("UTF-8")).decode("UTF-8") for cnt, x in
-                       enumerate(edges)]
-
             # Process slicing and cursor args
-            lbc = ListBasedConnection(edges, cursors, kwargs)
+            lbc = SequenceConnection(edges, kwargs)
             lbc.apply()
 
             # Create version dataloader
@@ -239,7 +240,7 @@ class Environment(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRepos
                                                                                        schema=edge['schema']),
                                                                  cursor=cursor))
 
-            return PackageComponentConnection(edges=edge_objs, page_info=lbc.page_info)
+            return PackageComponentConnection(edges=edge_objs, page_info=lbc.page_info, total_count=lbc.total_count)
 
         else:
             return PackageComponentConnection(edges=[], page_info=graphene.relay.PageInfo(has_next_page=False,
@@ -264,11 +265,8 @@ class Environment(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRepos
         edges = cm.get_component_list("custom")
 
         if edges:
-            cursors = [base64.b64encode("{}".format(cnt).encode("UTF-8")).decode("UTF-8") for cnt, x in
-                       enumerate(edges)]
-
             # Process slicing and cursor args
-            lbc = ListBasedConnection(edges, cursors, kwargs)
+            lbc = SequenceConnection(edges, kwargs)
             lbc.apply()
 
             # Get DevEnv instances
@@ -279,7 +277,7 @@ class Environment(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRepos
                                                                                      revision=edge['revision']),
                                                                 cursor=cursor))
 
-            return CustomComponentConnection(edges=edge_objs, page_info=lbc.page_info)
+            return CustomComponentConnection(edges=edge_objs, page_info=lbc.page_info, total_count=lbc.total_count)
 
         else:
             return CustomComponentConnection(edges=[], page_info=graphene.relay.PageInfo(has_next_page=False,
@@ -17,7 +17,6 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
-import base64
 import graphene
 
 from lmcommon.logging import LMLogger
@@ -25,14 +24,14 @@ from lmcommon.dispatcher import Dispatcher
 from lmcommon.workflows import BranchManager
 from lmcommon.activity import ActivityStore
 from lmcommon.gitlib.gitlab import GitLabManager
-from lmcommon.files import FileOperations
 from lmcommon.environment.utils import get_package_manager
 
 from lmsrvcore.auth.user import get_logged_in_username
 
-from lmsrvcore.api.connections import ListBasedConnection
+from lmsrvcore.api.connections import SequenceConnection
 from lmsrvcore.api.interfaces import GitRepository
 from lmsrvcore.auth.identity import parse_token
+from lmsrvcore.view import run_in_executor
 
 
 from lmsrvlabbook.api.objects.jobstatus import JobStatus
@@ -44,6 +43,8 @@ from lmsrvlabbook.api.objects.labbooksection import LabbookSection
 from lmsrvlabbook.api.connections.activity import ActivityConnection
 from lmsrvlabbook.api.objects.activity import ActivityDetailObject, ActivityRecordObject
 from lmsrvlabbook.api.objects.packagecomponent import PackageComponent, PackageComponentInput
+from lmsrvlabbook.dataloader.fileindex import indexed_content_size
+from lmsrvlabbook.dataloader.repository import private_labbook
 
 logger = LMLogger.get_logger()
 
@@ -188,15 +189,22 @@ class Labbook(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRepositor
     def resolve_size_bytes(self, info):
         """Return the size of the labbook on disk (in bytes).
         NOTE! This must be a string, as graphene can't quite handle big integers. """
+        # The file index is thread-safe and never uses the LabBook's git repository, so the cached LabBook is shared
         return info.context.labbook_loader.load(f"{get_logged_in_username()}&{self.owner}&{self.name}").then(
-            lambda labbook: str(FileOperations.content_size(labbook=labbook)))
+            lambda labbook: run_in_executor(info, lambda: str(indexed_content_size(labbook))))
+
+    @staticmethod
+    def helper_resolve_updates_available_count(labbook):
+        """Helper to fetch and count the commits behind the remote, on a private repository handle"""
+        with private_labbook(labbook) as lb:
+            return lb.get_commits_behind_remote("origin")[1]
 
     def resolve_updates_available_count(self, info):
         """Get number of commits the active_branch is behind its remote counterpart.
         Returns 0 if up-to-date or if local only."""
         # Note, by default using remote "origin"
         return info.context.labbook_loader.load(f"{get_logged_in_username()}&{self.owner}&{self.name}").then(
-            lambda labbook: labbook.get_commits_behind_remote("origin")[1])
+            lambda labbook: run_in_executor(info, self.helper_resolve_updates_available_count, labbook))
 
     def resolve_active_branch_name(self, info):
         return info.context.labbook_loader.load(f"{get_logged_in_username()}&{self.owner}&{self.name}").then(
@@ -274,11 +282,9 @@ class Labbook(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRepositor
     def helper_resolve_branches(self, lb, kwargs):
         # Get all edges and cursors. Here, cursors are just an index into the refs
         edges = [x for x in lb.git.repo.refs]
-        cursors = [base64.b64encode("{}".format(cnt).encode("UTF-8")).decode("UTF-8") for cnt,
-                                                                                          x in enumerate(edges)]
 
         # Process slicing and cursor args
-        lbc = ListBasedConnection(edges, cursors, kwargs)
+        lbc = SequenceConnection(edges, kwargs)
         lbc.apply()
 
         # Get LabbookRef instances
@@ -299,7 +305,8 @@ class Labbook(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRepositor
             edge_objs.append(LabbookRefConnection.Edge(node=LabbookRef(**create_data), cursor=cursor))
 
         return LabbookRefConnection(edges=edge_objs,
-                                    page_info=lbc.page_info)
+                                    page_info=lbc.page_info,
+                                    total_count=lbc.total_count)
 
     def resolve_branches(self, info, **kwargs):
         """Method to page through branch Refs
@@ -422,6 +429,9 @@ class Labbook(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRepositor
     def _fetch_collaborators(self, labbook, info):
         """Helper method to fetch this labbook's collaborators
 
+        Runs on a resolver pool thread. Only the configuration of the cached LabBook is read, never its git
+        repository, so it is safe to share with the request thread.
+
         Args:
             info: The graphene info object for this requests
 
@@ -471,7 +481,7 @@ class Labbook(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRepositor
         if self._collaborators is None:
             # If here, put the fetch for collaborators in the promise
             return info.context.labbook_loader.load(f"{get_logged_in_username()}&{self.owner}&{self.name}").then(
-                lambda labbook: self.helper_resolve_collaborators(labbook, info))
+                lambda labbook: run_in_executor(info, self.helper_resolve_collaborators, labbook, info))
 
         # If here, you've already fetched the collaborators once and it's already saved in this Labbook object
         return [x[1] for x in self._collaborators]
@@ -506,7 +516,7 @@ class Labbook(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRepositor
         if self._collaborators is None:
             # If here, put the fetch for collaborators in the promise
             return info.context.labbook_loader.load(f"{get_logged_in_username()}&{self.owner}&{self.name}").then(
-                lambda labbook: self.helper_resolve_can_manage_collaborators(labbook, info))
+                lambda labbook: run_in_executor(info, self.helper_resolve_can_manage_collaborators, labbook, info))
 
         can_manage = False
         username = get_logged_in_username()
@@ -561,6 +571,7 @@ class Labbook(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRepositor
 
     @staticmethod
     def helper_resolve_visibility(labbook, info):
+        # Runs on a resolver pool thread, reading only the configuration and owner of the cached LabBook
         # TODO: Future work will look up remote in LabBook data, allowing user to select remote.
         default_remote = labbook.labmanager_config.config['git']['default_remote']
         admin_service = None
@@ -588,4 +599,4 @@ class Labbook(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRepositor
          "public", "private", or "internal". """
 
         return info.context.labbook_loader.load(f"{get_logged_in_username()}&{self.owner}&{self.name}").then(
-            lambda labbook: self.helper_resolve_visibility(labbook, info))
+            lambda labbook: run_in_executor(info, self.helper_resolve_visibility, labbook, info))
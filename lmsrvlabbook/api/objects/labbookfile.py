@@ -17,12 +17,17 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import os
 import graphene
 import base64
+from promise import Promise
 
 from lmsrvcore.api.interfaces import GitRepository
 from lmsrvcore.auth.user import get_logged_in_username
 
+from lmsrvlabbook.dataloader.contenthash import content_hash_cache
+from lmsrvlabbook.dataloader.fileindex import indexed_file_info
+
 
 class LabbookFile(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRepository)):
     """A type representing a file or directory inside the labbook file system."""
@@ -47,24 +52,94 @@ class LabbookFile(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRepos
     # Size in bytes encoded as a string.
     size = graphene.String()
 
-    def _load_file_info(self, dataloader):
-        """Private method to retrieve file info for a given key"""
-        if not self._file_info:
-            # Load file info from LabBook
-            if not self.section or not self.key:
-                raise ValueError("Must set `section` and `key` on object creation to resolve file info")
+    # Total size in bytes of all files below a directory, encoded as a string. For a file, its size.
+    total_size = graphene.String()
+
+    # Number of files below a directory. For a file, 1.
+    file_count = graphene.Int()
 
-            # Load labbook instance
-            lb = dataloader.load(f"{get_logged_in_username()}&{self.owner}&{self.name}").get()
+    # Latest modification time of a directory or anything below it, in epoch time. For a file, its modified_at.
+    last_modified_at = graphene.Int()
 
-            # Retrieve file info
-            self._file_info = lb.get_file_info(self.section, self.key)
+    # SHA-256 of the file's contents, hex encoded. Null for directories and while the hash is being computed.
+    content_hash = graphene.String()
 
-        # Set class properties
-        self.is_dir = self._file_info['is_dir']
-        self.modified_at = round(self._file_info['modified_at'])
-        self.size = f"{self._file_info['size']}"
-        self.is_favorite = self._file_info['is_favorite']
+    # True indicates that content_hash is null because the file is still being hashed
+    content_hash_pending = graphene.Boolean()
+
+    def _set_file_info(self, file_info):
+        """Private method to set the class properties from loaded file info"""
+        self._file_info = file_info
+        self.is_dir = file_info['is_dir']
+        self.modified_at = round(file_info['modified_at'])
+        self.size = f"{file_info['size']}"
+        self.is_favorite = file_info['is_favorite']
+        return self
+
+    def _load_file_info(self, dataloader):
+        """Private method to retrieve file info for a given key
+
+        Returns:
+            Promise resolving to this object
+        """
+        if self._file_info:
+            return Promise.resolve(self._set_file_info(self._file_info))
+
+        # Load file info from LabBook
+        if not self.section or not self.key:
+            raise ValueError("Must set `section` and `key` on object creation to resolve file info")
+
+        return dataloader.load(f"{get_logged_in_username()}&{self.owner}&{self.name}&{self.section}&{self.key}"
+                               ).then(self._set_file_info)
+
+    def _set_totals(self, file_info):
+        """Private method to set the directory total properties from loaded file info"""
+        self._file_info = file_info
+        self.total_size = f"{file_info['total_size']}"
+        self.file_count = file_info['file_count']
+        self.last_modified_at = round(file_info['last_modified_at'])
+        return self
+
+    def _load_totals(self, dataloader):
+        """Private method to retrieve the totals of a directory, which are maintained by the file index
+
+        Returns:
+            Promise resolving to this object
+        """
+        if self._file_info and 'total_size' in self._file_info:
+            return Promise.resolve(self._set_totals(self._file_info))
+
+        if not self.section or not self.key:
+            raise ValueError("Must set `section` and `key` on object creation to resolve file info")
+
+        # Load labbook instance, then the file info including totals
+        return dataloader.load(f"{get_logged_in_username()}&{self.owner}&{self.name}").then(
+            lambda lb: self._set_totals(indexed_file_info(lb, self.section, self.key)))
+
+    def _load_content_hash(self, dataloader):
+        """Private method to look up the content hash of a file, queueing it to be hashed if it is not cached
+
+        Returns:
+            Promise resolving to this object
+        """
+        if not self.section or not self.key:
+            raise ValueError("Must set `section` and `key` on object creation to resolve file info")
+
+        return dataloader.load(f"{get_logged_in_username()}&{self.owner}&{self.name}").then(self._set_content_hash)
+
+    def _set_content_hash(self, lb):
+        """Private method to set the content hash properties, given the loaded LabBook"""
+        section_dir = os.path.realpath(os.path.join(lb.root_dir, self.section))
+        file_path = os.path.realpath(os.path.join(section_dir, self.key))
+        if not file_path.startswith(section_dir + os.path.sep):
+            raise ValueError(f"`{self.key}` is not a file in section `{self.section}`")
+        if os.path.isdir(file_path):
+            self.content_hash_pending = False
+            return self
+
+        self.content_hash = content_hash_cache.get(lb, file_path)
+        self.content_hash_pending = self.content_hash is None
+        return self
 
     @classmethod
     def get_node(cls, info, id):
@@ -86,27 +161,57 @@ class LabbookFile(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRepos
     def resolve_is_dir(self, info):
         """Resolve the is_dir field"""
         if self.is_dir is None:
-            self._load_file_info(info.context.labbook_loader)
+            return self._load_file_info(info.context.file_info_loader).then(lambda lbf: lbf.is_dir)
         return self.is_dir
 
     def resolve_modified_at(self, info):
         """Resolve the modified_at field"""
         if self.modified_at is None:
-            self._load_file_info(info.context.labbook_loader)
+            return self._load_file_info(info.context.file_info_loader).then(lambda lbf: lbf.modified_at)
         return self.modified_at
 
     def resolve_size(self, info):
         """Resolve the size field"""
         if self.size is None:
-            self._load_file_info(info.context.labbook_loader)
+            return self._load_file_info(info.context.file_info_loader).then(lambda lbf: lbf.size)
         return self.size
 
     def resolve_is_favorite(self, info):
         """Resolve the is_favorite field"""
         if self.is_favorite is None:
-            self._load_file_info(info.context.labbook_loader)
+            return self._load_file_info(info.context.file_info_loader).then(lambda lbf: lbf.is_favorite)
         return self.is_favorite
 
+    def resolve_total_size(self, info):
+        """Resolve the total_size field"""
+        if self.total_size is None:
+            return self._load_totals(info.context.labbook_loader).then(lambda lbf: lbf.total_size)
+        return self.total_size
+
+    def resolve_file_count(self, info):
+        """Resolve the file_count field"""
+        if self.file_count is None:
+            return self._load_totals(info.context.labbook_loader).then(lambda lbf: lbf.file_count)
+        return self.file_count
+
+    def resolve_last_modified_at(self, info):
+        """Resolve the last_modified_at field"""
+        if self.last_modified_at is None:
+            return self._load_totals(info.context.labbook_loader).then(lambda lbf: lbf.last_modified_at)
+        return self.last_modified_at
+
+    def resolve_content_hash(self, info):
+        """Resolve the content_hash field"""
+        if self.content_hash_pending is None:
+            return self._load_content_hash(info.context.labbook_loader).then(lambda lbf: lbf.content_hash)
+        return self.content_hash
+
+    def resolve_content_hash_pending(self, info):
+        """Resolve the content_hash_pending field"""
+        if self.content_hash_pending is None:
+            return self._load_content_hash(info.context.labbook_loader).then(lambda lbf: lbf.content_hash_pending)
+        return self.content_hash_pending
+
 
 class LabbookFavorite(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRepository)):
     """A type representing a file or directory that has been favorited in the labbook file system."""
@@ -131,25 +236,30 @@ class LabbookFavorite(graphene.ObjectType, interfaces=(graphene.relay.Node, GitR
     # True indicates that the favorite is a directory
     is_dir = graphene.Boolean()
 
-    def _load_favorite_info(self, dataloader):
-        """Private method to retrieve file info for a given key"""
-        if not self._favorite_data:
-            # Load file info from LabBook
-            if not self.section or self.key is None:
-                raise ValueError("Must set `section` and `key` on object creation to resolve favorite info")
+    def _set_favorite_data(self, favorite_data):
+        """Private method to set the class properties from loaded favorite data"""
+        self._favorite_data = favorite_data
+        self.description = favorite_data['description']
+        self.index = favorite_data['index']
+        self.is_dir = favorite_data['is_dir']
+        return self
 
-            # Load labbook instance
-            lb = dataloader.load(f"{get_logged_in_username()}&{self.owner}&{self.name}").get()
+    def _load_favorite_info(self, dataloader):
+        """Private method to retrieve favorite info for a given key
 
-            data = lb.get_favorites(self.section)
+        Returns:
+            Promise resolving to this object
+        """
+        if self._favorite_data:
+            return Promise.resolve(self._set_favorite_data(self._favorite_data))
 
-            # Pull out single entry
-            self._favorite_data = data[self.key]
+        # Load favorite info from LabBook
+        if not self.section or self.key is None:
+            raise ValueError("Must set `section` and `key` on object creation to resolve favorite info")
 
-        # Set class properties
-        self.description = self._favorite_data['description']
-        self.index = self._favorite_data['index']
-        self.is_dir = self._favorite_data['is_dir']
+        # Pull out single entry from all favorites in the section
+        return dataloader.load(f"{get_logged_in_username()}&{self.owner}&{self.name}&{self.section}").then(
+            lambda favorites: self._set_favorite_data(favorites[self.key]))
 
     @classmethod
     def get_node(cls, info, id):
@@ -173,25 +283,25 @@ class LabbookFavorite(graphene.ObjectType, interfaces=(graphene.relay.Node, GitR
     def resolve_is_dir(self, info):
         """Resolve the is_dir field"""
         if self.is_dir is None:
-            self._load_favorite_info(info.context.labbook_loader)
+            return self._load_favorite_info(info.context.favorites_loader).then(lambda lbf: lbf.is_dir)
         return self.is_dir
 
     def resolve_key(self, info):
         """Resolve the is_dir field"""
         if self.key is None:
-            self._load_favorite_info(info.context.labbook_loader)
+            return self._load_favorite_info(info.context.favorites_loader).then(lambda lbf: lbf.key)
         return self.key
 
     def resolve_index(self, info):
         """Resolve the index field"""
         if self.index is None:
-            self._load_favorite_info(info.context.labbook_loader)
+            return self._load_favorite_info(info.context.favorites_loader).then(lambda lbf: lbf.index)
         return self.index
 
     def resolve_description(self, info):
         """Resolve the is_dir field"""
         if self.description is None:
-            self._load_favorite_info(info.context.labbook_loader)
+            return self._load_favorite_info(info.context.favorites_loader).then(lambda lbf: lbf.description)
         return self.description
 
     def resolve_associated_labbook_file_id(self, info):
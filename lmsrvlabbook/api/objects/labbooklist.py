@@ -28,7 +28,7 @@ from lmcommon.configuration import Configuration
 from lmcommon.gitlib.gitlab import GitLabManager
 
 from lmsrvcore.auth.user import get_logged_in_username
-from lmsrvcore.api.connections import ListBasedConnection
+from lmsrvcore.api.connections import SequenceConnection
 from lmsrvcore.auth.identity import parse_token
 
 
@@ -105,10 +105,9 @@ class LabbookList(graphene.ObjectType, interfaces=(graphene.relay.Node,)):
 
         # Collect all labbooks for all owners
         edges = lb.list_local_labbooks(username=username, sort_mode=order_by, reverse=reverse)
-        cursors = [base64.b64encode("{}".format(cnt).encode("UTF-8")).decode("UTF-8") for cnt, x in enumerate(edges)]
 
         # Process slicing and cursor args
-        lbc = ListBasedConnection(edges, cursors, kwargs)
+        lbc = SequenceConnection(edges, kwargs)
         lbc.apply()
 
         # Get Labbook instances
@@ -121,7 +120,7 @@ class LabbookList(graphene.ObjectType, interfaces=(graphene.relay.Node,)):
             edge_objs.append(LabbookConnection.Edge(node=Labbook(**create_data),
                                                     cursor=cursor))
 
-        return LabbookConnection(edges=edge_objs, page_info=lbc.page_info)
+        return LabbookConnection(edges=edge_objs, page_info=lbc.page_info, total_count=lbc.total_count)
 
     def resolve_remote_labbooks(self, info, order_by: str, sort: str, **kwargs):
         """Method to return a all RemoteLabbook instances for the logged in user
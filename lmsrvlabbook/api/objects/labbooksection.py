@@ -17,7 +17,6 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
-import base64
 import graphene
 import os
 
@@ -26,15 +25,35 @@ from lmcommon.logging import LMLogger
 
 from lmsrvcore.auth.user import get_logged_in_username
 from lmsrvcore.api.interfaces import GitRepository
-from lmsrvcore.api.connections import ListBasedConnection
+from lmsrvcore.api.connections import KeysetConnection, SequenceConnection
 
 from lmsrvlabbook.api.objects.labbookfile import LabbookFavorite, LabbookFile
 from lmsrvlabbook.api.connections.labbookfileconnection import LabbookFileConnection, LabbookFavoriteConnection
-import redis
-import json
+from lmsrvlabbook.dataloader.favorites import favorites_cache
+from lmsrvlabbook.dataloader.fileindex import FileFilter, file_sort_key, file_sort_position, file_walk_position, \
+    indexed_count, indexed_listdir, indexed_sorted, indexed_walkdir
 
 logger = LMLogger.get_logger()
 
+# Values accepted by the `orderBy` argument of a file connection, which follow the GraphQL field names, mapped to the
+# sort orders of the file index
+FILE_ORDER_BY = {'name': 'name', 'size': 'size', 'modifiedAt': 'modified_at'}
+
+
+def _file_connection_args(**kwargs):
+    """Filter and sort arguments shared by the files and allFiles connections"""
+    return dict(glob=graphene.String(),
+                name_contains=graphene.String(),
+                extensions=graphene.List(graphene.String),
+                min_size=graphene.Float(),
+                max_size=graphene.Float(),
+                modified_after=graphene.Int(),
+                dirs_only=graphene.Boolean(),
+                files_only=graphene.Boolean(),
+                order_by=graphene.String(),
+                sort=graphene.String(default_value="asc"),
+                **kwargs)
+
 
 class LabbookSection(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRepository)):
     """A type representing a section within a LabBook (i.e., code, input, output)
@@ -42,11 +61,12 @@ class LabbookSection(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRe
     # Section name (code, input, output)
     section = graphene.String()
 
-    # List of files and directories, given a relative root directory within the section
-    files = graphene.relay.ConnectionField(LabbookFileConnection, root_dir=graphene.String())
+    # List of files and directories, given a relative root directory within the section. Can be filtered and sorted
+    # by name, size or modifiedAt.
+    files = graphene.relay.ConnectionField(LabbookFileConnection, **_file_connection_args(root_dir=graphene.String()))
 
-    # List of all files and directories within the section
-    all_files = graphene.relay.ConnectionField(LabbookFileConnection)
+    # List of all files and directories within the section. Can be filtered and sorted by name, size or modifiedAt.
+    all_files = graphene.relay.ConnectionField(LabbookFileConnection, **_file_connection_args())
 
     # List of favorites for a given subdir (code, input, output)
     favorites = graphene.relay.ConnectionField(LabbookFavoriteConnection)
@@ -72,6 +92,45 @@ class LabbookSection(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRe
 
         return self.id
 
+    @staticmethod
+    def _file_filter(kwargs):
+        """Method to build the FileFilter for the filter arguments of a file connection, or None if there are none"""
+        if kwargs.get('dirs_only') and kwargs.get('files_only'):
+            raise ValueError("`dirsOnly` and `filesOnly` cannot be used together")
+
+        is_dir = None
+        if kwargs.get('dirs_only'):
+            is_dir = True
+        elif kwargs.get('files_only'):
+            is_dir = False
+
+        file_filter = FileFilter(glob=kwargs.get('glob'),
+                                 name_contains=kwargs.get('name_contains'),
+                                 extensions=kwargs.get('extensions'),
+                                 min_size=kwargs.get('min_size'),
+                                 max_size=kwargs.get('max_size'),
+                                 modified_after=kwargs.get('modified_after'),
+                                 is_dir=is_dir)
+        return file_filter if file_filter else None
+
+    def _sorted_connection(self, labbook, kwargs, file_filter, base_path=None, recursive=False):
+        """Method to create a KeysetConnection over files sorted by the `orderBy` and `sort` arguments"""
+        if kwargs['order_by'] not in FILE_ORDER_BY:
+            raise ValueError(f"Unsupported orderBy: {kwargs['order_by']}. Use `{'`, `'.join(FILE_ORDER_BY)}`")
+        order_by = FILE_ORDER_BY[kwargs['order_by']]
+        sort = kwargs.get('sort', 'asc')
+        if sort not in ('asc', 'desc'):
+            raise ValueError(f"Unsupported sort: {sort}. Use `desc`, `asc`")
+
+        def _iter(after, reverse=False):
+            return indexed_sorted(labbook, self.section, order_by, descending=sort == 'desc', base_path=base_path,
+                                  recursive=recursive, file_filter=file_filter, after=after, reverse=reverse)
+
+        return KeysetConnection(_iter, kwargs, key=lambda edge: file_sort_key(edge, order_by),
+                                backward=lambda before: _iter(before, reverse=True),
+                                position=lambda sort_key: file_sort_position(sort_key, order_by),
+                                descending=sort == 'desc')
+
     def helper_resolve_files(self, labbook, kwargs):
         """Helper method to populate the LabbookFileConnection"""
         base_dir = None
@@ -80,14 +139,18 @@ class LabbookSection(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRe
                 base_dir = kwargs['root_dir'] + os.path.sep
                 base_dir = base_dir.replace(os.path.sep + os.path.sep, os.path.sep)
 
-        # Get all files and directories, with the exception of anything in .git or .gigantum
-        edges = FileOperations.listdir(labbook, self.section, base_path=base_dir, show_hidden=False)
-
-        # Generate naive cursors
-        cursors = [base64.b64encode("{}".format(cnt).encode("UTF-8")).decode("UTF-8") for cnt, x in enumerate(edges)]
-
-        # Process slicing and cursor args
-        lbc = ListBasedConnection(edges, cursors, kwargs)
+        # Filters are applied by the file index, so excluded files are never read
+        file_filter = self._file_filter(kwargs)
+        if kwargs.get('order_by'):
+            lbc = self._sorted_connection(labbook, kwargs, file_filter, base_path=base_dir)
+        else:
+            # Page through the file index by key, with the exception of hidden files. Only the requested page is read.
+            lbc = KeysetConnection(lambda after: indexed_listdir(labbook, self.section, base_path=base_dir,
+                                                                 after=after, file_filter=file_filter),
+                                   kwargs,
+                                   backward=lambda before: indexed_listdir(labbook, self.section, base_path=base_dir,
+                                                                           after=before, reverse=True,
+                                                                           file_filter=file_filter))
         lbc.apply()
 
         edge_objs = []
@@ -99,7 +162,10 @@ class LabbookSection(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRe
                            "_file_info": edge}
             edge_objs.append(LabbookFileConnection.Edge(node=LabbookFile(**create_data), cursor=cursor))
 
-        return LabbookFileConnection(edges=edge_objs, page_info=lbc.page_info)
+        # Only counted if totalCount is selected
+        return LabbookFileConnection(edges=edge_objs, page_info=lbc.page_info,
+                                     total_count=lambda: indexed_count(labbook, self.section, base_path=base_dir,
+                                                                       file_filter=file_filter))
 
     def resolve_files(self, info, **kwargs):
         """Resolver for getting file listing in a single directory"""
@@ -108,25 +174,15 @@ class LabbookSection(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRe
 
     def helper_resolve_all_files(self, labbook, kwargs):
         """Helper method to populate the LabbookFileConnection"""
-        # Check if file info has been cached
-        redis_conn = redis.Redis(db=5)
-        cache_key = f"FILE_LIST_CACHE|{labbook.key}|{self.section}"
-        if redis_conn.exists(cache_key):
-            # Load from cache
-            edges = json.loads(redis_conn.get(cache_key).decode("utf-8"))
-            redis_conn.expire(cache_key, 5)
+        file_filter = self._file_filter(kwargs)
+        if kwargs.get('order_by'):
+            lbc = self._sorted_connection(labbook, kwargs, file_filter, recursive=True)
         else:
-            # Load from disk and cache
-            # Get all files and directories, with the exception of anything in .git or .gigantum
-            edges = FileOperations.walkdir(labbook, section=self.section, show_hidden=False)
-            redis_conn.set(cache_key, json.dumps(edges))
-            redis_conn.expire(cache_key, 5)
-
-        # Generate naive cursors
-        cursors = [base64.b64encode("{}".format(cnt).encode("UTF-8")).decode("UTF-8") for cnt, x in enumerate(edges)]
-
-        # Process slicing and cursor args
-        lbc = ListBasedConnection(edges, cursors, kwargs)
+            # Page through the file index, which only rescans directories that have changed. The walk resumes from
+            # the key in the cursor, so only the requested page is read.
+            lbc = KeysetConnection(lambda after: indexed_walkdir(labbook, self.section, after=after,
+                                                                 file_filter=file_filter), kwargs,
+                                   position=file_walk_position)
         lbc.apply()
 
         edge_objs = []
@@ -138,7 +194,9 @@ class LabbookSection(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRe
                            "_file_info": edge}
             edge_objs.append(LabbookFileConnection.Edge(node=LabbookFile(**create_data), cursor=cursor))
 
-        return LabbookFileConnection(edges=edge_objs, page_info=lbc.page_info)
+        return LabbookFileConnection(edges=edge_objs, page_info=lbc.page_info,
+                                     total_count=lambda: indexed_count(labbook, self.section, recursive=True,
+                                                                       file_filter=file_filter))
 
     def resolve_all_files(self, info, **kwargs):
         """Resolver for getting all files in a LabBook section"""
@@ -147,11 +205,10 @@ class LabbookSection(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRe
 
     def helper_resolve_favorites(self, labbook, kwargs):
         # Get all files and directories, with the exception of anything in .git or .gigantum
-        edges = [x[1] for x in labbook.get_favorites(self.section).items()]
-        cursors = [base64.b64encode("{}".format(cnt).encode("UTF-8")).decode("UTF-8") for cnt, x in enumerate(edges)]
+        edges = list(favorites_cache.get(labbook, self.section).values())
 
         # Process slicing and cursor args
-        lbc = ListBasedConnection(edges, cursors, kwargs)
+        lbc = SequenceConnection(edges, kwargs)
         lbc.apply()
 
         edge_objs = []
@@ -165,7 +222,7 @@ class LabbookSection(graphene.ObjectType, interfaces=(graphene.relay.Node, GitRe
                            "_favorite_data": edge}
             edge_objs.append(LabbookFavoriteConnection.Edge(node=LabbookFavorite(**create_data), cursor=cursor))
 
-        return LabbookFavoriteConnection(edges=edge_objs, page_info=lbc.page_info)
+        return LabbookFavoriteConnection(edges=edge_objs, page_info=lbc.page_info, total_count=lbc.total_count)
 
     def resolve_favorites(self, info, **kwargs):
         """Resolve all favorites for the given section"""
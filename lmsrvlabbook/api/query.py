@@ -17,7 +17,6 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
-import base64
 from typing import List
 import graphene
 
@@ -29,7 +28,7 @@ from lmcommon.environment.utils import get_package_manager
 from lmcommon.labbook.schemas import CURRENT_SCHEMA
 
 from lmsrvcore.auth.user import get_logged_in_username
-from lmsrvcore.api.connections import ListBasedConnection
+from lmsrvcore.api.connections import SequenceConnection
 
 from lmsrvlabbook.api.objects.labbook import Labbook
 from lmsrvlabbook.api.objects.labbooklist import LabbookList
@@ -40,6 +39,8 @@ from lmsrvlabbook.api.objects.jobstatus import JobStatus
 from lmsrvlabbook.api.connections.environment import BaseComponentConnection, CustomComponentConnection
 from lmsrvlabbook.api.connections.jobstatus import JobStatusConnection
 
+from lmsrvcore.api.mutations import ChunkUploadMutation
+from lmsrvcore.api.objects.chunkupload import ChunkUploadStatus
 from lmsrvcore.api.objects.user import UserIdentity
 
 
@@ -99,6 +100,11 @@ class LabbookQuery(graphene.ObjectType):
     # Get the current logged in user identity, primarily used when running offline
     user_identity = graphene.Field(UserIdentity)
 
+    # Progress of an in-progress chunked upload, used to resume it by sending only the missing chunks.
+    # Null if the upload is unknown or has already completed.
+    chunk_upload_status = graphene.Field(ChunkUploadStatus, upload_id=graphene.String(required=True),
+                                         filename=graphene.String(required=True))
+
     def resolve_build_info(self, info):
         """Return this LabManager build info (hash, build timestamp, etc)"""
         # TODO - CUDA version should possibly go in here
@@ -135,6 +141,25 @@ class LabbookQuery(graphene.ObjectType):
         """Return the current LabBook schema version"""
         return CURRENT_SCHEMA
 
+    def resolve_chunk_upload_status(self, info, upload_id: str, filename: str):
+        """Method to return the progress of a chunked upload
+
+        Args:
+            upload_id(str): The UUID of the upload
+            filename(str): The name of the file being uploaded
+
+        Returns:
+            ChunkUploadStatus
+        """
+        status = ChunkUploadMutation.get_upload_status(upload_id, filename)
+        if status is None:
+            return None
+
+        return ChunkUploadStatus(upload_id=upload_id, filename=filename, chunk_size=status['chunk_size'],
+                                 total_chunks=status['total_chunks'], received_chunks=status['received_chunks'],
+                                 missing_chunks=status['missing_chunks'],
+                                 bytes_received=f"{status['bytes_received']}")
+
     def resolve_labbook_list(self, info):
         """Return a labbook list object, which is just a container so the id is empty"""
         return LabbookList(id="")
@@ -161,17 +186,16 @@ class LabbookQuery(graphene.ObjectType):
         job_dispatcher = Dispatcher()
 
         edges: List[str] = [j.job_key.key_str for j in job_dispatcher.all_jobs]
-        cursors = [base64.b64encode(f"{str(cnt)}".encode('utf-8')) for cnt, x in enumerate(edges)]
 
         # Process slicing and cursor args
-        lbc = ListBasedConnection(edges, cursors, kwargs)
+        lbc = SequenceConnection(edges, kwargs)
         lbc.apply()
 
         edge_objs = []
         for edge, cursor in zip(lbc.edges, lbc.cursors):
             edge_objs.append(JobStatusConnection.Edge(node=JobStatus(edge), cursor=cursor))
 
-        return JobStatusConnection(edges=edge_objs, page_info=lbc.page_info)
+        return JobStatusConnection(edges=edge_objs, page_info=lbc.page_info, total_count=lbc.total_count)
 
     def resolve_available_bases(self, info, **kwargs):
         """Method to return a all graphene BaseImages that are available
@@ -181,10 +205,9 @@ class LabbookQuery(graphene.ObjectType):
         """
         repo = ComponentRepository()
         edges = repo.get_component_list("base")
-        cursors = [base64.b64encode("{}".format(cnt).encode("UTF-8")).decode("UTF-8") for cnt, x in enumerate(edges)]
 
         # Process slicing and cursor args
-        lbc = ListBasedConnection(edges, cursors, kwargs)
+        lbc = SequenceConnection(edges, kwargs)
         lbc.apply()
 
         # Get BaseImage instances
@@ -195,7 +218,7 @@ class LabbookQuery(graphene.ObjectType):
                                                                              revision=int(edge['revision'])),
                                                           cursor=cursor))
 
-        return BaseComponentConnection(edges=edge_objs, page_info=lbc.page_info)
+        return BaseComponentConnection(edges=edge_objs, page_info=lbc.page_info, total_count=lbc.total_count)
 
     # Currently not fully supported, but will be added in the future.
     # def resolve_available_base_image_versions(self, info, repository, namespace, component, **kwargs):
@@ -237,10 +260,9 @@ class LabbookQuery(graphene.ObjectType):
         """
         repo = ComponentRepository()
         edges = repo.get_component_list("custom")
-        cursors = [base64.b64encode("{}".format(cnt).encode("UTF-8")).decode("UTF-8") for cnt, x in enumerate(edges)]
 
         # Process slicing and cursor args
-        lbc = ListBasedConnection(edges, cursors, kwargs)
+        lbc = SequenceConnection(edges, kwargs)
         lbc.apply()
 
         # Get BaseImage instances
@@ -251,7 +273,7 @@ class LabbookQuery(graphene.ObjectType):
                                                                                  revision=edge['revision']),
                                                             cursor=cursor))
 
-        return CustomComponentConnection(edges=edge_objs, page_info=lbc.page_info)
+        return CustomComponentConnection(edges=edge_objs, page_info=lbc.page_info, total_count=lbc.total_count)
 
     def resolve_user_identity(self, info):
         """Method to return a graphene UserIdentity instance based on the current logged (both on & offline) user
@@ -0,0 +1,221 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import hashlib
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from lmcommon.labbook import LabBook
+from lmcommon.logging import LMLogger
+
+logger = LMLogger.get_logger()
+
+# Database, relative to the LabManager working directory, holding the content hashes of every LabBook
+CONTENT_HASH_DATABASE = os.path.join('.labmanager', 'content-hashes.db')
+
+# Number of background threads hashing files
+CONTENT_HASH_WORKERS = 2
+
+# Size of the buffer files are read into while hashing
+CONTENT_HASH_BUFFER_SIZE = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (device, inode)
+);
+"""
+
+
+def hash_file(path: str, buffer_size: int = CONTENT_HASH_BUFFER_SIZE) -> str:
+    """Method to compute the SHA-256 of a file, reading it into a single fixed-size buffer
+
+    Args:
+        path(str): Absolute path of the file
+        buffer_size(int): Number of bytes read at a time
+
+    Returns:
+        str: The hex digest
+    """
+    digest = hashlib.sha256()
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as fp:
+        while True:
+            read = fp.readinto(buffer)
+            if not read:
+                break
+            digest.update(view[:read])
+    return digest.hexdigest()
+
+
+class ContentHashCache(object):
+    """A persistent cache of file content hashes, computed in the background
+
+    Hashes are stored in SQLite keyed by (device, inode) and are only valid while the file's size and mtime_ns are
+    unchanged, so a file is hashed once per version no matter how often it is read, and renaming a file keeps its
+    hash. A lookup never hashes in the calling thread: a missing or stale hash is queued for a background worker and
+    None is returned until it is ready.
+    """
+    def __init__(self, workers: int = CONTENT_HASH_WORKERS) -> None:
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._connections: Dict[str, sqlite3.Connection] = dict()
+        self._pending: Dict[Tuple[int, int, int, int], str] = dict()
+
+        self.hits = 0
+        self.misses = 0
+        self.hashed_files = 0
+        self.hashed_bytes = 0
+        self.failures = 0
+
+    @staticmethod
+    def db_path(labbook: LabBook) -> str:
+        working_dir = labbook.labmanager_config.config['git']['working_directory']
+        return os.path.join(os.path.expanduser(working_dir), CONTENT_HASH_DATABASE)
+
+    def _connect(self, db_path: str) -> sqlite3.Connection:
+        conn = self._connections.get(db_path)
+        if conn is None:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._connections[db_path] = conn
+        return conn
+
+    def get(self, labbook: LabBook, path: str) -> Optional[str]:
+        """Method to get the SHA-256 of a file, queueing it to be hashed if it is not known
+
+        Args:
+            labbook(LabBook): The LabBook containing the file
+            path(str): Absolute path of the file
+
+        Returns:
+            str: The hex digest, or None while it is being computed
+        """
+        file_stat = os.stat(path)
+        key = (file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+        db_path = self.db_path(labbook)
+
+        with self._lock:
+            row = self._connect(db_path).execute("SELECT sha256 FROM hashes WHERE device = ? AND inode = ? AND "
+                                                 "size = ? AND mtime_ns = ?", key).fetchone()
+            if row:
+                self.hits += 1
+                return row[0]
+
+            self.misses += 1
+            if key not in self._pending:
+                self._pending[key] = path
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers)
+                self._executor.submit(self._hash, db_path, key, path)
+        return None
+
+    def put(self, labbook: LabBook, path: str, sha256: str) -> None:
+        """Method to record the SHA-256 of a file that is already known, such as one computed while it was uploaded
+
+        Args:
+            labbook(LabBook): The LabBook containing the file
+            path(str): Absolute path of the file
+            sha256(str): Hex digest of the file's current contents
+
+        Returns:
+            None
+        """
+        file_stat = os.stat(path)
+        key = (file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+        with self._lock:
+            conn = self._connect(self.db_path(labbook))
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO hashes (device, inode, size, mtime_ns, sha256) "
+                             "VALUES (?, ?, ?, ?, ?)", key + (sha256,))
+
+    def is_pending(self, path: str) -> bool:
+        """Method to check if the current version of a file is queued or being hashed
+
+        Args:
+            path(str): Absolute path of the file
+
+        Returns:
+            bool
+        """
+        file_stat = os.stat(path)
+        with self._lock:
+            return (file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns) in self._pending
+
+    def _hash(self, db_path: str, key: Tuple[int, int, int, int], path: str) -> None:
+        try:
+            digest = hash_file(path)
+
+            # Only store the hash if the file was not modified while it was read
+            file_stat = os.stat(path)
+            if (file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns) == key:
+                with self._lock:
+                    conn = self._connect(db_path)
+                    with conn:
+                        conn.execute("INSERT OR REPLACE INTO hashes (device, inode, size, mtime_ns, sha256) "
+                                     "VALUES (?, ?, ?, ?, ?)", key + (digest,))
+                    self.hashed_files += 1
+                    self.hashed_bytes += key[2]
+        except (OSError, sqlite3.Error) as err:
+            logger.warning(f"Failed to hash {path}: {err}")
+            with self._lock:
+                self.failures += 1
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def wait(self) -> None:
+        """Method to block until every queued file has been hashed
+
+        Returns:
+            None
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, int]:
+        """Method to get the current cache counters
+
+        Returns:
+            dict
+        """
+        with self._lock:
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "pending": len(self._pending),
+                    "hashed_files": self.hashed_files,
+                    "hashed_bytes": self.hashed_bytes,
+                    "failures": self.failures}
+
+
+# Process-wide content hash cache
+content_hash_cache = ContentHashCache()
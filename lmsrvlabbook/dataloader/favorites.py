@@ -0,0 +1,205 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from promise.dataloader import DataLoader
+
+from lmcommon.labbook import LabBook
+from lmcommon.logging import LMLogger
+
+logger = LMLogger.get_logger()
+
+# Maximum number of (LabBook, section) favorites held in the process-wide cache
+FAVORITES_CACHE_MAX_SIZE = 256
+
+# Favorites files modified less than this many seconds ago are not cached, since the file could be rewritten within
+# the same mtime tick without changing the recorded mtime
+FAVORITES_RACY_WINDOW = 2.0
+
+
+def favorites_path(labbook: LabBook, section: str) -> str:
+    """Method to get the path of the file a section's favorites are stored in
+
+    Args:
+        labbook(LabBook): The LabBook
+        section(str): The section (code, input, output)
+
+    Returns:
+        str
+    """
+    return os.path.join(labbook.root_dir, '.gigantum', 'favorites', f'{section}.json')
+
+
+def _validator(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        file_stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return file_stat.st_mtime_ns, file_stat.st_size
+
+
+class FavoritesCache(object):
+    """A process-wide, bounded LRU cache of parsed favorites, one entry per LabBook section
+
+    Entries are validated against the mtime and size of the favorites file on every hit, so a favorite added, updated
+    or removed by any means is picked up by the next lookup. The returned favorites are shared and must not be
+    modified.
+    """
+    def __init__(self, max_size: int = FAVORITES_CACHE_MAX_SIZE) -> None:
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, labbook: LabBook, section: str) -> Dict[str, Dict[str, Any]]:
+        """Method to get the favorites of a section, ordered by index and keyed by key
+
+        Args:
+            labbook(LabBook): The LabBook
+            section(str): The section (code, input, output)
+
+        Returns:
+            OrderedDict
+        """
+        path = favorites_path(labbook, section)
+        validator = _validator(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == validator:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        favorites = labbook.get_favorites(section)
+        if validator is not None and validator[0] > (time.time() - FAVORITES_RACY_WINDOW) * 1e9:
+            return favorites
+
+        with self._lock:
+            self._entries[path] = (validator, favorites)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return favorites
+
+    def invalidate(self, labbook: LabBook, section: str) -> None:
+        """Method to drop the favorites of a section, typically after they have been modified
+
+        Args:
+            labbook(LabBook): The LabBook
+            section(str): The section (code, input, output)
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._entries.pop(favorites_path(labbook, section), None)
+
+    def clear(self) -> None:
+        """Method to empty the cache and reset all counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Method to get the current cache counters
+
+        Returns:
+            dict
+        """
+        with self._lock:
+            return {"size": len(self._entries),
+                    "max_size": self.max_size,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions}
+
+
+# Process-wide favorites cache, shared by all FavoritesLoader instances
+favorites_cache = FavoritesCache()
+
+
+def reorder_favorites(labbook: LabBook, section: str, keys: List[str]) -> List[Dict[str, Any]]:
+    """Method to reorder all favorites of a section with a single write and commit
+
+    Args:
+        labbook(LabBook): The LabBook
+        section(str): The section (code, input, output)
+        keys(list(str)): Keys of every favorite in the section, in their new order
+
+    Returns:
+        list of favorites, in their new order
+    """
+    favorites = labbook.get_favorites(section)
+    if len(keys) != len(set(keys)) or set(keys) != set(favorites.keys()):
+        raise ValueError("Reordering favorites requires the key of every favorite in the section exactly once")
+
+    reordered = list()
+    for index, key in enumerate(keys):
+        favorite = dict(favorites[key])
+        favorite['index'] = index
+        reordered.append(favorite)
+
+    path = favorites_path(labbook, section)
+    with open(path, 'wt') as favorite_file:
+        json.dump(reordered, favorite_file, indent=2)
+    favorites_cache.invalidate(labbook, section)
+
+    labbook.git.add(path)
+    labbook.git.commit(f"Reordering {section} favorites")
+    return reordered
+
+
+class FavoritesLoader(DataLoader):
+    """Dataloader for the favorites of a LabBook section
+
+    The key for this object is username&owner&labbook_name&section
+
+    Favorites are read through the process-wide `favorites_cache`, so resolving many favorites of the same section
+    parses the favorites file at most once.
+    """
+    def __init__(self, labbook_loader: DataLoader) -> None:
+        DataLoader.__init__(self)
+        self.labbook_loader = labbook_loader
+
+    def batch_load_fn(self, keys: List[str]):
+        """Method to load favorites based on a list of unique keys
+
+        Args:
+            keys(list(str)): Unique key to identify the section
+
+        Returns:
+            Promise
+        """
+        labbook_keys = [key.rsplit('&', 1)[0] for key in keys]
+        return self.labbook_loader.load_many(labbook_keys).then(
+            lambda labbooks: [favorites_cache.get(labbook, key.rsplit('&', 1)[1])
+                              for labbook, key in zip(labbooks, keys)])
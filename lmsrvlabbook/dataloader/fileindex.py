@@ -0,0 +1,1283 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import fnmatch
+import hashlib
+import json
+import os
+import sqlite3
+import stat
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import flask
+
+from lmcommon.files import FileOperations
+from lmcommon.labbook import LabBook
+from lmcommon.logging import LMLogger
+from lmsrvlabbook.dataloader.labbook import labbook_fingerprint
+from lmsrvlabbook.dataloader.favorites import favorites_cache
+
+logger = LMLogger.get_logger()
+
+# Directory, relative to the LabManager working directory, holding the file index databases. The index is kept
+# outside of the LabBook so it is never committed.
+FILE_INDEX_DIRECTORY = os.path.join('.labmanager', 'fileindex')
+
+# Seconds between full rescans, which re-stat every file to catch content changes that do not touch the mtime of
+# the parent directory (e.g. appending to an existing file), and measure the .git directory. Full rescans run in a
+# background thread. Files in a directory being listed are re-stat'ed when listed, so this only delays such changes
+# in recursive listings and directory totals.
+FILE_INDEX_FULL_SCAN_INTERVAL = 30
+
+# Directories modified less than this many seconds before a scan are rescanned next time, since an entry could be
+# added within the same mtime tick without changing the recorded mtime
+FILE_INDEX_RACY_WINDOW = 2.0
+
+# Maximum number of file indexes kept open
+FILE_INDEX_MAX_OPEN = 64
+
+# Number of rows read per query when iterating over a listing
+FILE_INDEX_READ_CHUNK = 500
+
+# Incremented when the tables change, causing existing indexes to be rebuilt
+_SCHEMA_VERSION = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    key TEXT NOT NULL,
+    name TEXT NOT NULL,
+    parent TEXT NOT NULL,
+    is_dir INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hidden INTEGER NOT NULL,
+    total_size INTEGER NOT NULL,
+    file_count INTEGER NOT NULL,
+    tree_mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_parent_key ON entries (parent, key);
+CREATE INDEX IF NOT EXISTS entries_parent_type_key ON entries (parent, is_dir, key);
+CREATE TABLE IF NOT EXISTS scanned_dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+# Sort orders supported by FileIndex.iter_sorted, mapped to the SQL expression they sort on. modified_at is compared
+# in seconds as a float, the value returned in file info dicts, so cursors built from a dict match the index exactly.
+FILE_SORT_COLUMNS = {'name': 'key', 'size': 'size', 'modified_at': 'mtime_ns / 1e9'}
+
+
+# Columns read to build a file info dict
+_COLUMNS = "path, is_dir, size, mtime_ns, total_size, file_count, tree_mtime_ns"
+
+
+def _is_hidden(path: str) -> bool:
+    return any(part.startswith('.') for part in path.split('/'))
+
+
+def _prefix_range(path: str):
+    # Paths strictly below `path` sort between "path/" and "path0", since "0" follows "/"
+    return f"{path}/", f"{path}0"
+
+
+def _sqlite_glob(pattern: str) -> str:
+    """Method to translate a shell-style pattern, as matched by fnmatch, to SQLite GLOB syntax. The two only differ in
+    bracket expressions: fnmatch negates with [!...] and reads a leading ^ literally, while GLOB negates with [^...].
+
+    Args:
+        pattern(str): Pattern using *, ? and [...] wildcards
+
+    Returns:
+        str
+    """
+    result = ""
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        i += 1
+        if c != '[':
+            result += c
+            continue
+
+        # Find the closing bracket the way fnmatch does, where a ] right after [ or [! is part of the set
+        j = i
+        if j < n and pattern[j] == '!':
+            j += 1
+        if j < n and pattern[j] == ']':
+            j += 1
+        while j < n and pattern[j] != ']':
+            j += 1
+        if j >= n:
+            # fnmatch reads an unclosed [ literally
+            result += "[[]"
+            continue
+
+        chars = pattern[i:j]
+        i = j + 1
+        if chars.startswith('!'):
+            result += f"[^{chars[1:]}]"
+        elif chars.startswith('^'):
+            # Move the literal ^ to where GLOB doesn't read it as a negation
+            rest = chars.lstrip('^')
+            result += f"[{rest}^]" if rest else '^'
+        else:
+            result += f"[{chars}]"
+    return result
+
+
+class FileFilter(object):
+    def __init__(self, glob: Optional[str] = None, name_contains: Optional[str] = None,
+                 extensions: Optional[List[str]] = None, min_size: Optional[float] = None,
+                 max_size: Optional[float] = None, modified_after: Optional[int] = None,
+                 is_dir: Optional[bool] = None) -> None:
+        """Criteria for selecting files and directories from a listing. Every criterion that is set must match.
+
+        Args:
+            glob(str): Pattern matched against the key relative to the section, using *, ? and [...] wildcards as in
+                       fnmatch, where [!...] negates a set
+            name_contains(str): Case-insensitive substring of the file or directory name
+            extensions(list): File extensions (with or without the leading dot), matched case-insensitively
+            min_size(float): Minimum size in bytes. Directories have a size of 0.
+            max_size(float): Maximum size in bytes
+            modified_after(int): Only include entries modified after this time, in seconds since the epoch
+            is_dir(bool): If set, only include directories (True) or files (False)
+
+        Returns:
+            FileFilter
+        """
+        self.glob = glob or None
+        self.name_contains = name_contains.lower() if name_contains else None
+        self.extensions = sorted({e.lower().lstrip('.') for e in extensions if e}) if extensions else None
+        self.min_size = min_size
+        self.max_size = max_size
+        self.modified_after = modified_after
+        self.is_dir = is_dir
+
+    def __bool__(self) -> bool:
+        return any(v is not None for v in (self.glob, self.name_contains, self.extensions, self.min_size,
+                                           self.max_size, self.modified_after, self.is_dir))
+
+    def where(self, section: str) -> Tuple[str, List[Any]]:
+        """Method to build the SQL conditions for the filter, to be added to a query on the entries table
+
+        Args:
+            section(str): The section keys are relative to
+
+        Returns:
+            tuple of the conditions (each prefixed with AND) and their parameters
+        """
+        clauses = ""
+        params: List[Any] = list()
+        if self.glob is not None:
+            clauses += " AND substr(key, ?) GLOB ?"
+            params.extend([len(section) + 2, _sqlite_glob(self.glob)])
+        if self.name_contains is not None:
+            clauses += " AND instr(lower(name), ?) > 0"
+            params.append(self.name_contains)
+        if self.extensions is not None:
+            clauses += " AND (" + " OR ".join(["lower(name) LIKE ? ESCAPE '\\'"] * len(self.extensions)) + ")"
+            params.extend(['%.' + e.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                           for e in self.extensions])
+        if self.min_size is not None:
+            clauses += " AND size >= ?"
+            params.append(self.min_size)
+        if self.max_size is not None:
+            clauses += " AND size <= ?"
+            params.append(self.max_size)
+        if self.modified_after is not None:
+            clauses += " AND mtime_ns > ?"
+            params.append(int(self.modified_after * 1e9))
+        if self.is_dir is not None:
+            clauses += " AND is_dir = ?"
+            params.append(int(self.is_dir))
+        return clauses, params
+
+    def matches(self, edge: Dict[str, Any]) -> bool:
+        """Method to apply the filter to a file info dict, when listing without the index
+
+        Args:
+            edge(dict): File info dict
+
+        Returns:
+            bool
+        """
+        name = edge['key'].rstrip('/').rsplit('/', 1)[-1].lower()
+        size = 0 if edge['is_dir'] else edge['size']
+        if self.glob is not None and not fnmatch.fnmatchcase(edge['key'], self.glob):
+            return False
+        if self.name_contains is not None and self.name_contains not in name:
+            return False
+        if self.extensions is not None and not any(name.endswith('.' + e) for e in self.extensions):
+            return False
+        if self.min_size is not None and size < self.min_size:
+            return False
+        if self.max_size is not None and size > self.max_size:
+            return False
+        if self.modified_after is not None and edge['modified_at'] <= self.modified_after:
+            return False
+        if self.is_dir is not None and edge['is_dir'] != self.is_dir:
+            return False
+        return True
+
+
+def file_sort_key(edge: Dict[str, Any], order_by: str) -> str:
+    """Method to get the keyset cursor key of a file info dict, for a listing sorted by FileIndex.iter_sorted
+
+    Args:
+        edge(dict): File info dict
+        order_by(str): The sort order, a key of FILE_SORT_COLUMNS
+
+    Returns:
+        str
+    """
+    if order_by == 'name':
+        return edge['key']
+    if order_by == 'size':
+        value = 0 if edge['is_dir'] else edge['size']
+    else:
+        value = edge['modified_at']
+    return f"{value!r}:{edge['key']}"
+
+
+def file_sort_position(sort_key: str, order_by: str) -> Tuple[Any, str]:
+    """Method to get the position of a keyset cursor key from file_sort_key in ascending sort order, for comparing
+    cursors
+
+    Args:
+        sort_key(str): Key returned by file_sort_key
+        order_by(str): The sort order, a key of FILE_SORT_COLUMNS
+
+    Returns:
+        tuple
+    """
+    return _parse_sort_key(sort_key, order_by)
+
+
+def file_walk_position(key: str) -> Tuple[List[str], bool, str]:
+    """Method to get the position of a key in the order of FileIndex.iter_walkdir, for comparing cursors
+
+    Directories are walked depth first in key order, and each lists its subdirectories before its files.
+
+    Args:
+        key(str): Key relative to the section
+
+    Returns:
+        tuple
+    """
+    parts = key.rstrip('/').split('/')
+    return [f"{part}/" for part in parts[:-1]], not key.endswith('/'), key
+
+
+def _parse_sort_key(sort_key: str, order_by: str) -> Tuple[Any, str]:
+    if order_by == 'name':
+        return None, sort_key
+    try:
+        value, key = sort_key.split(':', 1)
+        return (int(value) if order_by == 'size' else float(value)), key
+    except ValueError:
+        raise ValueError("`after` cursor is invalid")
+
+
+def _tree_size(root_dir: str) -> int:
+    total_size = 0
+    for dirpath, _, filenames in os.walk(root_dir):
+        for filename in filenames:
+            try:
+                total_size += os.lstat(os.path.join(dirpath, filename)).st_size
+            except FileNotFoundError:
+                pass
+    return total_size
+
+
+class FileIndex(object):
+    """A persistent index of every file and directory in a LabBook, stored in SQLite
+
+    Each entry holds the path relative to the LabBook root, its key (the path, with a trailing slash for
+    directories), name, size, mtime, type and whether any path component is hidden. Listings are read in chunks by
+    seeking on (parent, key), so reading a page costs the same whatever the size of the directory, and filters are
+    applied in the query so excluded entries are never read.
+
+    The index is updated incrementally: a directory whose mtime is unchanged since it was last scanned is not
+    listed again, so only directories where entries were added, removed or renamed are rescanned. Content changes
+    that leave the parent directory's mtime untouched are picked up when the directory is listed, which re-stats
+    its files, or by a full rescan every FILE_INDEX_FULL_SCAN_INTERVAL seconds, or when HEAD moves. Full rescans are
+    run by the FileIndexManager in the background, never by refresh().
+
+    The .git directory is not indexed. Its size, needed for the LabBook size, is recorded on each full rescan, or
+    measured when the size is first needed.
+
+    Each directory also holds the total size, number of files and latest mtime of the visible entries below it.
+    These are aggregated bottom-up, from the directory's children only, for the directories that were rescanned and
+    their ancestors.
+    """
+    def __init__(self, root_dir: str, db_path: str) -> None:
+        self.root_dir = root_dir
+        self.db_path = db_path
+
+        self.refreshes = 0
+        self.full_scans = 0
+        self.scanned_dirs = 0
+        self.skipped_dirs = 0
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._closed = False
+        self._lock = threading.RLock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if conn.execute("PRAGMA user_version").fetchone()[0] != _SCHEMA_VERSION:
+                conn.executescript("DROP TABLE IF EXISTS entries; DROP TABLE IF EXISTS scanned_dirs; "
+                                   "DROP TABLE IF EXISTS meta;")
+                conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _get_meta(self, key: str) -> Any:
+        row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_meta(self, key: str, value: Any) -> None:
+        self._connect().execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def refresh(self) -> bool:
+        """Method to bring the index up to date with the working tree, rescanning only directories whose mtime changed
+
+        Returns:
+            bool: True if a full rescan is due, because HEAD moved or the last one is older than
+                  FILE_INDEX_FULL_SCAN_INTERVAL
+        """
+        with self._lock:
+            conn = self._connect()
+            head = list(labbook_fingerprint(self.root_dir)[:2])
+            last_head = self._get_meta('head')
+
+            with conn:
+                self._scan(conn, full=False)
+                self._set_meta('head', head)
+                if last_head is None:
+                    # A new index, so every directory was just listed
+                    self._set_meta('last_full_scan', time.time())
+
+            self.refreshes += 1
+            last_full_scan = self._get_meta('last_full_scan') or 0
+            return last_head not in (None, head) or time.time() - last_full_scan > FILE_INDEX_FULL_SCAN_INTERVAL
+
+    def full_scan(self) -> None:
+        """Method to list every directory and re-stat every file, and measure the .git directory
+
+        Returns:
+            None
+        """
+        git_size = _tree_size(os.path.join(self.root_dir, '.git'))
+        with self._lock:
+            if self._closed:
+                # Retired or removed while the scan was queued
+                return
+            conn = self._connect()
+            with conn:
+                self._scan(conn, full=True)
+                self._set_meta('git_size', git_size)
+                self._set_meta('last_full_scan', time.time())
+            self.full_scans += 1
+
+    def update(self, paths: List[str]) -> None:
+        """Method to rescan the directories containing paths that were just changed, along with any directories
+        among them, so the change is reflected without waiting for the directory mtime check or a full scan
+
+        Args:
+            paths(list): Paths relative to the LabBook root
+
+        Returns:
+            None
+        """
+        roots = set()
+        for path in paths:
+            path = path.strip('/')
+            roots.add(path.rsplit('/', 1)[0] if '/' in path else '')
+            if path and os.path.isdir(os.path.join(self.root_dir, path)):
+                roots.add(path)
+
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                self._scan(conn, full=False, roots=sorted(roots))
+
+    def _scan(self, conn: sqlite3.Connection, full: bool, roots: Optional[List[str]] = None) -> None:
+        racy_after = int((time.time() - FILE_INDEX_RACY_WINDOW) * 1e9)
+        known_dirs = dict(conn.execute("SELECT path, mtime_ns FROM scanned_dirs"))
+        children = defaultdict(list)
+        for path in known_dirs:
+            if path:
+                children[path.rsplit('/', 1)[0] if '/' in path else ''].append(path)
+
+        # Directories listed again, or holding rows that were replaced, whose totals must be aggregated
+        changed = set()
+        stack = list(roots) if roots else ['']
+        while stack:
+            rel_dir = stack.pop()
+            abs_dir = os.path.join(self.root_dir, rel_dir) if rel_dir else self.root_dir
+            try:
+                dir_stat = os.stat(abs_dir, follow_symlinks=False)
+            except FileNotFoundError:
+                # Removed since the parent was listed, the parent's rescan drops it
+                continue
+
+            if not full and rel_dir not in (roots or []) and known_dirs.get(rel_dir) == dir_stat.st_mtime_ns:
+                # No entries added or removed, but subdirectories may have changed
+                self.skipped_dirs += 1
+                stack.extend(children.get(rel_dir, []))
+                continue
+
+            self.scanned_dirs += 1
+            changed.add(rel_dir)
+            existing = dict(conn.execute("SELECT path, is_dir FROM entries WHERE parent = ? AND path != ''",
+                                         (rel_dir,)))
+            rows = list()
+            try:
+                entries = list(os.scandir(abs_dir))
+            except FileNotFoundError:
+                continue
+
+            for entry in entries:
+                if not rel_dir and entry.name == '.git':
+                    continue
+
+                try:
+                    entry_stat = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    # Removed while scanning, dropped below
+                    continue
+
+                is_dir = stat.S_ISDIR(entry_stat.st_mode)
+                path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                size = 0 if is_dir else entry_stat.st_size
+                rows.append((path, f"{path}/" if is_dir else path, entry.name, rel_dir, int(is_dir), size,
+                             entry_stat.st_mtime_ns, int(_is_hidden(path)), size, int(not is_dir),
+                             entry_stat.st_mtime_ns))
+
+                if existing.pop(path, 0) and not is_dir:
+                    # A directory replaced by a file
+                    conn.execute("DELETE FROM scanned_dirs WHERE path = ?", (path,))
+                    self._delete_below(conn, path)
+                if is_dir:
+                    stack.append(path)
+                    changed.add(path)
+
+            for path in existing:
+                conn.execute("DELETE FROM entries WHERE path = ?", (path,))
+                conn.execute("DELETE FROM scanned_dirs WHERE path = ?", (path,))
+                self._delete_below(conn, path)
+
+            conn.executemany("INSERT OR REPLACE INTO entries (path, key, name, parent, is_dir, size, mtime_ns, hidden, "
+                             "total_size, file_count, tree_mtime_ns) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("INSERT OR REPLACE INTO entries (path, key, name, parent, is_dir, size, mtime_ns, hidden, "
+                         "total_size, file_count, tree_mtime_ns) VALUES (?, ?, ?, ?, 1, 0, ?, ?, 0, 0, ?)",
+                         (rel_dir, f"{rel_dir}/", rel_dir.rsplit('/', 1)[-1],
+                          rel_dir.rsplit('/', 1)[0] if '/' in rel_dir else '',
+                          dir_stat.st_mtime_ns, int(_is_hidden(rel_dir)), dir_stat.st_mtime_ns))
+
+            # A directory modified within the racy window is recorded as unscanned, so it is listed again next time
+            conn.execute("INSERT OR REPLACE INTO scanned_dirs (path, mtime_ns) VALUES (?, ?)",
+                         (rel_dir, dir_stat.st_mtime_ns if dir_stat.st_mtime_ns < racy_after else 0))
+
+        self._aggregate(conn, changed)
+
+    def _restat(self, directory: Optional[str] = None) -> None:
+        # Re-stat the files directly in a directory, or every file if None, so content changes that did not touch the
+        # directory's mtime are reflected. Added, removed and replaced entries change the mtime, and are handled by
+        # refresh(). Files are stat'ed without holding the lock.
+        with self._lock:
+            query = "SELECT path, size, mtime_ns, parent FROM entries WHERE is_dir = 0 AND path != ''"
+            if directory is None:
+                rows = self._connect().execute(query).fetchall()
+            else:
+                rows = self._connect().execute(f"{query} AND parent = ?", (directory,)).fetchall()
+
+        updates = list()
+        changed = set()
+        for path, size, mtime_ns, parent in rows:
+            try:
+                file_stat = os.stat(os.path.join(self.root_dir, path), follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            if stat.S_ISDIR(file_stat.st_mode):
+                continue
+            if (file_stat.st_size, file_stat.st_mtime_ns) != (size, mtime_ns):
+                updates.append((file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_size,
+                                file_stat.st_mtime_ns, path))
+                changed.add(parent)
+
+        if updates:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.executemany("UPDATE entries SET size = ?, mtime_ns = ?, total_size = ?, tree_mtime_ns = ? "
+                                     "WHERE path = ?", updates)
+                    self._aggregate(conn, changed)
+
+    @staticmethod
+    def _aggregate(conn: sqlite3.Connection, changed: set) -> None:
+        # Every ancestor of a changed directory is re-aggregated too, deepest first, so each directory sums the
+        # already updated totals of its children. Hidden directories are skipped, as they are excluded from totals.
+        pending = set()
+        for path in changed:
+            while path not in pending:
+                pending.add(path)
+                if not path:
+                    break
+                path = path.rsplit('/', 1)[0] if '/' in path else ''
+
+        for path in sorted((p for p in pending if not _is_hidden(p)), key=lambda p: p.count('/') + bool(p),
+                           reverse=True):
+            total_size, file_count, tree_mtime_ns = conn.execute(
+                "SELECT COALESCE(SUM(total_size), 0), COALESCE(SUM(file_count), 0), MAX(tree_mtime_ns) "
+                "FROM entries WHERE parent = ? AND path != '' AND hidden = 0", (path,)).fetchone()
+            conn.execute("UPDATE entries SET total_size = ?, file_count = ?, tree_mtime_ns = MAX(mtime_ns, ?) "
+                         "WHERE path = ? AND is_dir = 1", (total_size, file_count, tree_mtime_ns or 0, path))
+
+    @staticmethod
+    def _delete_below(conn: sqlite3.Connection, path: str) -> None:
+        conn.execute("DELETE FROM entries WHERE path >= ? AND path < ?", _prefix_range(path))
+        conn.execute("DELETE FROM scanned_dirs WHERE path >= ? AND path < ?", _prefix_range(path))
+
+    @staticmethod
+    def _edge(section: str, row, favorites: set) -> Dict[str, Any]:
+        path, is_dir, size, mtime_ns, total_size, file_count, tree_mtime_ns = row[:7]
+        key = path[len(section) + 1:]
+        if is_dir and key:
+            key += '/'
+        return {"key": key,
+                "is_dir": bool(is_dir),
+                "size": size,
+                "modified_at": mtime_ns / 1e9,
+                "is_favorite": key in favorites,
+                "total_size": total_size,
+                "file_count": file_count,
+                "last_modified_at": tree_mtime_ns / 1e9}
+
+    def _seek(self, parent: str, is_dir: Optional[bool] = None, after: Optional[str] = None,
+              reverse: bool = False, where: Optional[Tuple[str, List[Any]]] = None) -> Iterator[tuple]:
+        """Method to iterate over the visible entries of a directory in key order, starting after a key
+
+        Args:
+            parent(str): Path of the directory relative to the LabBook root
+            is_dir(bool): If set, only return directories (True) or files (False)
+            after(str): Key to start after (before, if reverse), or None to start at the beginning
+            reverse(bool): If True, iterate in descending key order
+            where(tuple): Additional conditions and parameters, from FileFilter.where
+
+        Returns:
+            iterator of (path, is_dir, size, mtime_ns, total_size, file_count, tree_mtime_ns) tuples
+        """
+        clauses = "parent = ? AND hidden = 0"
+        params: List[Any] = [parent]
+        if is_dir is not None:
+            clauses += " AND is_dir = ?"
+            params.append(int(is_dir))
+        if where is not None:
+            clauses += where[0]
+            params.extend(where[1])
+
+        while True:
+            query = f"SELECT {_COLUMNS}, key FROM entries WHERE {clauses}"
+            query_params = list(params)
+            if after is not None:
+                query += " AND key < ?" if reverse else " AND key > ?"
+                query_params.append(after)
+            query += f" ORDER BY key {'DESC' if reverse else 'ASC'} LIMIT ?"
+            query_params.append(FILE_INDEX_READ_CHUNK)
+
+            with self._lock:
+                rows = self._connect().execute(query, query_params).fetchall()
+
+            for row in rows:
+                yield row[:7]
+            if len(rows) < FILE_INDEX_READ_CHUNK:
+                return
+            after = rows[-1][7]
+
+    def _walk(self, directory: str, where: Optional[Tuple[str, List[Any]]] = None) -> Iterator[tuple]:
+        # Filters select what is returned, every subdirectory is still walked
+        yield from self._seek(directory, is_dir=True, where=where)
+        yield from self._seek(directory, is_dir=False, where=where)
+        for subdirectory in self._seek(directory, is_dir=True):
+            yield from self._walk(subdirectory[0], where)
+
+    def iter_walkdir(self, section: str, favorites: set, after: Optional[str] = None,
+                     file_filter: Optional[FileFilter] = None) -> Iterator[Dict[str, Any]]:
+        """Method to iterate over every visible file and directory in a section, in the same order as
+        FileOperations.walkdir
+
+        Each directory's subdirectories are listed before its files, followed by the contents of each subdirectory.
+        Iteration can resume after any key, without reading the entries before it.
+
+        Args:
+            section(str): The section (code, input, output)
+            favorites(set): Keys of the favorites in the section
+            after(str): Key, relative to the section, to resume after
+            file_filter(FileFilter): Only return entries matching the filter
+
+        Returns:
+            iterator of file info dicts
+        """
+        where = file_filter.where(section) if file_filter else None
+        if after is None:
+            rows = self._walk(section, where)
+        else:
+            rows = self._resume_walk(section, after, where)
+
+        for row in rows:
+            yield self._edge(section, row, favorites)
+
+    def _resume_walk(self, section: str, after: str, where: Optional[Tuple[str, List[Any]]] = None) -> Iterator[tuple]:
+        path = f"{section}/{after}".rstrip('/')
+        if not after.strip('/') or '//' in after:
+            raise ValueError("`after` cursor is invalid")
+        key = f"{path}/" if after.endswith('/') else path
+        parent = path.rsplit('/', 1)[0]
+
+        # The rest of the listing of the directory containing `after`
+        if after.endswith('/'):
+            yield from self._seek(parent, is_dir=True, after=key, where=where)
+            yield from self._seek(parent, is_dir=False, where=where)
+        else:
+            yield from self._seek(parent, is_dir=False, after=key, where=where)
+
+        # The contents of its subdirectories, which are walked after its listing
+        for subdirectory in self._seek(parent, is_dir=True):
+            yield from self._walk(subdirectory[0], where)
+
+        # The contents of the remaining subdirectories of each ancestor
+        child = parent
+        while child != section:
+            ancestor = child.rsplit('/', 1)[0]
+            for subdirectory in self._seek(ancestor, is_dir=True, after=f"{child}/"):
+                yield from self._walk(subdirectory[0], where)
+            child = ancestor
+
+    def walkdir(self, section: str, favorites: set) -> List[Dict[str, Any]]:
+        """Method to list every visible file and directory in a section, in the same order as FileOperations.walkdir
+
+        Args:
+            section(str): The section (code, input, output)
+            favorites(set): Keys of the favorites in the section
+
+        Returns:
+            list of file info dicts
+        """
+        return list(self.iter_walkdir(section, favorites))
+
+    def _directory(self, section: str, base_path: Optional[str]) -> str:
+        parent = section
+        if base_path and base_path.strip('/'):
+            parent = f"{section}/{base_path.strip('/')}"
+
+        with self._lock:
+            if not self._connect().execute("SELECT 1 FROM entries WHERE path = ? AND is_dir = 1",
+                                           (parent,)).fetchone():
+                raise ValueError(f"Directory `{base_path}` does not exist in section `{section}`")
+        return parent
+
+    def iter_listdir(self, section: str, favorites: set, base_path: Optional[str] = None, after: Optional[str] = None,
+                     reverse: bool = False, file_filter: Optional[FileFilter] = None) -> Iterator[Dict[str, Any]]:
+        """Method to iterate over the visible files and directories directly inside a directory, in key order
+
+        Args:
+            section(str): The section (code, input, output)
+            favorites(set): Keys of the favorites in the section
+            base_path(str): Directory relative to the section, or None for the section root
+            after(str): Key, relative to the section, to start after (before, if reverse)
+            reverse(bool): If True, iterate in descending key order
+            file_filter(FileFilter): Only return entries matching the filter
+
+        Returns:
+            iterator of file info dicts
+        """
+        parent = self._directory(section, base_path)
+        self._restat(parent)
+        rows = self._seek(parent, after=f"{section}/{after}" if after is not None else None, reverse=reverse,
+                          where=file_filter.where(section) if file_filter else None)
+        return (self._edge(section, row, favorites) for row in rows)
+
+    def listdir(self, section: str, favorites: set, base_path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Method to list the visible files and directories directly inside a directory, sorted by key
+
+        Args:
+            section(str): The section (code, input, output)
+            favorites(set): Keys of the favorites in the section
+            base_path(str): Directory relative to the section, or None for the section root
+
+        Returns:
+            list of file info dicts
+        """
+        return list(self.iter_listdir(section, favorites, base_path))
+
+    def iter_sorted(self, section: str, favorites: set, order_by: str, descending: bool = False,
+                    base_path: Optional[str] = None, recursive: bool = False, file_filter: Optional[FileFilter] = None,
+                    after: Optional[str] = None, reverse: bool = False) -> Iterator[Dict[str, Any]]:
+        """Method to iterate over visible files and directories sorted by name, size or modification time
+
+        Ties are broken by key. Iteration starts after a sort key from file_sort_key, seeking on the sort value so
+        only the entries that are returned are read.
+
+        Args:
+            section(str): The section (code, input, output)
+            favorites(set): Keys of the favorites in the section
+            order_by(str): The sort order, a key of FILE_SORT_COLUMNS
+            descending(bool): If True, sort in descending order
+            base_path(str): Directory relative to the section, or None for the section root. Ignored if recursive.
+            recursive(bool): If True, include everything in the section, otherwise a single directory
+            file_filter(FileFilter): Only return entries matching the filter
+            after(str): Sort key to start after (before, if reverse)
+            reverse(bool): If True, iterate in the opposite order
+
+        Returns:
+            iterator of file info dicts
+        """
+        if order_by not in FILE_SORT_COLUMNS:
+            raise ValueError(f"Unsupported order_by: {order_by}. Use {', '.join(FILE_SORT_COLUMNS)}")
+        expression = FILE_SORT_COLUMNS[order_by]
+
+        if recursive:
+            clauses = "path > ? AND path < ? AND hidden = 0"
+            params: List[Any] = list(_prefix_range(section))
+        else:
+            clauses = "parent = ? AND hidden = 0"
+            params = [self._directory(section, base_path)]
+            self._restat(params[0])
+        if file_filter:
+            where = file_filter.where(section)
+            clauses += where[0]
+            params.extend(where[1])
+
+        position = None
+        if after is not None:
+            value, key = _parse_sort_key(after, order_by)
+            position = (value, f"{section}/{key}")
+
+        descending = descending != reverse
+        direction, operator = ('DESC', '<') if descending else ('ASC', '>')
+
+        def _rows() -> Iterator[tuple]:
+            nonlocal position
+            while True:
+                query = f"SELECT {_COLUMNS}, key, {expression} FROM entries WHERE {clauses}"
+                query_params = list(params)
+                if position is not None:
+                    if order_by == 'name':
+                        query += f" AND key {operator} ?"
+                        query_params.append(position[1])
+                    else:
+                        query += f" AND ({expression} {operator} ? OR ({expression} = ? AND key {operator} ?))"
+                        query_params.extend([position[0], position[0], position[1]])
+                query += f" ORDER BY {expression} {direction}, key {direction} LIMIT ?"
+                query_params.append(FILE_INDEX_READ_CHUNK)
+
+                with self._lock:
+                    rows = self._connect().execute(query, query_params).fetchall()
+
+                yield from rows
+                if len(rows) < FILE_INDEX_READ_CHUNK:
+                    return
+                position = (rows[-1][8], rows[-1][7])
+
+        return (self._edge(section, row, favorites) for row in _rows())
+
+    def count_walkdir(self, section: str, file_filter: Optional[FileFilter] = None) -> int:
+        """Method to count the visible files and directories in a section, as returned by iter_walkdir
+
+        Args:
+            section(str): The section (code, input, output)
+            file_filter(FileFilter): Only count entries matching the filter
+
+        Returns:
+            int
+        """
+        clauses = "path > ? AND path < ? AND hidden = 0"
+        params: List[Any] = list(_prefix_range(section))
+        if file_filter:
+            where = file_filter.where(section)
+            clauses += where[0]
+            params.extend(where[1])
+
+        with self._lock:
+            return self._connect().execute(f"SELECT COUNT(*) FROM entries WHERE {clauses}", params).fetchone()[0]
+
+    def count_listdir(self, section: str, base_path: Optional[str] = None,
+                      file_filter: Optional[FileFilter] = None) -> int:
+        """Method to count the visible files and directories directly inside a directory, as returned by iter_listdir
+
+        Args:
+            section(str): The section (code, input, output)
+            base_path(str): Directory relative to the section, or None for the section root
+            file_filter(FileFilter): Only count entries matching the filter
+
+        Returns:
+            int
+        """
+        parent = section
+        if base_path and base_path.strip('/'):
+            parent = f"{section}/{base_path.strip('/')}"
+
+        clauses = "parent = ? AND hidden = 0"
+        params: List[Any] = [parent]
+        if file_filter:
+            where = file_filter.where(section)
+            clauses += where[0]
+            params.extend(where[1])
+
+        with self._lock:
+            return self._connect().execute(f"SELECT COUNT(*) FROM entries WHERE {clauses}", params).fetchone()[0]
+
+    def file_info(self, section: str, key: str, favorites: set) -> Optional[Dict[str, Any]]:
+        """Method to get the file info dict of a single file or directory, including directory totals
+
+        Args:
+            section(str): The section (code, input, output)
+            key(str): Key relative to the section
+            favorites(set): Keys of the favorites in the section
+
+        Returns:
+            dict, or None if the path is not in the index
+        """
+        path = f"{section}/{key.strip('/')}" if key.strip('/') else section
+        with self._lock:
+            row = self._connect().execute(f"SELECT {_COLUMNS} FROM entries WHERE path = ?", (path,)).fetchone()
+        return self._edge(section, row, favorites) if row else None
+
+    def tree_state(self, restat: bool = False) -> Tuple[int, int, int]:
+        """Method to summarize every indexed entry, hidden ones included, to detect changes to the working tree
+
+        Args:
+            restat(bool): If True, re-stat every file first, so content changes since the last full rescan are
+                          included. Directories are only re-listed by refresh().
+
+        Returns:
+            tuple of (latest mtime in ns, number of entries, total size of files)
+        """
+        if restat:
+            self._restat()
+        with self._lock:
+            return tuple(self._connect().execute("SELECT COALESCE(MAX(mtime_ns), 0), COUNT(*), COALESCE(SUM(size), 0) "
+                                                 "FROM entries").fetchone())
+
+    def content_size(self) -> int:
+        """Method to get the total size of all files in the LabBook, including hidden files and git objects
+
+        Returns:
+            int
+        """
+        with self._lock:
+            size = self._connect().execute("SELECT COALESCE(SUM(size), 0) FROM entries WHERE is_dir = 0").fetchone()[0]
+            git_size = self._get_meta('git_size')
+
+        if git_size is None:
+            # Not measured by a full rescan yet
+            git_size = _tree_size(os.path.join(self.root_dir, '.git'))
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    self._set_meta('git_size', git_size)
+        return size + git_size
+
+
+class FileIndexManager(object):
+    """Process-wide registry of open FileIndex instances, keyed by LabBook root directory
+
+    Indexes are kept open in a bounded LRU. Within a request, an index is refreshed on first use only, so resolving
+    several sections and the LabBook size walks the directory tree once. When a refresh finds a full rescan is due,
+    it is queued for a single background worker, so no request waits for one.
+    """
+    def __init__(self, max_open: int = FILE_INDEX_MAX_OPEN) -> None:
+        self.max_open = max_open
+        self._indexes: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending_full_scans: set = set()
+        self.closed_refreshes = 0
+        self.closed_full_scans = 0
+        self.closed_scanned_dirs = 0
+        self.closed_skipped_dirs = 0
+
+    @staticmethod
+    def db_path(labbook: LabBook) -> str:
+        working_dir = labbook.labmanager_config.config['git']['working_directory']
+        digest = hashlib.sha1(os.path.realpath(labbook.root_dir).encode('utf-8')).hexdigest()
+        return os.path.join(os.path.expanduser(working_dir), FILE_INDEX_DIRECTORY, f"{digest}.db")
+
+    def _retire(self, index: FileIndex) -> None:
+        index.close()
+        self.closed_refreshes += index.refreshes
+        self.closed_full_scans += index.full_scans
+        self.closed_scanned_dirs += index.scanned_dirs
+        self.closed_skipped_dirs += index.skipped_dirs
+
+    def get(self, labbook: LabBook) -> FileIndex:
+        """Method to get the up to date file index of a LabBook
+
+        Args:
+            labbook(LabBook): The LabBook
+
+        Returns:
+            FileIndex
+        """
+        with self._lock:
+            index = self._indexes.get(labbook.root_dir)
+            if index is None:
+                index = FileIndex(labbook.root_dir, self.db_path(labbook))
+                self._indexes[labbook.root_dir] = index
+                while len(self._indexes) > self.max_open:
+                    self._retire(self._indexes.popitem(last=False)[1])
+            self._indexes.move_to_end(labbook.root_dir)
+
+        if flask.has_app_context():
+            refreshed = flask.g.get('refreshed_file_indexes', None)
+            if refreshed is None:
+                refreshed = flask.g.refreshed_file_indexes = set()
+            if labbook.root_dir not in refreshed:
+                if index.refresh():
+                    self._queue_full_scan(index)
+                refreshed.add(labbook.root_dir)
+        elif index.refresh():
+            self._queue_full_scan(index)
+
+        return index
+
+    def _queue_full_scan(self, index: FileIndex) -> None:
+        with self._lock:
+            if index.root_dir in self._pending_full_scans:
+                return
+            self._pending_full_scans.add(index.root_dir)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+            self._executor.submit(self._full_scan, index)
+
+    def _full_scan(self, index: FileIndex) -> None:
+        try:
+            index.full_scan()
+        except (OSError, sqlite3.Error) as err:
+            logger.warning(f"Full rescan of the file index for {index.root_dir} failed: {err}")
+        finally:
+            with self._lock:
+                self._pending_full_scans.discard(index.root_dir)
+
+    def wait(self) -> None:
+        """Method to block until every queued full rescan has finished
+
+        Returns:
+            None
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def update(self, labbook: LabBook, paths: List[str]) -> None:
+        """Method to update the index of a LabBook after files were added, removed or moved
+
+        Errors are logged rather than raised, as the change is picked up by a later refresh anyway.
+
+        Args:
+            labbook(LabBook): The LabBook
+            paths(list): Changed paths, relative to the LabBook root
+
+        Returns:
+            None
+        """
+        try:
+            self.get(labbook).update(paths)
+        except sqlite3.Error as err:
+            logger.warning(f"Failed to update file index for {str(labbook)}: {err}")
+
+    def remove(self, labbook: LabBook) -> None:
+        """Method to close and delete the index of a LabBook, typically because it is being deleted
+
+        Args:
+            labbook(LabBook): The LabBook
+
+        Returns:
+            None
+        """
+        with self._lock:
+            index = self._indexes.pop(labbook.root_dir, None)
+            if index is not None:
+                self._retire(index)
+
+        db_path = self.db_path(labbook)
+        for path in (db_path, f"{db_path}-wal", f"{db_path}-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def stats(self) -> Dict[str, int]:
+        """Method to get the current index counters
+
+        Returns:
+            dict
+        """
+        with self._lock:
+            indexes = list(self._indexes.values())
+            return {"open": len(indexes),
+                    "max_open": self.max_open,
+                    "pending_full_scans": len(self._pending_full_scans),
+                    "refreshes": self.closed_refreshes + sum(i.refreshes for i in indexes),
+                    "full_scans": self.closed_full_scans + sum(i.full_scans for i in indexes),
+                    "scanned_dirs": self.closed_scanned_dirs + sum(i.scanned_dirs for i in indexes),
+                    "skipped_dirs": self.closed_skipped_dirs + sum(i.skipped_dirs for i in indexes)}
+
+
+# Process-wide file index registry
+file_index_manager = FileIndexManager()
+
+
+def _favorite_keys(labbook: LabBook, section: str) -> set:
+    return set(favorites_cache.get(labbook, section).keys())
+
+
+def _edges_after(edges: List[Dict[str, Any]], after: Optional[str], sorted_keys: bool = False,
+                 reverse: bool = False) -> Iterator[Dict[str, Any]]:
+    if reverse:
+        edges = list(reversed(edges))
+    if after is None:
+        return iter(edges)
+
+    if sorted_keys:
+        return (e for e in edges if (e['key'] < after if reverse else e['key'] > after))
+
+    keys = [e['key'] for e in edges]
+    if after not in keys:
+        raise ValueError("`after` cursor is invalid")
+    return iter(edges[keys.index(after) + 1:])
+
+
+def _fallback_edges(labbook: LabBook, section: str, base_path: Optional[str] = None, recursive: bool = False,
+                    file_filter: Optional[FileFilter] = None) -> List[Dict[str, Any]]:
+    if recursive:
+        edges = FileOperations.walkdir(labbook, section=section, show_hidden=False)
+    else:
+        edges = sorted(FileOperations.listdir(labbook, section, base_path=base_path, show_hidden=False),
+                       key=lambda e: e['key'])
+    if file_filter:
+        edges = [e for e in edges if file_filter.matches(e)]
+    return edges
+
+
+def indexed_walkdir(labbook: LabBook, section: str, after: Optional[str] = None,
+                    file_filter: Optional[FileFilter] = None) -> Iterator[Dict[str, Any]]:
+    """Method to iterate over all visible files and directories in a section from the file index
+
+    Falls back to FileOperations.walkdir if the index cannot be used.
+
+    Args:
+        labbook(LabBook): The LabBook
+        section(str): The section (code, input, output)
+        after(str): Key, relative to the section, to resume after
+        file_filter(FileFilter): Only return entries matching the filter
+
+    Returns:
+        iterator of file info dicts
+    """
+    try:
+        index = file_index_manager.get(labbook)
+    except sqlite3.Error as err:
+        logger.warning(f"File index unavailable for {str(labbook)}, walking {section}: {err}")
+        return _edges_after(_fallback_edges(labbook, section, recursive=True, file_filter=file_filter), after)
+
+    return index.iter_walkdir(section, _favorite_keys(labbook, section), after, file_filter)
+
+
+def indexed_listdir(labbook: LabBook, section: str, base_path: Optional[str] = None, after: Optional[str] = None,
+                    reverse: bool = False, file_filter: Optional[FileFilter] = None) -> Iterator[Dict[str, Any]]:
+    """Method to iterate over the visible files and directories in a directory from the file index, in key order
+
+    Falls back to FileOperations.listdir if the index cannot be used.
+
+    Args:
+        labbook(LabBook): The LabBook
+        section(str): The section (code, input, output)
+        base_path(str): Directory relative to the section, or None for the section root
+        after(str): Key, relative to the section, to start after (before, if reverse)
+        reverse(bool): If True, iterate in descending key order
+        file_filter(FileFilter): Only return entries matching the filter
+
+    Returns:
+        iterator of file info dicts
+    """
+    try:
+        index = file_index_manager.get(labbook)
+    except sqlite3.Error as err:
+        logger.warning(f"File index unavailable for {str(labbook)}, listing {section}: {err}")
+        edges = _fallback_edges(labbook, section, base_path, file_filter=file_filter)
+        return _edges_after(edges, after, sorted_keys=True, reverse=reverse)
+
+    return index.iter_listdir(section, _favorite_keys(labbook, section), base_path, after, reverse, file_filter)
+
+
+def indexed_sorted(labbook: LabBook, section: str, order_by: str, descending: bool = False,
+                   base_path: Optional[str] = None, recursive: bool = False, file_filter: Optional[FileFilter] = None,
+                   after: Optional[str] = None, reverse: bool = False) -> Iterator[Dict[str, Any]]:
+    """Method to iterate over visible files and directories from the file index, sorted by name, size or
+    modification time
+
+    Falls back to sorting the FileOperations listing if the index cannot be used.
+
+    Args:
+        labbook(LabBook): The LabBook
+        section(str): The section (code, input, output)
+        order_by(str): The sort order, a key of FILE_SORT_COLUMNS
+        descending(bool): If True, sort in descending order
+        base_path(str): Directory relative to the section, or None for the section root. Ignored if recursive.
+        recursive(bool): If True, include everything in the section (allFiles), otherwise one directory (files)
+        file_filter(FileFilter): Only return entries matching the filter
+        after(str): Sort key, from file_sort_key, to start after (before, if reverse)
+        reverse(bool): If True, iterate in the opposite order
+
+    Returns:
+        iterator of file info dicts
+    """
+    try:
+        index = file_index_manager.get(labbook)
+    except sqlite3.Error as err:
+        logger.warning(f"File index unavailable for {str(labbook)}, sorting {section}: {err}")
+        if order_by not in FILE_SORT_COLUMNS:
+            raise ValueError(f"Unsupported order_by: {order_by}. Use {', '.join(FILE_SORT_COLUMNS)}")
+
+        def _position(edge):
+            return _parse_sort_key(file_sort_key(edge, order_by), order_by)
+
+        edges = sorted(_fallback_edges(labbook, section, base_path, recursive, file_filter), key=_position,
+                       reverse=descending != reverse)
+        if after is None:
+            return iter(edges)
+        start = _parse_sort_key(after, order_by)
+        return (e for e in edges if (_position(e) < start if descending != reverse else _position(e) > start))
+
+    return index.iter_sorted(section, _favorite_keys(labbook, section), order_by, descending, base_path, recursive,
+                             file_filter, after, reverse)
+
+
+def indexed_count(labbook: LabBook, section: str, base_path: Optional[str] = None, recursive: bool = False,
+                  file_filter: Optional[FileFilter] = None) -> int:
+    """Method to count the visible files and directories in a section from the file index
+
+    Falls back to listing with FileOperations if the index cannot be used.
+
+    Args:
+        labbook(LabBook): The LabBook
+        section(str): The section (code, input, output)
+        base_path(str): Directory relative to the section, or None for the section root. Ignored if recursive.
+        recursive(bool): If True, count everything in the section (allFiles), otherwise one directory (files)
+        file_filter(FileFilter): Only count entries matching the filter
+
+    Returns:
+        int
+    """
+    try:
+        index = file_index_manager.get(labbook)
+    except sqlite3.Error as err:
+        logger.warning(f"File index unavailable for {str(labbook)}, counting {section}: {err}")
+        return len(_fallback_edges(labbook, section, base_path, recursive, file_filter))
+
+    if recursive:
+        return index.count_walkdir(section, file_filter)
+    return index.count_listdir(section, base_path, file_filter)
+
+
+def _walk_totals(root_dir: str) -> Dict[str, Any]:
+    total_size, file_count, mtime = 0, 0, os.path.getmtime(root_dir)
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        mtime = max([mtime] + [os.path.getmtime(os.path.join(dirpath, d)) for d in dirnames])
+        for filename in filenames:
+            if not filename.startswith('.'):
+                file_stat = os.stat(os.path.join(dirpath, filename))
+                total_size += file_stat.st_size
+                file_count += 1
+                mtime = max(mtime, file_stat.st_mtime)
+    return {"total_size": total_size, "file_count": file_count, "last_modified_at": mtime}
+
+
+def indexed_file_info(labbook: LabBook, section: str, key: str) -> Dict[str, Any]:
+    """Method to get the file info of a single file or directory from the file index, including the total size,
+    number of files and latest modification time of everything below a directory
+
+    Falls back to LabBook.get_file_info, walking the directory, if the index cannot be used.
+
+    Args:
+        labbook(LabBook): The LabBook
+        section(str): The section (code, input, output)
+        key(str): Key relative to the section
+
+    Returns:
+        dict
+    """
+    try:
+        file_info = file_index_manager.get(labbook).file_info(section, key, _favorite_keys(labbook, section))
+        if file_info is not None:
+            return file_info
+    except sqlite3.Error as err:
+        logger.warning(f"File index unavailable for {str(labbook)}, reading {section}/{key}: {err}")
+
+    file_info = labbook.get_file_info(section, key)
+    if file_info['is_dir']:
+        file_info.update(_walk_totals(os.path.join(labbook.root_dir, section, key)))
+    else:
+        file_info.update({"total_size": file_info['size'], "file_count": 1,
+                          "last_modified_at": file_info['modified_at']})
+    return file_info
+
+
+def indexed_content_size(labbook: LabBook) -> int:
+    """Method to get the size on disk of a LabBook from the file index
+
+    Falls back to FileOperations.content_size if the index cannot be used.
+
+    Args:
+        labbook(LabBook): The LabBook
+
+    Returns:
+        int
+    """
+    try:
+        return file_index_manager.get(labbook).content_size()
+    except sqlite3.Error as err:
+        logger.warning(f"File index unavailable for {str(labbook)}, computing size: {err}")
+        return FileOperations.content_size(labbook=labbook)
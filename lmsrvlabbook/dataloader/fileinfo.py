@@ -0,0 +1,152 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple, Union
+
+from promise import Promise
+from promise.dataloader import DataLoader
+
+from lmcommon.labbook import LabBook
+from lmcommon.logging import LMLogger
+from lmsrvlabbook.dataloader.favorites import favorites_cache
+
+logger = LMLogger.get_logger()
+
+
+def _split_key(key: str) -> Tuple[str, str, str, str, str, str]:
+    username, owner, labbook_name, section, file_key = key.split('&', 4)
+    path = os.path.normpath(file_key) if file_key.strip('/') else ''
+    if path.startswith('..') or os.path.isabs(path):
+        raise ValueError(f"`{file_key}` is not a file in section `{section}`")
+    parent, name = os.path.split(path)
+    return f"{username}&{owner}&{labbook_name}", section, parent, name, file_key, path
+
+
+def _file_info(file_key: str, file_stat: os.stat_result, is_dir: bool, favorites: set) -> Dict[str, Any]:
+    if is_dir and not file_key.endswith('/'):
+        file_key += '/'
+    return {'key': file_key,
+            'is_dir': is_dir,
+            'size': 0 if is_dir else file_stat.st_size,
+            'modified_at': file_stat.st_mtime,
+            'is_favorite': file_key in favorites}
+
+
+class FileInfoLoader(DataLoader):
+    """Dataloader for the file info of files and directories in a LabBook, as returned by LabBook.get_file_info
+
+    The key for this object is username&owner&labbook_name&section&key
+
+    Keys are grouped by the directory they are in, and each directory is read with a single os.scandir. The favorites
+    of a section are read once per batch, rather than once per file.
+    """
+    def __init__(self, labbook_loader: DataLoader) -> None:
+        DataLoader.__init__(self)
+        self.labbook_loader = labbook_loader
+
+    @staticmethod
+    def _favorite_keys(labbook: LabBook, section: str) -> set:
+        return set(favorites_cache.get(labbook, section).keys())
+
+    def _load_directory(self, labbook: LabBook, section: str, parent: str,
+                        requests: List[Tuple[int, str, str]], favorites: set,
+                        results: List[Union[Dict[str, Any], Exception]]) -> None:
+        """Method to resolve all requested entries of a single directory
+
+        Args:
+            labbook(LabBook): The LabBook
+            section(str): The section (code, input, output)
+            parent(str): Path of the directory relative to the section
+            requests(list): (position, name, key) tuples of the requested entries
+            favorites(set): Keys of the favorites in the section
+            results(list): Results, updated at each requested position
+
+        Returns:
+            None
+        """
+        directory = os.path.join(labbook.root_dir, section, parent)
+        entries: Dict[str, os.DirEntry] = dict()
+        try:
+            with os.scandir(directory) as it:
+                names = {name for _, name, _ in requests}
+                for entry in it:
+                    if entry.name in names:
+                        entries[entry.name] = entry
+        except OSError as err:
+            for position, _, _ in requests:
+                results[position] = err
+            return
+
+        for position, name, file_key in requests:
+            entry = entries.get(name)
+            if entry is None:
+                results[position] = FileNotFoundError(f"`{file_key}` does not exist in section `{section}`")
+                continue
+            try:
+                results[position] = _file_info(file_key, entry.stat(), entry.is_dir(), favorites)
+            except OSError as err:
+                results[position] = err
+
+    def _resolve(self, keys: List[str], labbooks: Dict[str, LabBook]) -> List[Union[Dict[str, Any], Exception]]:
+        results: List[Union[Dict[str, Any], Exception]] = [None] * len(keys)
+        directories: OrderedDict = OrderedDict()
+        favorites: Dict[Tuple[str, str], set] = dict()
+
+        for position, key in enumerate(keys):
+            try:
+                labbook_key, section, parent, name, file_key, path = _split_key(key)
+                labbook = labbooks[labbook_key]
+                if (labbook_key, section) not in favorites:
+                    favorites[(labbook_key, section)] = self._favorite_keys(labbook, section)
+                if not path:
+                    # The section itself has no parent directory to list
+                    file_stat = os.stat(os.path.join(labbook.root_dir, section))
+                    results[position] = _file_info('', file_stat, True, favorites[(labbook_key, section)])
+                    continue
+            except (OSError, ValueError) as err:
+                results[position] = err
+                continue
+
+            directories.setdefault((labbook_key, section, parent), list()).append((position, name, file_key))
+
+        for (labbook_key, section, parent), requests in directories.items():
+            self._load_directory(labbooks[labbook_key], section, parent, requests,
+                                 favorites[(labbook_key, section)], results)
+
+        return results
+
+    def batch_load_fn(self, keys: List[str]):
+        """Method to load file info based on a list of unique keys
+
+        Args:
+            keys(list(str)): Unique key to identify the file
+
+        Returns:
+            Promise
+        """
+        labbook_keys = list()
+        for key in keys:
+            labbook_key = '&'.join(key.split('&', 3)[:3])
+            if labbook_key not in labbook_keys:
+                labbook_keys.append(labbook_key)
+
+        return self.labbook_loader.load_many(labbook_keys).then(
+            lambda labbooks: self._resolve(keys, dict(zip(labbook_keys, labbooks))))
@@ -17,29 +17,279 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
-from typing import List
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 
+import flask
 from promise import Promise
 from promise.dataloader import DataLoader
 
 from lmcommon.labbook import LabBook
+from lmcommon.logging import LMLogger
 from lmsrvcore.auth.user import get_logged_in_author
+from lmsrvlabbook.dataloader.repository import repository_pool
+
+logger = LMLogger.get_logger()
+
+# Maximum number of LabBook instances held in the process-wide cache
+LABBOOK_CACHE_MAX_SIZE = 64
+
+
+def labbook_fingerprint(root_dir: str) -> Tuple[str, str, int]:
+    """Method to compute a cheap fingerprint of a LabBook's on-disk state
+
+    The fingerprint is the contents of HEAD, the commit hash HEAD resolves to, and the mtime of labbook.yaml. Any
+    commit, checkout, or edit to the LabBook's metadata will change it.
+
+    Args:
+        root_dir(str): Root directory of the LabBook
+
+    Returns:
+        tuple
+    """
+    git_dir = os.path.join(root_dir, '.git')
+    with open(os.path.join(git_dir, 'HEAD'), 'rt') as head_file:
+        head = head_file.read().strip()
+
+    commit = head
+    if head.startswith('ref: '):
+        ref_path = os.path.join(git_dir, head[5:])
+        if os.path.exists(ref_path):
+            with open(ref_path, 'rt') as ref_file:
+                commit = ref_file.read().strip()
+        else:
+            # Ref has been packed, fall back to the packed-refs file state
+            commit = str(os.stat(os.path.join(git_dir, 'packed-refs')).st_mtime_ns)
+
+    yaml_mtime = os.stat(os.path.join(root_dir, '.gigantum', 'labbook.yaml')).st_mtime_ns
+
+    return head, commit, yaml_mtime
+
+
+class LabBookCache(object):
+    """A process-wide, bounded LRU cache of loaded LabBook instances
+
+    The key for this object is username&owner&labbook_name. Every hit is validated against the LabBook's on-disk
+    fingerprint, so a commit, checkout, or labbook.yaml change made outside of this process is detected and the stale
+    instance is dropped.
+
+    A LabBook instance, along with its git repository wrapper, is used by one request at a time. A hit checks an idle
+    instance out to the current request, and `release_request()` returns it at teardown. A request that finds no idle
+    instance, because other requests are using them, loads its own, which `put()` checks out to it. Busy LabBooks
+    therefore have several cached instances. Outside of a request there is nothing to return an instance at teardown,
+    so it is handed out without being checked out.
+    """
+    def __init__(self, max_size: int = LABBOOK_CACHE_MAX_SIZE) -> None:
+        self.max_size = max_size
+        # Idle instances of each key, as (labbook, fingerprint) tuples, in least recently used order of key
+        self._entries: OrderedDict = OrderedDict()
+        self._size = 0
+        # Bumped by invalidate() and clear(), so instances checked out before are not returned
+        self._versions: Dict[str, int] = dict()
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _checked_out() -> Optional[Dict[str, Tuple[LabBook, Any, Tuple[int, int]]]]:
+        """Method to get the instances checked out to the current request, or None outside of a request"""
+        if not flask.has_app_context():
+            return None
+        checked_out = flask.g.get('checked_out_labbooks', None)
+        if checked_out is None:
+            checked_out = flask.g.checked_out_labbooks = dict()
+        return checked_out
+
+    def _version(self, key: str) -> Tuple[int, int]:
+        """Method to get the version of a key. Must be called with the lock held."""
+        return self._epoch, self._versions.get(key.split('&', 1)[-1], 0)
+
+    def _store(self, key: str, labbook: LabBook, fingerprint: Any) -> None:
+        """Method to add an idle instance, evicting the least recently used ones if full. Must be called with the lock
+        held."""
+        self._entries.setdefault(key, list()).append((labbook, fingerprint))
+        self._entries.move_to_end(key)
+        self._size += 1
+        while self._size > self.max_size:
+            oldest_key, oldest = next(iter(self._entries.items()))
+            oldest.pop(0)
+            if not oldest:
+                del self._entries[oldest_key]
+            self._size -= 1
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[LabBook]:
+        """Method to get a LabBook instance if it is cached and still valid
+
+        In a request, the instance is checked out to the request until it ends, and is returned again, after the same
+        validation, if the request gets the same key.
+
+        Args:
+            key(str): username&owner&labbook_name
+
+        Returns:
+            LabBook or None
+        """
+        checked_out = self._checked_out()
+        with self._lock:
+            if checked_out is not None and key in checked_out:
+                labbook, fingerprint, version = checked_out.pop(key)
+            else:
+                idle = self._entries.get(key)
+                if not idle:
+                    self.misses += 1
+                    return None
+
+                labbook, fingerprint = idle.pop()
+                if not idle:
+                    del self._entries[key]
+                self._size -= 1
+                version = self._version(key)
+
+        try:
+            is_valid = labbook_fingerprint(labbook.root_dir) == fingerprint
+        except (OSError, ValueError):
+            # LabBook has been moved or deleted
+            is_valid = False
+
+        with self._lock:
+            if not is_valid:
+                self.invalidations += 1
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            if checked_out is None:
+                self._store(key, labbook, fingerprint)
+
+        if checked_out is not None:
+            checked_out[key] = (labbook, fingerprint, version)
+        return labbook
+
+    def put(self, key: str, labbook: LabBook) -> None:
+        """Method to insert a loaded LabBook instance, evicting the least recently used entry if full
+
+        In a request, the instance is checked out to the request and becomes idle when it ends.
+
+        Args:
+            key(str): username&owner&labbook_name
+            labbook(LabBook): The loaded LabBook
+
+        Returns:
+            None
+        """
+        try:
+            fingerprint = labbook_fingerprint(labbook.root_dir)
+        except OSError as err:
+            logger.warning(f"Not caching {str(labbook)}, could not fingerprint repository: {err}")
+            return
+
+        checked_out = self._checked_out()
+        with self._lock:
+            if checked_out is None:
+                self._store(key, labbook, fingerprint)
+                return
+            version = self._version(key)
+
+        checked_out[key] = (labbook, fingerprint, version)
+
+    def release_request(self) -> None:
+        """Method to return all instances checked out during the current request, unless they were invalidated"""
+        checked_out = flask.g.pop('checked_out_labbooks', dict())
+        with self._lock:
+            for key, (labbook, fingerprint, version) in checked_out.items():
+                if version == self._version(key):
+                    self._store(key, labbook, fingerprint)
+
+    def invalidate(self, owner: str, labbook_name: str) -> None:
+        """Method to drop a LabBook for all users, typically after it has been mutated
+
+        Instances checked out to other requests are dropped when they are returned.
+
+        Args:
+            owner(str): Owner (namespace) of the LabBook
+            labbook_name(str): Name of the LabBook
+
+        Returns:
+            None
+        """
+        suffix = f"&{owner}&{labbook_name}"
+        with self._lock:
+            self._versions[suffix[1:]] = self._versions.get(suffix[1:], 0) + 1
+            for key in [k for k in self._entries if k.endswith(suffix)]:
+                self._size -= len(self._entries.pop(key))
+                self.invalidations += 1
+
+        checked_out = self._checked_out()
+        if checked_out:
+            for key in [k for k in checked_out if k.endswith(suffix)]:
+                del checked_out[key]
+
+    def clear(self) -> None:
+        """Method to empty the cache and reset all counters"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._epoch += 1
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.invalidations = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Method to get the current cache counters
+
+        Returns:
+            dict
+        """
+        with self._lock:
+            return {"size": self._size,
+                    "max_size": self.max_size,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions,
+                    "invalidations": self.invalidations}
+
+
+# Process-wide LabBook instance cache, shared by all LabBookLoader instances
+labbook_cache = LabBookCache()
 
 
 class LabBookLoader(DataLoader):
     """Dataloader for lmcommon.labbook.LabBook instances
 
     The key for this object is username&owner&labbook_name
+
+    Loaded instances are kept in the process-wide `labbook_cache`, so repeated requests for the same LabBook do not
+    re-run directory resolution, labbook.yaml parsing, and opening the git repository. Both the instance and its git
+    repository handle, borrowed from the process-wide `repository_pool`, are checked out to the request until it
+    ends, so concurrent requests never share them.
     """
 
     @staticmethod
     def get_labbook_instance(key: str):
+        lb = labbook_cache.get(key)
+        if lb:
+            repository_pool.borrow(lb)
+            return lb
+
         # Get identifying info from key
         username, owner_name, labbook_name = key.split('&')
 
         # Create Labbook instance
         lb = LabBook(author=get_logged_in_author())
         lb.from_name(username, owner_name, labbook_name)
+        repository_pool.borrow(lb)
+        labbook_cache.put(key, lb)
 
         return lb
 
@@ -0,0 +1,299 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import flask
+from git import Repo
+
+from lmcommon.labbook import LabBook
+from lmcommon.logging import LMLogger
+from lmsrvcore.auth.user import get_logged_in_author
+
+logger = LMLogger.get_logger()
+
+# Maximum number of idle git repository handles kept open
+REPOSITORY_POOL_MAX_SIZE = 32
+
+# Seconds an unused repository handle is kept open before it is closed
+REPOSITORY_POOL_IDLE_TIMEOUT = 300
+
+
+class PooledRepository(object):
+    """A git repository handle owned by the RepositoryPool"""
+    def __init__(self, path: str, repo: Any) -> None:
+        self.path = path
+        self.repo = repo
+        self.borrowed = False
+        self.evicted = False
+        self.last_used = time.monotonic()
+
+
+class RepositoryPool(object):
+    """A process-wide pool of open GitPython repository handles
+
+    GitPython starts persistent `git cat-file` processes for every open repository. Rather than tearing these down at
+    the end of every request, handles are borrowed from the pool, returned at the end of the request, and only closed
+    once they have been idle for `idle_timeout` seconds or the pool holds more than `max_size` idle handles. Closing a
+    handle terminates its persistent processes; GitPython restarts them lazily if the handle is used again.
+
+    A handle is borrowed by one request at a time, since GitPython's persistent processes are not safe to use from
+    several threads at once. The pool keeps a free list of idle handles per repository, so a request borrowing a
+    repository whose handles are all in use by other requests gets a handle of its own, which joins the free list
+    once that request ends. Outside of a request there is nothing to return a handle at teardown, so it is returned
+    straight away.
+
+    Only LabBooks served by the LabBookLoader borrow from the pool. Mutations construct their own LabBook, whose
+    handle GitPython closes once the instance is garbage collected after the mutation. Mutations commit, switch
+    branches, import and delete repositories, so a private handle keeps that work from sharing a repository object
+    with queries running concurrently on other threads, and the cost of starting git processes is small next to the
+    git work a mutation does. A mutation that deletes a repository must `evict()` any pooled handle for it first.
+    """
+    def __init__(self, max_size: int = REPOSITORY_POOL_MAX_SIZE,
+                 idle_timeout: float = REPOSITORY_POOL_IDLE_TIMEOUT) -> None:
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        # Every handle the pool owns, idle or borrowed, keyed by the id of its repository
+        self._handles: Dict[int, PooledRepository] = dict()
+        # Idle handles of each repository, in least recently used order of repository
+        self._idle: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.reused = 0
+        self.opened = 0
+        self.closed = 0
+
+    def __len__(self) -> int:
+        return len(self._handles)
+
+    @staticmethod
+    def _close_repo(path: str, repo: Any) -> None:
+        """Method to deterministically close a repository, terminating its persistent git processes"""
+        try:
+            repo.close()
+        except Exception as err:
+            logger.warning(f"Error closing repository {path}: {err}")
+
+    def _close(self, handles: List[PooledRepository]) -> None:
+        """Method to close a list of pooled handles"""
+        for handle in handles:
+            self._close_repo(handle.path, handle.repo)
+
+    def _add(self, handle: PooledRepository) -> None:
+        """Method to start owning a new, borrowed handle. Must be called with the lock held."""
+        handle.borrowed = True
+        self._handles[id(handle.repo)] = handle
+        self.opened += 1
+
+    def _take_idle(self, handle: Optional[PooledRepository], path: str) -> Optional[PooledRepository]:
+        """Method to borrow an idle handle of a repository, preferring `handle`. Must be called with the lock held."""
+        idle = self._idle.get(path)
+        if not idle:
+            return None
+
+        if handle is None or handle not in idle:
+            handle = idle[-1]
+        idle.remove(handle)
+        if not idle:
+            del self._idle[path]
+
+        handle.borrowed = True
+        self.reused += 1
+        return handle
+
+    def borrow(self, labbook: LabBook) -> Any:
+        """Method to attach a pooled repository handle to a LabBook, for the exclusive use of the current request
+
+        The LabBook keeps its handle if it is idle. Otherwise it gets another idle handle for the same repository, or
+        its own freshly opened repository becomes a pooled handle, or a new one is opened if that is already pooled and
+        in use. A freshly opened repository that is not pooled is closed.
+
+        Args:
+            labbook(LabBook): A loaded LabBook
+
+        Returns:
+            git.Repo
+        """
+        path = labbook.root_dir
+        current = labbook.git.repo
+        # Outside of a request there is nothing to return the handle at teardown, so it is returned straight away
+        in_request = flask.has_app_context()
+        borrowed = None
+        if in_request:
+            borrowed = flask.g.get('borrowed_repositories', None)
+            if borrowed is None:
+                borrowed = flask.g.borrowed_repositories = list()
+
+        with self._lock:
+            owned = self._handles.get(id(current))
+            if owned is not None and owned.repo is not current:
+                owned = None
+            if owned is not None and borrowed is not None and any(h is owned for h in borrowed):
+                # Already borrowed by this request
+                return current
+
+            handle = self._take_idle(owned, path)
+            if handle is None and owned is None:
+                handle = PooledRepository(path, current)
+                self._add(handle)
+
+        if handle is None:
+            # The LabBook's handle is in use by another request, and there is no idle one
+            handle = PooledRepository(path, Repo(path))
+            with self._lock:
+                self._add(handle)
+
+        if handle.repo is not current:
+            labbook.git.repo = handle.repo
+            if owned is None:
+                self._close_repo(path, current)
+
+        if borrowed is not None:
+            borrowed.append(handle)
+        else:
+            self._return(handle)
+
+        return handle.repo
+
+    def _return(self, handle: PooledRepository) -> None:
+        """Method to return a borrowed handle to the free list of its repository, or close it if it was evicted"""
+        with self._lock:
+            if not handle.borrowed:
+                return
+            handle.borrowed = False
+            handle.last_used = time.monotonic()
+            if handle.evicted:
+                self._handles.pop(id(handle.repo), None)
+                self.closed += 1
+            else:
+                self._idle.setdefault(handle.path, list()).append(handle)
+                self._idle.move_to_end(handle.path)
+                return
+
+        self._close([handle])
+
+    def release_request(self) -> None:
+        """Method to return all handles borrowed during the current request and close any that have gone idle"""
+        for handle in flask.g.pop('borrowed_repositories', list()):
+            self._return(handle)
+
+        self.reap()
+
+    def _remove_idle(self, handle: PooledRepository) -> None:
+        """Method to stop owning an idle handle. Must be called with the lock held."""
+        idle = self._idle[handle.path]
+        idle.remove(handle)
+        if not idle:
+            del self._idle[handle.path]
+        del self._handles[id(handle.repo)]
+
+    def reap(self) -> None:
+        """Method to close handles that have been idle too long or exceed the pool size"""
+        now = time.monotonic()
+        to_close = list()
+        with self._lock:
+            # Least recently used first
+            idle = sorted((h for handles in self._idle.values() for h in handles), key=lambda h: h.last_used)
+            for index, handle in enumerate(idle):
+                if now - handle.last_used > self.idle_timeout or len(idle) - index > self.max_size:
+                    self._remove_idle(handle)
+                    to_close.append(handle)
+
+            self.closed += len(to_close)
+
+        self._close(to_close)
+
+    def evict(self, path: str) -> None:
+        """Method to close and remove the handles of a repository, e.g. before it is deleted
+
+        Handles borrowed by a request are closed when they are returned.
+
+        Args:
+            path(str): Root directory of the repository
+
+        Returns:
+            None
+        """
+        with self._lock:
+            to_close = self._idle.pop(path, list())
+            for handle in to_close:
+                del self._handles[id(handle.repo)]
+            for handle in self._handles.values():
+                if handle.path == path:
+                    handle.evicted = True
+            self.closed += len(to_close)
+
+        self._close(to_close)
+
+    def close_all(self) -> None:
+        """Method to close every idle handle in the pool, and every borrowed one when it is returned"""
+        with self._lock:
+            to_close = [h for handles in self._idle.values() for h in handles]
+            self._idle.clear()
+            for handle in to_close:
+                del self._handles[id(handle.repo)]
+            for handle in self._handles.values():
+                handle.evicted = True
+            self.closed += len(to_close)
+
+        self._close(to_close)
+
+    def stats(self) -> Dict[str, int]:
+        """Method to get the current pool counters
+
+        Returns:
+            dict
+        """
+        with self._lock:
+            return {"size": len(self._handles),
+                    "max_size": self.max_size,
+                    "borrowed": len([h for h in self._handles.values() if h.borrowed]),
+                    "opened": self.opened,
+                    "reused": self.reused,
+                    "closed": self.closed}
+
+
+# Process-wide repository handle pool
+repository_pool = RepositoryPool()
+
+
+@contextmanager
+def private_labbook(labbook: LabBook) -> Iterator[LabBook]:
+    """Context manager opening a separate instance of a LabBook, with its own git repository handle, for git work run
+    on a resolver pool thread
+
+    GitPython repositories and their persistent git processes are not safe to use from several threads at once, so the
+    cached LabBook and its pooled handle are only used on the request thread. The private handle is closed on exit.
+
+    Args:
+        labbook(LabBook): The cached LabBook
+
+    Returns:
+        LabBook
+    """
+    lb = LabBook(author=get_logged_in_author())
+    lb.from_directory(labbook.root_dir)
+    try:
+        yield lb
+    finally:
+        RepositoryPool._close_repo(lb.root_dir, lb.git.repo)
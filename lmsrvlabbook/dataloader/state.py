@@ -0,0 +1,287 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import requests
+from docker.errors import ImageNotFound, NotFound
+from graphql.execution.values import get_argument_values, get_variable_values
+from graphql.language import ast
+from graphql.type.definition import get_named_type
+from graphql.utils.get_operation_ast import get_operation_ast
+
+from lmcommon.configuration import get_docker_client
+from lmcommon.container.utils import infer_docker_image_name
+from lmcommon.dispatcher import Dispatcher
+from lmcommon.labbook import LabBook
+from lmcommon.logging import LMLogger
+from lmsrvcore.auth.user import get_logged_in_username
+from lmsrvlabbook.dataloader import fileindex
+from lmsrvlabbook.dataloader.fileindex import file_index_manager
+from lmsrvlabbook.dataloader.labbook import LabBookLoader, labbook_fingerprint
+
+logger = LMLogger.get_logger()
+
+# Root query fields whose results are determined by the state of the LabBooks they select
+FINGERPRINTED_ROOT_FIELDS = {"labbook", "__typename"}
+
+# Fields whose values depend on a remote server, so a query selecting them is never fingerprinted
+REMOTE_FIELDS = {("Labbook", "updatesAvailableCount"),
+                 ("Labbook", "collaborators"),
+                 ("Labbook", "canManageCollaborators"),
+                 ("Labbook", "visibility"),
+                 ("PackageComponent", "latestVersion")}
+
+# Fields whose values are filled in by a background task without touching the LabBook, so a query selecting them is
+# never fingerprinted either
+BACKGROUND_FIELDS = {("LabbookFile", "contentHash"), ("LabbookFile", "contentHashPending")}
+
+# Fields whose values depend on the Docker daemon, which is included in the fingerprint when they are selected
+DOCKER_FIELDS = {("Environment", "imageStatus"), ("Environment", "containerStatus")}
+
+
+def working_tree_state(labbook: LabBook) -> Optional[Tuple[int, int, int]]:
+    """Method to summarize the working tree of a LabBook, excluding the git directory
+
+    The summary is read from the file index, which is refreshed once per request anyway and only lists directories
+    whose mtime changed, so adding, removing or renaming any file or directory changes the result. Every indexed file
+    is re-stat'ed first, so content changes to existing files change it too. Falls back to walking the working tree
+    if the index cannot be used.
+
+    A tree modified within the last FILE_INDEX_RACY_WINDOW seconds could be modified again without its mtimes
+    changing, so it has no summary that can safely be compared.
+
+    Args:
+        labbook(LabBook): The LabBook
+
+    Returns:
+        tuple of (latest mtime in ns, number of entries, total size of files), or None if the tree was just modified
+    """
+    try:
+        state = file_index_manager.get(labbook).tree_state(restat=True)
+    except sqlite3.Error as err:
+        logger.warning(f"File index unavailable for {str(labbook)}, walking the working tree: {err}")
+        state = _walk_tree_state(labbook.root_dir)
+
+    if state[0] >= (time.time() - fileindex.FILE_INDEX_RACY_WINDOW) * 1e9:
+        return None
+    return state
+
+
+def _walk_tree_state(root_dir: str) -> Tuple[int, int, int]:
+    latest_mtime = os.stat(root_dir).st_mtime_ns
+    num_entries = 0
+    total_size = 0
+    directories = [root_dir]
+    while directories:
+        with os.scandir(directories.pop()) as entries:
+            for entry in entries:
+                if entry.name == '.git' and entry.is_dir(follow_symlinks=False):
+                    continue
+
+                num_entries += 1
+                entry_stat = entry.stat(follow_symlinks=False)
+                latest_mtime = max(latest_mtime, entry_stat.st_mtime_ns)
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                else:
+                    total_size += entry_stat.st_size
+
+    return latest_mtime, num_entries, total_size
+
+
+def git_refs_state(root_dir: str) -> List[int]:
+    """Method to summarize the git index and refs of a LabBook, which change on staging, branching and fetching
+
+    Args:
+        root_dir(str): Root directory of the LabBook
+
+    Returns:
+        list of mtimes in ns, 0 for paths that do not exist
+    """
+    git_dir = os.path.join(root_dir, '.git')
+    state = list()
+    for path in ('index', 'packed-refs', os.path.join('refs', 'heads'), os.path.join('refs', 'remotes')):
+        try:
+            state.append(os.stat(os.path.join(git_dir, path)).st_mtime_ns)
+        except FileNotFoundError:
+            state.append(0)
+    return state
+
+
+class LabBookStateFingerprinter(object):
+    """Computes a fingerprint of the state a query's result depends on, used as the ETag of the response
+
+    Only queries whose root fields are `labbook(owner, name)` are fingerprinted. The fingerprint of each selected
+    LabBook is its HEAD commit, git index and refs, the metadata of its working tree, and the state of its
+    background jobs. A query selecting a LabBook whose working tree was modified within the last couple of seconds is
+    not fingerprinted. If the query selects image or container status, the state of the LabBook's Docker image and
+    container is included. Queries selecting fields that depend on a remote, or that are filled in by a background
+    task such as content hashing, are never fingerprinted.
+    """
+    def fingerprint(self, context, document, params) -> Optional[str]:
+        """Method to compute the fingerprint for a request
+
+        Args:
+            context: The request context, after request middleware has run
+            document(GraphQLDocument): The parsed and validated document
+            params(GraphQLParams): The request parameters
+
+        Returns:
+            str, or None if the response may not be cached
+        """
+        selection = self.selected_labbooks(document.schema, document.document_ast, params.operation_name,
+                                           params.variables)
+        if selection is None:
+            return None
+
+        labbooks, selected_fields = selection
+        include_docker = bool(selected_fields & DOCKER_FIELDS)
+        username = get_logged_in_username()
+
+        state: List[Any] = [username]
+        for owner, labbook_name in labbooks:
+            labbook_state = self.labbook_state(username, owner, labbook_name, include_docker)
+            if labbook_state is None:
+                return None
+            state.append(labbook_state)
+
+        return hashlib.sha256(json.dumps(state, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def labbook_state(username: str, owner: str, labbook_name: str,
+                      include_docker: bool) -> Optional[Dict[str, Any]]:
+        """Method to collect the state of a single LabBook
+
+        Args:
+            username(str): The logged in user
+            owner(str): Owner (namespace) of the LabBook
+            labbook_name(str): Name of the LabBook
+            include_docker(bool): If True, include the state of the LabBook's image and container
+
+        Returns:
+            dict, or None if the LabBook's state can not be fingerprinted right now
+        """
+        labbook = LabBookLoader.get_labbook_instance(f"{username}&{owner}&{labbook_name}")
+        tree = working_tree_state(labbook)
+        if tree is None:
+            return None
+
+        dispatcher = Dispatcher()
+        jobs = list()
+        for job in dispatcher.get_jobs_for_labbook(labbook.key):
+            status = dispatcher.query_task(job.job_key)
+            jobs.append([job.job_key.key_str, status.status, status.meta])
+
+        state = {"head": labbook_fingerprint(labbook.root_dir),
+                 "refs": git_refs_state(labbook.root_dir),
+                 "tree": tree,
+                 "jobs": sorted(jobs, key=lambda j: j[0])}
+
+        if include_docker:
+            docker_key = infer_docker_image_name(labbook_name=labbook_name, owner=owner, username=username)
+            try:
+                client = get_docker_client()
+                try:
+                    state["image"] = client.images.get(docker_key).id
+                except ImageNotFound:
+                    state["image"] = None
+                try:
+                    state["container"] = client.containers.get(docker_key).status
+                except NotFound:
+                    state["container"] = None
+            except requests.exceptions.ConnectionError:
+                state["image"] = state["container"] = "unavailable"
+
+        return state
+
+    @staticmethod
+    def selected_labbooks(schema, document_ast, operation_name=None,
+                          variables=None) -> Optional[Tuple[List[Tuple[str, str]], Set[Tuple[str, str]]]]:
+        """Method to find the LabBooks selected by a query, and every (type, field) it selects
+
+        Args:
+            schema(GraphQLSchema): Schema the document was validated against
+            document_ast(Document): The parsed document
+            operation_name(str): The operation to execute
+            variables(dict): Variable values provided with the request
+
+        Returns:
+            tuple of (list of (owner, labbook_name), set of (type name, field name)), or None if the operation is not
+            a query answered entirely from LabBook state
+        """
+        operation = get_operation_ast(document_ast, operation_name)
+        query_type = schema.get_query_type()
+        if operation is None or operation.operation != 'query':
+            return None
+
+        fragments = {d.name.value: d for d in document_ast.definitions if isinstance(d, ast.FragmentDefinition)}
+        variable_values = get_variable_values(schema, operation.variable_definitions or [], variables or {})
+
+        labbooks: List[Tuple[str, str]] = list()
+        selected_fields: Set[Tuple[str, str]] = set()
+        for selection in operation.selection_set.selections:
+            if not isinstance(selection, ast.Field) or selection.name.value not in FINGERPRINTED_ROOT_FIELDS:
+                # Fragments on the root type are not used by the UI and are not worth analyzing
+                return None
+
+            if selection.name.value == "labbook":
+                field_def = query_type.fields["labbook"]
+                args = get_argument_values(field_def.args, selection.arguments, variable_values)
+                if not args.get('owner') or not args.get('name'):
+                    return None
+
+                labbooks.append((args['owner'], args['name']))
+                _collect_fields(schema, get_named_type(field_def.type), selection.selection_set, fragments,
+                                selected_fields)
+
+        if selected_fields & (REMOTE_FIELDS | BACKGROUND_FIELDS):
+            return None
+
+        return labbooks, selected_fields
+
+
+def _collect_fields(schema, parent_type, selection_set, fragments: dict, selected_fields: set) -> None:
+    if selection_set is None or parent_type is None:
+        return
+
+    for selection in selection_set.selections:
+        if isinstance(selection, ast.Field):
+            field_name = selection.name.value
+            parent_fields = getattr(parent_type, 'fields', None)
+            if field_name.startswith('__') or not parent_fields or field_name not in parent_fields:
+                continue
+
+            selected_fields.add((parent_type.name, field_name))
+            _collect_fields(schema, get_named_type(parent_fields[field_name].type), selection.selection_set,
+                            fragments, selected_fields)
+        elif isinstance(selection, ast.InlineFragment):
+            fragment_type = schema.get_type(selection.type_condition.name.value) \
+                if selection.type_condition else parent_type
+            _collect_fields(schema, fragment_type, selection.selection_set, fragments, selected_fields)
+        elif isinstance(selection, ast.FragmentSpread):
+            fragment = fragments.get(selection.name.value)
+            if fragment:
+                _collect_fields(schema, schema.get_type(fragment.type_condition.name.value), fragment.selection_set,
+                                fragments, selected_fields)
@@ -0,0 +1,140 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import mimetypes
+import os
+import re
+from typing import Optional
+
+import flask
+
+from lmcommon.logging import LMLogger
+from lmsrvlabbook.files.request import get_request_labbook
+
+logger = LMLogger.get_logger()
+
+# Sections of a LabBook that files can be downloaded from
+DOWNLOAD_SECTIONS = ('code', 'input', 'output')
+
+# Files larger than this can't be git-lfs pointers, so are never read to check
+LFS_POINTER_MAX_SIZE = 1024
+
+_LFS_POINTER_VERSION = b"version https://git-lfs.github.com/spec/v1"
+_LFS_OID = re.compile(rb"^oid sha256:([0-9a-f]{64})$", re.MULTILINE)
+_LFS_SIZE = re.compile(rb"^size (\d+)$", re.MULTILINE)
+
+
+def resolve_lfs_pointer(root_dir: str, file_path: str) -> Optional[str]:
+    """Method to get the local git-lfs object a pointer file refers to
+
+    Args:
+        root_dir(str): Root directory of the LabBook
+        file_path(str): Absolute path of a file in the LabBook
+
+    Returns:
+        str: Absolute path of the object, or None if the file is not an lfs pointer
+
+    Raises:
+        FileNotFoundError: If the file is a pointer, but its object has not been fetched
+    """
+    if os.path.getsize(file_path) > LFS_POINTER_MAX_SIZE:
+        return None
+
+    with open(file_path, 'rb') as fp:
+        content = fp.read(LFS_POINTER_MAX_SIZE)
+    if not content.startswith(_LFS_POINTER_VERSION):
+        return None
+
+    oid = _LFS_OID.search(content)
+    size = _LFS_SIZE.search(content)
+    if not oid or not size:
+        return None
+
+    oid_hex = oid.group(1).decode('utf-8')
+    object_path = os.path.join(root_dir, '.git', 'lfs', 'objects', oid_hex[0:2], oid_hex[2:4], oid_hex)
+    if not os.path.isfile(object_path) or os.path.getsize(object_path) != int(size.group(1)):
+        raise FileNotFoundError(f"git-lfs object {oid_hex} is not available locally")
+    return object_path
+
+
+def resolve_download_path(root_dir: str, section: str, key: str) -> str:
+    """Method to get the absolute path of a file in a LabBook section, refusing anything outside the section
+
+    Args:
+        root_dir(str): Root directory of the LabBook
+        section(str): The section (code, input, output)
+        key(str): Path of the file relative to the section
+
+    Returns:
+        str
+    """
+    if section not in DOWNLOAD_SECTIONS:
+        raise ValueError(f"Unsupported section `{section}`")
+
+    section_dir = os.path.realpath(os.path.join(root_dir, section))
+    file_path = os.path.realpath(os.path.join(section_dir, key))
+    if not file_path.startswith(section_dir + os.path.sep):
+        raise ValueError(f"`{key}` is not in section `{section}`")
+    if not os.path.isfile(file_path):
+        raise FileNotFoundError(f"`{key}` does not exist in section `{section}`")
+
+    return resolve_lfs_pointer(root_dir, file_path) or file_path
+
+
+def download_file(owner: str, labbook_name: str, section: str, key: str):
+    """View streaming a file from a LabBook section
+
+    The file is sent with wsgi.file_wrapper (or X-Sendfile, if USE_X_SENDFILE is configured) rather than read into
+    memory. Range requests are supported, so partial reads and resumed downloads only send the requested bytes, and
+    the ETag and Last-Modified headers are derived from the file's size and mtime, so unchanged files are answered
+    with 304 Not Modified. git-lfs pointer files are resolved to their local object.
+
+    Args:
+        owner(str): Owner of the LabBook
+        labbook_name(str): Name of the LabBook
+        section(str): The section (code, input, output)
+        key(str): Path of the file relative to the section
+
+    Returns:
+        flask.Response
+    """
+    lb = get_request_labbook(owner, labbook_name)
+
+    try:
+        file_path = resolve_download_path(lb.root_dir, section, key)
+    except ValueError as err:
+        logger.warning(f"Rejected download from {str(lb)}: {err}")
+        flask.abort(400)
+    except FileNotFoundError as err:
+        logger.warning(f"Download from {str(lb)} failed: {err}")
+        flask.abort(404)
+
+    filename = os.path.basename(key)
+    response = flask.send_file(file_path,
+                               mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                               as_attachment=True,
+                               attachment_filename=filename,
+                               conditional=True)
+
+    # Files are private to the user, and must be revalidated since they can change at any time
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.cache_control.max_age = None
+    return response
@@ -0,0 +1,97 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import itertools
+import json
+from typing import Any, Dict, Iterator
+
+import flask
+
+from lmcommon.logging import LMLogger
+from lmsrvlabbook.dataloader.fileindex import indexed_walkdir
+from lmsrvlabbook.files.download import DOWNLOAD_SECTIONS
+from lmsrvlabbook.files.request import get_request_labbook
+
+logger = LMLogger.get_logger()
+
+# Number of bytes of NDJSON buffered before being written to the response
+MANIFEST_WRITE_SIZE = 64 * 1024
+
+
+def manifest_lines(edges: Iterator[Dict[str, Any]], write_size: int = MANIFEST_WRITE_SIZE) -> Iterator[str]:
+    """Method to serialize file info dicts as newline-delimited JSON, in blocks of about write_size bytes
+
+    Args:
+        edges(iterator): File info dicts
+        write_size(int): Number of bytes to buffer before yielding
+
+    Returns:
+        iterator of str
+    """
+    buffer = list()
+    buffered = 0
+    for edge in edges:
+        line = json.dumps({"key": edge['key'],
+                           "size": edge['size'],
+                           "modified_at": edge['modified_at'],
+                           "is_dir": edge['is_dir']}, separators=(',', ':')) + "\n"
+        buffer.append(line)
+        buffered += len(line)
+        if buffered >= write_size:
+            yield "".join(buffer)
+            buffer = list()
+            buffered = 0
+
+    if buffer:
+        yield "".join(buffer)
+
+
+def section_manifest(owner: str, labbook_name: str, section: str):
+    """View streaming the manifest of every visible file and directory in a LabBook section as NDJSON
+
+    Each line is a JSON object with the key, size, modified_at and is_dir of one entry, in the same order as the
+    allFiles connection. Lines are generated from the file index as the response is written, so memory use does not
+    depend on the size of the section. The `after` query parameter resumes the manifest after a key.
+
+    Args:
+        owner(str): Owner of the LabBook
+        labbook_name(str): Name of the LabBook
+        section(str): The section (code, input, output)
+
+    Returns:
+        flask.Response
+    """
+    lb = get_request_labbook(owner, labbook_name)
+    if section not in DOWNLOAD_SECTIONS:
+        flask.abort(400)
+
+    try:
+        # Reading the first entry refreshes the index and validates `after` before the response starts
+        edges = iter(indexed_walkdir(lb, section, after=flask.request.args.get('after')))
+        first = next(edges, None)
+        if first is not None:
+            edges = itertools.chain([first], edges)
+    except ValueError as err:
+        logger.warning(f"Rejected manifest request for {str(lb)}: {err}")
+        flask.abort(400)
+
+    response = flask.Response(flask.stream_with_context(manifest_lines(edges)), mimetype='application/x-ndjson')
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,53 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import flask
+
+from lmcommon.labbook import LabBook
+from lmcommon.logging import LMLogger
+from lmsrvcore.auth.user import get_logged_in_username
+from lmsrvcore.middleware import AuthorizationMiddleware
+from lmsrvlabbook.dataloader.labbook import LabBookLoader
+
+logger = LMLogger.get_logger()
+
+_authorization = AuthorizationMiddleware()
+
+
+def get_request_labbook(owner: str, labbook_name: str) -> LabBook:
+    """Method to authenticate a plain HTTP request and load the LabBook it refers to
+
+    Requests are authenticated with the same headers, and token cache, as the GraphQL endpoint. Aborts with 404 if
+    the LabBook does not exist.
+
+    Args:
+        owner(str): Owner of the LabBook
+        labbook_name(str): Name of the LabBook
+
+    Returns:
+        LabBook
+    """
+    _authorization.authenticate(flask.request)
+    username = get_logged_in_username()
+
+    try:
+        return LabBookLoader.get_labbook_instance(f"{username}&{owner}&{labbook_name}")
+    except (ValueError, FileNotFoundError) as err:
+        logger.warning(f"Failed to load {owner}/{labbook_name}: {err}")
+        flask.abort(404)
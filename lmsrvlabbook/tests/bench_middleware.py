@@ -0,0 +1,110 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""Micro-benchmark of per-field middleware overhead on a large allFiles query
+
+Run explicitly with `pytest lmsrvlabbook/tests/bench_middleware.py -s`.
+"""
+import os
+import time
+
+import pytest
+from graphene.test import Client
+
+from lmcommon.labbook import LabBook
+from lmsrvcore.middleware import AuthorizationMiddleware, LabBookLoaderMiddleware, error_middleware
+from lmsrvlabbook.tests.fixtures import ContextMock, fixture_working_dir
+
+# Number of files created in the benchmarked section
+BENCH_FILE_COUNT = int(os.environ.get('BENCH_FILE_COUNT', 5000))
+
+# Number of timed executions per configuration
+BENCH_REPEAT = int(os.environ.get('BENCH_REPEAT', 5))
+
+ALL_FILES_QUERY = """
+{
+  labbook(name: "labbook1", owner: "default") {
+    name
+    code {
+      allFiles {
+        edges {
+          node {
+            id
+            key
+            size
+            isDir
+            modifiedAt
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+
+def _context():
+    context = ContextMock()
+    # Authentication itself is not under test, only the cost of the middleware running on each field
+    context.auth_middleware_complete = True
+    return context
+
+
+def _time(client, context_factory, before_execute=None):
+    durations = list()
+    for _ in range(BENCH_REPEAT):
+        context = context_factory()
+        start = time.perf_counter()
+        if before_execute:
+            before_execute(context)
+        result = client.execute(ALL_FILES_QUERY, context_value=context)
+        durations.append(time.perf_counter() - start)
+        assert 'errors' not in result
+        assert len(result['data']['labbook']['code']['allFiles']['edges']) == BENCH_FILE_COUNT
+    return min(durations)
+
+
+class TestMiddlewareOverhead(object):
+    def test_field_vs_request_middleware(self, fixture_working_dir):
+        """Compare the full per-field middleware stack to the request-level hooks on a large allFiles query"""
+        lb = LabBook(fixture_working_dir[0])
+        lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+        for i in range(BENCH_FILE_COUNT):
+            with open(os.path.join(lb.root_dir, 'code', f"file-{i:06d}.txt"), 'wt') as tf:
+                tf.write("bench")
+
+        schema = fixture_working_dir[3]
+        field_client = Client(schema, middleware=[error_middleware, AuthorizationMiddleware(),
+                                                  LabBookLoaderMiddleware()])
+        request_client = Client(schema)
+        loader_mw = LabBookLoaderMiddleware()
+
+        # Warm the LabBook cache and the file system cache
+        _time(request_client, _context, loader_mw.before_execute)
+
+        field_duration = _time(field_client, _context)
+        request_duration = _time(request_client, _context, loader_mw.before_execute)
+
+        field_count = BENCH_FILE_COUNT * 6
+        print(f"\nallFiles with {BENCH_FILE_COUNT} files ({field_count} resolved fields), best of {BENCH_REPEAT}")
+        print(f"  per-field middleware:   {field_duration * 1000:9.1f} ms")
+        print(f"  request-level hooks:    {request_duration * 1000:9.1f} ms")
+        print(f"  overhead per field:     {(field_duration - request_duration) / field_count * 1e6:9.2f} us")
+
+        assert request_duration < field_duration
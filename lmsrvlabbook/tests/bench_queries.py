@@ -0,0 +1,385 @@
+# Copyright (c) 2017 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""End-to-end benchmarks of the UI's GraphQL queries against synthetic large projects
+
+Run explicitly with `pytest lmsrvlabbook/tests/bench_queries.py -s`. Configure with environment variables:
+
+    BENCH_SCALE       Name of a scale in SCALES (default "small")
+    BENCH_REPEAT      Timed executions per query (default 5)
+    BENCH_OUTPUT      Path of the JSON results file (default benchmark-results.json)
+    BENCH_BASELINE    Path of a saved results file to compare against. The run fails on a regression.
+    BENCH_TOLERANCE   Allowed slowdown relative to the baseline, as a fraction (default 0.25)
+"""
+import json
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Dict, List
+
+import pytest
+from graphene.test import Client
+
+from lmcommon.activity import ActivityStore, ActivityDetailRecord, ActivityDetailType, ActivityRecord, ActivityType
+from lmcommon.environment import ComponentManager
+from lmcommon.gitlib.git import GitAuthor
+from lmcommon.labbook import LabBook
+from lmcommon.workflows import BranchManager
+from lmsrvcore.middleware import LabBookLoaderMiddleware
+from lmsrvlabbook.dataloader.labbook import labbook_cache
+from lmsrvlabbook.tests.fixtures import ContextMock, fixture_working_dir
+
+# Size of the synthetic data set for each named scale
+SCALES = {
+    "small": {"files": 2000, "activity_records": 200, "branches": 10, "packages": 50, "labbooks": 10},
+    "medium": {"files": 20000, "activity_records": 2000, "branches": 50, "packages": 200, "labbooks": 50},
+    "large": {"files": 100000, "activity_records": 20000, "branches": 200, "packages": 500, "labbooks": 100},
+}
+
+BENCH_SCALE = os.environ.get('BENCH_SCALE', 'small')
+BENCH_REPEAT = int(os.environ.get('BENCH_REPEAT', 5))
+BENCH_OUTPUT = os.environ.get('BENCH_OUTPUT', 'benchmark-results.json')
+BENCH_BASELINE = os.environ.get('BENCH_BASELINE')
+BENCH_TOLERANCE = float(os.environ.get('BENCH_TOLERANCE', 0.25))
+
+# Files per directory in the synthetic file tree
+FILES_PER_DIRECTORY = 500
+
+# Queries issued by the UI, keyed by benchmark name
+QUERIES = OrderedDict([
+    ("local_labbook_list", """
+        {
+          labbookList {
+            localLabbooks(first: 20, orderBy: "modified_on", sort: "desc") {
+              edges {
+                node {
+                  id
+                  name
+                  description
+                  owner
+                  activeBranchName
+                }
+                cursor
+              }
+              pageInfo {
+                hasNextPage
+              }
+            }
+          }
+        }"""),
+    ("overview", """
+        {
+          labbook(owner: "default", name: "bench-labbook") {
+            name
+            description
+            readme
+            overview {
+              numAptPackages
+              numConda2Packages
+              numConda3Packages
+              numPipPackages
+              recentActivity {
+                id
+                message
+                type
+                timestamp
+              }
+            }
+            availableBranchNames
+            isRepoClean
+          }
+        }"""),
+    ("files_root", """
+        {
+          labbook(owner: "default", name: "bench-labbook") {
+            code {
+              files {
+                edges {
+                  node {
+                    id
+                    key
+                    isDir
+                    size
+                    modifiedAt
+                    isFavorite
+                  }
+                }
+              }
+            }
+          }
+        }"""),
+    ("all_files", """
+        {
+          labbook(owner: "default", name: "bench-labbook") {
+            code {
+              allFiles {
+                edges {
+                  node {
+                    id
+                    key
+                    isDir
+                    size
+                    modifiedAt
+                    isFavorite
+                  }
+                  cursor
+                }
+              }
+            }
+            input {
+              allFiles {
+                edges {
+                  node {
+                    id
+                    key
+                    isDir
+                    size
+                    modifiedAt
+                    isFavorite
+                  }
+                  cursor
+                }
+              }
+            }
+          }
+        }"""),
+    ("activity_feed", """
+        {
+          labbook(owner: "default", name: "bench-labbook") {
+            activityRecords(first: 20) {
+              edges {
+                node {
+                  id
+                  commit
+                  linkedCommit
+                  message
+                  type
+                  show
+                  importance
+                  tags
+                  timestamp
+                  detailObjects {
+                    id
+                    key
+                    type
+                    show
+                    importance
+                    tags
+                  }
+                }
+                cursor
+              }
+              pageInfo {
+                hasNextPage
+                endCursor
+              }
+            }
+          }
+        }"""),
+    ("environment", """
+        {
+          labbook(owner: "default", name: "bench-labbook") {
+            environment {
+              packageDependencies(first: 100) {
+                edges {
+                  node {
+                    id
+                    manager
+                    package
+                    version
+                  }
+                }
+              }
+              dockerSnippet
+            }
+          }
+        }"""),
+])
+
+
+def build_synthetic_labbook(config_file: str, name: str, files: int, activity_records: int, branches: int,
+                            packages: int, **kwargs) -> LabBook:
+    """Method to create a LabBook with a large synthetic history, file tree, branch list and environment
+
+    Files are written to disk but not committed, since the file queries read the working tree.
+
+    Args:
+        config_file(str): Path to the LabManager config file
+        name(str): Name of the LabBook
+        files(int): Number of files, split between the code and input sections
+        activity_records(int): Number of activity records
+        branches(int): Number of branches in addition to the workspace branch
+        packages(int): Number of pip packages
+
+    Returns:
+        LabBook
+    """
+    lb = LabBook(config_file, author=GitAuthor(name="default", email="default@test.com"))
+    lb.new(owner={"username": "default"}, name=name, description="Synthetic benchmark project")
+
+    for i in range(files):
+        section = "code" if i % 2 == 0 else "input"
+        directory = os.path.join(lb.root_dir, section, f"dir-{(i // 2) // FILES_PER_DIRECTORY:04d}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"file-{i:07d}.txt"), 'wt') as tf:
+            tf.write(f"{i}\n" * (i % 64))
+
+    store = ActivityStore(lb)
+    for i in range(activity_records):
+        detail = ActivityDetailRecord(ActivityDetailType.CODE)
+        detail.show = True
+        detail.importance = i % 255
+        detail.add_value("text/plain", f"detail {i}")
+
+        record = ActivityRecord(ActivityType.CODE, show=True, message=f"Benchmark activity {i}",
+                                importance=i % 255, linked_commit="no-linked-commit")
+        record.add_detail_object(detail)
+        store.create_activity_record(record)
+
+    bm = BranchManager(lb, username="default")
+    for i in range(branches):
+        bm.create_branch(f"bench-branch-{i:04d}")
+        bm.workon_branch(bm.workspace_branch)
+
+    if packages:
+        cm = ComponentManager(lb)
+        cm.add_packages("pip", [{"manager": "pip", "package": f"bench-package-{i:04d}", "version": "1.0.0"}
+                                for i in range(packages)])
+
+    return lb
+
+
+def _context():
+    context = ContextMock()
+    LabBookLoaderMiddleware().before_execute(context)
+    return context
+
+
+def measure(client: Client, query: str, repeat: int) -> Dict[str, float]:
+    """Method to time a query and record its peak Python memory allocation
+
+    The first execution runs with an empty LabBook cache and is reported separately as the cold latency. Warm runs are
+    timed with tracemalloc off, and peak memory is measured in one extra warm run.
+
+    Args:
+        client(Client): Test client to execute with
+        query(str): The GraphQL query
+        repeat(int): Number of timed warm executions
+
+    Returns:
+        dict
+    """
+    labbook_cache.clear()
+    start = time.perf_counter()
+    result = client.execute(query, context_value=_context())
+    cold = time.perf_counter() - start
+    if 'errors' in result:
+        raise ValueError(f"Benchmark query failed: {result['errors']}")
+
+    # Time the warm runs untraced, since tracemalloc slows allocation-heavy code down several times over
+    durations = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        client.execute(query, context_value=_context())
+        durations.append(time.perf_counter() - start)
+
+    # Measure peak memory in a separate, untimed pass
+    tracemalloc.start()
+    try:
+        client.execute(query, context_value=_context())
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {"cold_ms": round(cold * 1000, 2),
+            "min_ms": round(min(durations) * 1000, 2),
+            "median_ms": round(statistics.median(durations) * 1000, 2),
+            "max_ms": round(max(durations) * 1000, 2),
+            "peak_memory_kb": round(peak / 1024, 1)}
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Method to find queries that regressed relative to a baseline
+
+    Medians are compared for latency and peaks for memory. Queries missing from either run are skipped.
+
+    Args:
+        results(dict): Results of this run, keyed by query name
+        baseline(dict): Results of the baseline run, keyed by query name
+        tolerance(float): Allowed increase as a fraction of the baseline
+
+    Returns:
+        list of regression descriptions
+    """
+    regressions = list()
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+
+        for metric in ("median_ms", "peak_memory_kb"):
+            if previous.get(metric) and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{name}.{metric}: {previous[metric]} -> {current[metric]} "
+                                   f"(+{(current[metric] / previous[metric] - 1) * 100:.0f}%)")
+    return regressions
+
+
+class TestQueryBenchmarks(object):
+    def test_ui_queries(self, fixture_working_dir):
+        """Benchmark the UI's queries against a synthetic project and compare to a baseline if provided"""
+        scale = SCALES[BENCH_SCALE]
+
+        build_start = time.perf_counter()
+        build_synthetic_labbook(fixture_working_dir[0], "bench-labbook", **scale)
+        for i in range(scale['labbooks']):
+            lb = LabBook(fixture_working_dir[0])
+            lb.new(owner={"username": "default"}, name=f"bench-list-{i:04d}", description=f"List entry {i}")
+        build_duration = time.perf_counter() - build_start
+
+        client = Client(fixture_working_dir[3])
+        results = OrderedDict()
+        for name, query in QUERIES.items():
+            results[name] = measure(client, query, BENCH_REPEAT)
+
+        output = {"scale": BENCH_SCALE,
+                  "parameters": scale,
+                  "repeat": BENCH_REPEAT,
+                  "python": platform.python_version(),
+                  "timestamp": time.time(),
+                  "build_seconds": round(build_duration, 1),
+                  "results": results}
+        with open(BENCH_OUTPUT, 'wt') as of:
+            json.dump(output, of, indent=2)
+
+        print(f"\nBenchmark scale '{BENCH_SCALE}' {scale}, results written to {os.path.abspath(BENCH_OUTPUT)}")
+        for name, r in results.items():
+            print(f"  {name:20s} cold {r['cold_ms']:9.1f} ms   median {r['median_ms']:9.1f} ms   "
+                  f"peak {r['peak_memory_kb']:10.1f} KB")
+
+        if BENCH_BASELINE:
+            with open(BENCH_BASELINE, 'rt') as bf:
+                baseline = json.load(bf)
+            if baseline.get('scale') != BENCH_SCALE:
+                pytest.fail(f"Baseline was recorded at scale '{baseline.get('scale')}', not '{BENCH_SCALE}'")
+
+            regressions = compare(results, baseline['results'], BENCH_TOLERANCE)
+            assert not regressions, "Performance regressions:\n" + "\n".join(regressions)
@@ -0,0 +1,98 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import hashlib
+import os
+
+from lmcommon.labbook import LabBook
+from lmsrvlabbook.tests.fixtures import fixture_working_dir
+
+from lmsrvlabbook.dataloader.contenthash import ContentHashCache, hash_file
+
+
+def _labbook_with_file(config_file):
+    lb = LabBook(config_file)
+    lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+    path = os.path.join(lb.root_dir, 'code', "test_file1.txt")
+    with open(path, 'wt') as tf:
+        tf.write("file 1")
+    return lb, path
+
+
+class TestContentHashCache(object):
+
+    def test_hash_file(self, tmpdir):
+        """Test hashing with a buffer smaller than the file matches hashlib"""
+        path = os.path.join(str(tmpdir), "data.bin")
+        data = os.urandom(10000)
+        with open(path, 'wb') as tf:
+            tf.write(data)
+
+        assert hash_file(path, buffer_size=1000) == hashlib.sha256(data).hexdigest()
+        assert hash_file(path, buffer_size=3) == hashlib.sha256(data).hexdigest()
+
+    def test_hashed_in_background(self, fixture_working_dir):
+        """Test a file is hashed once in the background and then served from the cache"""
+        lb, path = _labbook_with_file(fixture_working_dir[0])
+        cache = ContentHashCache()
+
+        assert cache.get(lb, path) is None
+        cache.wait()
+        assert cache.is_pending(path) is False
+
+        expected = hashlib.sha256(b"file 1").hexdigest()
+        assert cache.get(lb, path) == expected
+        assert cache.get(lb, path) == expected
+        stats = cache.stats()
+        assert stats['hashed_files'] == 1
+        assert stats['hashed_bytes'] == 6
+        assert stats['hits'] == 2
+        assert stats['misses'] == 1
+
+        # The cache is persistent, so a new instance does not hash the file again
+        other = ContentHashCache()
+        assert other.get(lb, path) == expected
+        assert other.stats()['hashed_files'] == 0
+
+    def test_rehashed_when_modified(self, fixture_working_dir):
+        """Test a modified file is hashed again, while a renamed file keeps its hash"""
+        lb, path = _labbook_with_file(fixture_working_dir[0])
+        cache = ContentHashCache()
+        cache.get(lb, path)
+        cache.wait()
+
+        with open(path, 'wt') as tf:
+            tf.write("file 1, modified")
+        assert cache.get(lb, path) is None
+        cache.wait()
+        assert cache.get(lb, path) == hashlib.sha256(b"file 1, modified").hexdigest()
+
+        renamed = os.path.join(lb.root_dir, 'code', "renamed.txt")
+        os.rename(path, renamed)
+        assert cache.get(lb, renamed) == hashlib.sha256(b"file 1, modified").hexdigest()
+        assert cache.stats()['hashed_files'] == 2
+
+    def test_put(self, fixture_working_dir):
+        """Test a hash recorded for a file, such as one computed during upload, is served without hashing"""
+        lb, path = _labbook_with_file(fixture_working_dir[0])
+        cache = ContentHashCache()
+
+        cache.put(lb, path, hashlib.sha256(b"file 1").hexdigest())
+        assert cache.get(lb, path) == hashlib.sha256(b"file 1").hexdigest()
+        assert cache.stats()['hashed_files'] == 0
@@ -0,0 +1,84 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+from mock import patch
+from lmsrvlabbook.tests.fixtures import fixture_working_dir
+
+from lmsrvlabbook.dataloader import favorites
+from lmsrvlabbook.dataloader.favorites import FavoritesCache, FavoritesLoader, reorder_favorites
+from lmsrvlabbook.dataloader.labbook import LabBookLoader
+from lmcommon.labbook import LabBook
+
+
+def _labbook_with_favorites(config_file):
+    lb = LabBook(config_file)
+    lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+    for name in ("a.txt", "b.txt", "c.txt"):
+        with open(os.path.join(lb.root_dir, 'code', name), 'wt') as tf:
+            tf.write(name)
+        lb.create_favorite('code', name, description=f"favorite {name}")
+    return lb
+
+
+class TestFavoritesCache(object):
+
+    def test_cached_until_modified(self, fixture_working_dir, monkeypatch):
+        """Test favorites are parsed once, and parsed again once the favorites file changes"""
+        lb = _labbook_with_favorites(fixture_working_dir[0])
+        cache = FavoritesCache()
+
+        # Treat every favorites file as settled, so it can be cached
+        monkeypatch.setattr(favorites, 'FAVORITES_RACY_WINDOW', -3600)
+        with patch.object(LabBook, 'get_favorites', autospec=True, side_effect=LabBook.get_favorites) as mock_fav:
+            assert list(cache.get(lb, 'code').keys()) == ["a.txt", "b.txt", "c.txt"]
+            assert list(cache.get(lb, 'code').keys()) == ["a.txt", "b.txt", "c.txt"]
+            assert mock_fav.call_count == 1
+
+            lb.remove_favorite('code', 'b.txt')
+            assert list(cache.get(lb, 'code').keys()) == ["a.txt", "c.txt"]
+            assert mock_fav.call_count == 2
+
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 2
+
+    def test_loader(self, fixture_working_dir):
+        """Test the loader reads a section's favorites once for many requests"""
+        _labbook_with_favorites(fixture_working_dir[0])
+        loader = FavoritesLoader(LabBookLoader())
+
+        results = loader.load_many(["default&default&labbook1&code", "default&default&labbook1&code",
+                                    "default&default&labbook1&input"]).get()
+        assert results[0] is results[1]
+        assert results[0]['b.txt']['description'] == "favorite b.txt"
+        assert len(results[2]) == 0
+
+    def test_reorder(self, fixture_working_dir):
+        """Test reordering rewrites every index with a single commit"""
+        lb = _labbook_with_favorites(fixture_working_dir[0])
+        commit_count = len(list(lb.git.repo.iter_commits()))
+
+        reordered = reorder_favorites(lb, 'code', ["c.txt", "a.txt", "b.txt"])
+        assert [(f['key'], f['index']) for f in reordered] == [("c.txt", 0), ("a.txt", 1), ("b.txt", 2)]
+
+        data = lb.get_favorites('code')
+        assert [(f['key'], f['index'], f['description']) for f in data.values()] == \
+            [("c.txt", 0, "favorite c.txt"), ("a.txt", 1, "favorite a.txt"), ("b.txt", 2, "favorite b.txt")]
+        assert len(list(lb.git.repo.iter_commits())) == commit_count + 1
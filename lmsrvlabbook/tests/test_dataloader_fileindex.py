@@ -0,0 +1,278 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import shutil
+
+import flask
+
+from lmcommon.files import FileOperations
+from lmcommon.labbook import LabBook
+from lmsrvlabbook.tests.fixtures import fixture_working_dir
+
+from lmsrvlabbook.dataloader import fileindex
+from lmsrvlabbook.dataloader.fileindex import FileFilter, FileIndexManager, file_sort_key
+
+
+def _labbook_with_files(config_file):
+    lb = LabBook(config_file)
+    lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+
+    with open(os.path.join(lb.root_dir, 'code', "test_file1.txt"), 'wt') as tf:
+        tf.write("file 1")
+    with open(os.path.join(lb.root_dir, 'code', ".hidden_file.txt"), 'wt') as tf:
+        tf.write("Should be hidden")
+    os.makedirs(os.path.join(lb.root_dir, 'code', 'src', 'js'))
+    os.makedirs(os.path.join(lb.root_dir, 'input', 'subdir', 'data'))
+    with open(os.path.join(lb.root_dir, 'code', 'src', 'test.py'), 'wt') as tf:
+        tf.write("print('hello, world')")
+    with open(os.path.join(lb.root_dir, 'input', 'subdir', 'data.dat'), 'wt') as tf:
+        tf.write("adsfasdfasdf")
+    return lb
+
+
+def _summary(edges):
+    return [(e['key'], e['is_dir'], e['size'] if not e['is_dir'] else 0, e['is_favorite']) for e in edges]
+
+
+class TestFileIndex(object):
+
+    def test_matches_file_operations(self, fixture_working_dir):
+        """Test the index lists the same files in the same order as FileOperations"""
+        lb = _labbook_with_files(fixture_working_dir[0])
+        lb.create_favorite('code', 'src/test.py', description="Favorite")
+        index = FileIndexManager().get(lb)
+        favorites = {'src/test.py'}
+
+        for section in ('code', 'input', 'output'):
+            assert _summary(index.walkdir(section, favorites if section == 'code' else set())) == \
+                _summary(FileOperations.walkdir(lb, section=section, show_hidden=False))
+            assert _summary(index.listdir(section, favorites if section == 'code' else set())) == \
+                _summary(FileOperations.listdir(lb, section, show_hidden=False))
+
+        assert _summary(index.listdir('code', favorites, 'src/')) == \
+            _summary(FileOperations.listdir(lb, 'code', base_path='src/', show_hidden=False))
+        assert index.content_size() == FileOperations.content_size(labbook=lb)
+
+    def test_incremental_refresh(self, fixture_working_dir, monkeypatch):
+        """Test added and removed files are picked up, and unchanged directories are not listed again"""
+        lb = _labbook_with_files(fixture_working_dir[0])
+        manager = FileIndexManager()
+        index = manager.get(lb)
+
+        # Treat every directory as settled, so unchanged directories can be skipped
+        monkeypatch.setattr(fileindex, 'FILE_INDEX_RACY_WINDOW', 0)
+        index.refresh()
+        scanned = index.scanned_dirs
+        index.refresh()
+        assert index.scanned_dirs == scanned
+        assert index.skipped_dirs > 0
+
+        with open(os.path.join(lb.root_dir, 'code', 'src', 'js', 'test.js'), 'wt') as tf:
+            tf.write("asdfasdf")
+        shutil.rmtree(os.path.join(lb.root_dir, 'input', 'subdir'))
+        index.refresh()
+        # Only the two directories where entries were added or removed are listed
+        assert index.scanned_dirs == scanned + 2
+
+        assert 'src/js/test.js' in [e['key'] for e in index.walkdir('code', set())]
+        assert index.walkdir('input', set()) == []
+        assert index.content_size() == FileOperations.content_size(labbook=lb)
+
+    def test_listing_restats_files(self, fixture_working_dir, monkeypatch):
+        """Test listing a directory picks up content changes that leave the directory mtime untouched, and .git is
+        not indexed"""
+        lb = _labbook_with_files(fixture_working_dir[0])
+        index = FileIndexManager().get(lb)
+        assert index._connect().execute("SELECT COUNT(*) FROM entries WHERE path LIKE '.git%'").fetchone()[0] == 0
+
+        monkeypatch.setattr(fileindex, 'FILE_INDEX_RACY_WINDOW', 0)
+        monkeypatch.setattr(fileindex, 'FILE_INDEX_FULL_SCAN_INTERVAL', 3600)
+        assert not index.refresh()
+        full_scans = index.full_scans
+
+        with open(os.path.join(lb.root_dir, 'code', 'src', 'test.py'), 'at') as tf:
+            tf.write("\nprint('goodbye')")
+        assert not index.refresh()
+        assert index.full_scans == full_scans
+
+        edges = index.listdir('code', set(), 'src/')
+        assert [(e['key'], e['size']) for e in edges if not e['is_dir']] == \
+            [('src/test.py', os.path.getsize(os.path.join(lb.root_dir, 'code', 'src', 'test.py')))]
+        assert index.file_info('code', 'src/', set())['total_size'] == edges[-1]['size']
+
+    def test_background_full_scan(self, fixture_working_dir, monkeypatch):
+        """Test a due full rescan runs in the background and picks up content changes in directories not listed"""
+        lb = _labbook_with_files(fixture_working_dir[0])
+        manager = FileIndexManager()
+        index = manager.get(lb)
+        manager.wait()
+        full_scans = index.full_scans
+
+        with open(os.path.join(lb.root_dir, 'code', 'src', 'test.py'), 'at') as tf:
+            tf.write("\nprint('goodbye')")
+        monkeypatch.setattr(fileindex, 'FILE_INDEX_FULL_SCAN_INTERVAL', 0)
+        # Indexes are refreshed once per request, and the fixture runs the whole test in one app context
+        flask.g.pop('refreshed_file_indexes', None)
+        manager.get(lb)
+        manager.wait()
+
+        assert index.full_scans == full_scans + 1
+        assert manager.stats()['pending_full_scans'] == 0
+        assert index.file_info('code', 'src/test.py', set())['size'] == \
+            os.path.getsize(os.path.join(lb.root_dir, 'code', 'src', 'test.py'))
+        assert index.content_size() == FileOperations.content_size(labbook=lb)
+
+    def test_persisted_and_removed(self, fixture_working_dir):
+        """Test the index is stored outside the LabBook, reused by a new manager, and deleted with the LabBook"""
+        lb = _labbook_with_files(fixture_working_dir[0])
+        manager = FileIndexManager()
+        db_path = manager.db_path(lb)
+        assert not db_path.startswith(lb.root_dir)
+
+        manager.get(lb)
+        assert os.path.exists(db_path)
+        assert manager.stats()['open'] == 1
+
+        index = FileIndexManager().get(lb)
+        assert [e['key'] for e in index.walkdir('code', set())] == ['src/', 'test_file1.txt', 'src/js/', 'src/test.py']
+
+        manager.remove(lb)
+        assert not os.path.exists(db_path)
+        assert manager.stats()['open'] == 0
+
+    def test_resume_walk(self, fixture_working_dir):
+        """Test the walk resumes after any key without reading the entries before it"""
+        lb = _labbook_with_files(fixture_working_dir[0])
+        index = FileIndexManager().get(lb)
+
+        keys = [e['key'] for e in index.iter_walkdir('code', set())]
+        assert sorted(keys, key=fileindex.file_walk_position) == keys
+        for position, key in enumerate(keys):
+            assert [e['key'] for e in index.iter_walkdir('code', set(), after=key)] == keys[position + 1:]
+
+        # A removed key still resumes at the same position
+        os.remove(os.path.join(lb.root_dir, 'code', 'test_file1.txt'))
+        index.refresh()
+        assert [e['key'] for e in index.iter_walkdir('code', set(), after='test_file1.txt')] == \
+            ['src/js/', 'src/test.py']
+
+    def test_listdir_seek(self, fixture_working_dir):
+        """Test a directory listing starts after a key, in both directions"""
+        lb = _labbook_with_files(fixture_working_dir[0])
+        index = FileIndexManager().get(lb)
+
+        assert [e['key'] for e in index.iter_listdir('code', set(), after='src/')] == ['test_file1.txt']
+        assert [e['key'] for e in index.iter_listdir('code', set(), after='test_file1.txt', reverse=True)] == \
+            ['src/']
+
+    def test_counts(self, fixture_working_dir):
+        """Test counts match the number of entries listed, without hidden files"""
+        lb = _labbook_with_files(fixture_working_dir[0])
+        index = FileIndexManager().get(lb)
+
+        for section in ('code', 'input', 'output'):
+            assert index.count_walkdir(section) == len(index.walkdir(section, set()))
+            assert index.count_listdir(section) == len(index.listdir(section, set()))
+        assert index.count_listdir('code', 'src/') == 2
+        assert index.count_walkdir('code') == 4
+
+    def test_filters(self, fixture_working_dir):
+        """Test filters select the same entries from the index as from a FileOperations listing"""
+        lb = _labbook_with_files(fixture_working_dir[0])
+        with open(os.path.join(lb.root_dir, 'code', 'src', 'js', 'app.JS'), 'wt') as tf:
+            tf.write("x" * 100)
+        index = FileIndexManager().get(lb)
+        index.refresh()
+
+        walk = FileOperations.walkdir(lb, section='code', show_hidden=False)
+        for file_filter in [FileFilter(glob="src/*"), FileFilter(glob="*.py"), FileFilter(glob="src/[!t]*"),
+                            FileFilter(glob="[^s]*"), FileFilter(glob="src/[jt]*"), FileFilter(name_contains="FILE"),
+                            FileFilter(extensions=['.js', 'txt']), FileFilter(min_size=10),
+                            FileFilter(max_size=10, is_dir=False), FileFilter(is_dir=True),
+                            FileFilter(modified_after=0, extensions=['py'])]:
+            expected = [e['key'] for e in walk if file_filter.matches(e)]
+            assert [e['key'] for e in index.iter_walkdir('code', set(), file_filter=file_filter)] == expected
+            assert index.count_walkdir('code', file_filter) == len(expected)
+
+        assert [e['key'] for e in index.iter_walkdir('code', set(), file_filter=FileFilter(extensions=['js']))] == \
+            ['src/js/app.JS']
+        assert [e['key'] for e in index.iter_listdir('code', set(), file_filter=FileFilter(is_dir=False))] == \
+            ['test_file1.txt']
+
+    def test_sqlite_glob(self):
+        """Test fnmatch patterns are translated to SQLite GLOB syntax"""
+        assert fileindex._sqlite_glob("src/*.py") == "src/*.py"
+        assert fileindex._sqlite_glob("[!a]*") == "[^a]*"
+        assert fileindex._sqlite_glob("[^a]*") == "[a^]*"
+        assert fileindex._sqlite_glob("[^]") == "^"
+        assert fileindex._sqlite_glob("[!]a]") == "[^]a]"
+        assert fileindex._sqlite_glob("a[b") == "a[[]b"
+
+    def test_sorted(self, fixture_working_dir):
+        """Test sorting by size and seeking after a sort key, in both directions"""
+        lb = _labbook_with_files(fixture_working_dir[0])
+        with open(os.path.join(lb.root_dir, 'code', 'src', 'big.py'), 'wt') as tf:
+            tf.write("x" * 100)
+        index = FileIndexManager().get(lb)
+        index.refresh()
+
+        edges = list(index.iter_sorted('code', set(), 'size', descending=True, recursive=True,
+                                       file_filter=FileFilter(is_dir=False)))
+        assert [e['key'] for e in edges] == ['src/big.py', 'src/test.py', 'test_file1.txt']
+
+        after = file_sort_key(edges[0], 'size')
+        assert [e['key'] for e in index.iter_sorted('code', set(), 'size', descending=True, recursive=True,
+                                                    file_filter=FileFilter(is_dir=False), after=after)] == \
+            ['src/test.py', 'test_file1.txt']
+        before = file_sort_key(edges[2], 'size')
+        assert [e['key'] for e in index.iter_sorted('code', set(), 'size', descending=True, recursive=True,
+                                                    file_filter=FileFilter(is_dir=False), after=before,
+                                                    reverse=True)] == ['src/test.py', 'src/big.py']
+
+        assert [e['key'] for e in index.iter_sorted('code', set(), 'name', base_path='src/')] == \
+            ['src/big.py', 'src/js/', 'src/test.py']
+
+    def test_directory_totals(self, fixture_working_dir):
+        """Test directory totals are aggregated bottom-up and kept up to date by update()"""
+        lb = _labbook_with_files(fixture_working_dir[0])
+        index = FileIndexManager().get(lb)
+
+        src = index.file_info('code', 'src/', set())
+        assert src['total_size'] == 21
+        assert src['file_count'] == 1
+        code = index.file_info('code', '', set())
+        # The hidden file is not included
+        assert code['total_size'] == 27
+        assert code['file_count'] == 2
+        assert code['last_modified_at'] >= src['last_modified_at']
+        assert [e['total_size'] for e in index.walkdir('input', set()) if e['key'] == 'subdir/'] == [12]
+
+        # Overwriting a file leaves the directory mtime unchanged, so only update() picks it up before a full scan
+        with open(os.path.join(lb.root_dir, 'code', 'src', 'test.py'), 'wt') as tf:
+            tf.write("x" * 100)
+        index.update(['code/src/test.py'])
+        assert index.file_info('code', 'src/', set())['total_size'] == 100
+        assert index.file_info('code', '', set())['total_size'] == 106
+
+        shutil.move(os.path.join(lb.root_dir, 'code', 'src'), os.path.join(lb.root_dir, 'input', 'src'))
+        index.update(['code/src', 'input/src'])
+        assert index.file_info('code', '', set())['file_count'] == 1
+        assert index.file_info('input', '', set())['file_count'] == 2
+        assert index.file_info('input', '', set())['total_size'] == 112
@@ -0,0 +1,91 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import pytest
+from mock import patch
+from lmsrvlabbook.tests.fixtures import fixture_working_dir
+
+from lmsrvlabbook.dataloader.fileinfo import FileInfoLoader
+from lmsrvlabbook.dataloader.labbook import LabBookLoader
+from lmcommon.labbook import LabBook
+
+
+def _labbook_with_files(config_file):
+    lb = LabBook(config_file)
+    lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+    os.makedirs(os.path.join(lb.root_dir, 'code', 'src'))
+    with open(os.path.join(lb.root_dir, 'code', "test_file1.txt"), 'wt') as tf:
+        tf.write("file 1")
+    with open(os.path.join(lb.root_dir, 'code', "test_file2.txt"), 'wt') as tf:
+        tf.write("file 22")
+    with open(os.path.join(lb.root_dir, 'code', 'src', "test.py"), 'wt') as tf:
+        tf.write("print('hello, world')")
+    lb.create_favorite('code', 'test_file2.txt', description="Favorite")
+    return lb
+
+
+class TestDataloaderFileInfo(object):
+
+    def test_matches_get_file_info(self, fixture_working_dir):
+        """Test the loader returns the same file info as LabBook.get_file_info"""
+        lb = _labbook_with_files(fixture_working_dir[0])
+        loader = FileInfoLoader(LabBookLoader())
+
+        file_keys = ["test_file1.txt", "test_file2.txt", "src/", "src/test.py"]
+        infos = loader.load_many([f"default&default&labbook1&code&{key}" for key in file_keys]).get()
+
+        for key, info in zip(file_keys, infos):
+            expected = lb.get_file_info('code', key)
+            assert info['key'] == expected['key']
+            assert info['is_dir'] == expected['is_dir']
+            assert info['is_favorite'] == expected['is_favorite']
+            assert round(info['modified_at']) == round(expected['modified_at'])
+            if not info['is_dir']:
+                assert info['size'] == expected['size']
+
+        assert infos[1]['is_favorite'] is True
+        assert infos[2]['is_dir'] is True
+
+    def test_one_scan_per_directory(self, fixture_working_dir):
+        """Test keys in the same directory are resolved with one scandir, and favorites are read once"""
+        lb = _labbook_with_files(fixture_working_dir[0])
+        loader = FileInfoLoader(LabBookLoader())
+
+        with patch('lmsrvlabbook.dataloader.fileinfo.os.scandir', wraps=os.scandir) as mock_scandir, \
+                patch.object(LabBook, 'get_favorites', autospec=True, side_effect=LabBook.get_favorites) as mock_fav:
+            infos = loader.load_many(["default&default&labbook1&code&test_file1.txt",
+                                      "default&default&labbook1&code&test_file2.txt",
+                                      "default&default&labbook1&code&src/test.py"]).get()
+
+        assert [i['key'] for i in infos] == ["test_file1.txt", "test_file2.txt", "src/test.py"]
+        assert mock_scandir.call_count == 2
+        assert mock_fav.call_count == 1
+
+    def test_missing_file(self, fixture_working_dir):
+        """Test a missing file rejects only its own promise"""
+        _labbook_with_files(fixture_working_dir[0])
+        loader = FileInfoLoader(LabBookLoader())
+
+        missing = loader.load("default&default&labbook1&code&does_not_exist.txt")
+        found = loader.load("default&default&labbook1&code&test_file1.txt")
+
+        assert found.get()['key'] == "test_file1.txt"
+        with pytest.raises(FileNotFoundError):
+            missing.get()
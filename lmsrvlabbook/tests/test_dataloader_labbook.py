@@ -17,12 +17,15 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import os
+import flask
 import pytest
 from lmsrvlabbook.tests.fixtures import fixture_working_dir
 
 from promise import Promise
 
-from lmsrvlabbook.dataloader.labbook import LabBookLoader
+from lmsrvlabbook.dataloader.labbook import LabBookLoader, LabBookCache, labbook_cache
+from lmsrvlabbook.dataloader.repository import repository_pool
 from lmcommon.labbook import LabBook
 
 
@@ -64,3 +67,96 @@ class TestDataloaderLabBook(object):
         assert lb_list[2].name == "labbook2"
         assert lb_list[2].description == "my first labbook3"
 
+    def test_load_cached_across_loaders(self, fixture_working_dir):
+        """Test a LabBook loaded by one loader is served from the process-wide cache to the next"""
+        labbook_cache.clear()
+        lb = LabBook(fixture_working_dir[0])
+        lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+
+        lb1 = LabBookLoader().load("default&default&labbook1").get()
+        labbook_cache.release_request()
+        lb2 = LabBookLoader().load("default&default&labbook1").get()
+        labbook_cache.release_request()
+
+        assert lb1 is lb2
+        stats = labbook_cache.stats()
+        assert stats['misses'] == 1
+        assert stats['hits'] == 1
+        assert stats['size'] == 1
+
+    def test_cache_invalidated_on_change(self, fixture_working_dir):
+        """Test a cached LabBook is reloaded after a commit or an explicit invalidation"""
+        labbook_cache.clear()
+        lb = LabBook(fixture_working_dir[0])
+        lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+
+        lb1 = LabBookLoader().load("default&default&labbook1").get()
+
+        # Commit outside of the cached instance, which moves HEAD
+        with open(os.path.join(lb.root_dir, 'code', 'test.txt'), 'wt') as tf:
+            tf.write("hello")
+        lb.git.add(os.path.join(lb.root_dir, 'code', 'test.txt'))
+        lb.git.commit("Adding a file")
+
+        lb2 = LabBookLoader().load("default&default&labbook1").get()
+        assert lb1 is not lb2
+        assert labbook_cache.stats()['invalidations'] == 1
+
+        labbook_cache.invalidate("default", "labbook1")
+        assert len(labbook_cache) == 0
+        lb3 = LabBookLoader().load("default&default&labbook1").get()
+        assert lb3 is not lb2
+
+    def test_checked_out_per_request(self, fixture_working_dir):
+        """Test concurrent requests never share a cached LabBook or its repository, and instances are returned at
+        teardown"""
+        labbook_cache.clear()
+        lb = LabBook(fixture_working_dir[0])
+        lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+        key = "default&default&labbook1"
+        user = flask.g.user_obj
+
+        def teardown():
+            labbook_cache.release_request()
+            repository_pool.release_request()
+
+        # Separate apps, so each request has its own flask.g
+        app1 = flask.Flask("lmsrvlabbook1")
+        app2 = flask.Flask("lmsrvlabbook2")
+        with app1.test_request_context():
+            flask.g.user_obj = user
+            lb1 = LabBookLoader.get_labbook_instance(key)
+            assert LabBookLoader.get_labbook_instance(key) is lb1
+            with app2.test_request_context():
+                flask.g.user_obj = user
+                lb2 = LabBookLoader.get_labbook_instance(key)
+                assert lb2 is not lb1
+                assert lb2.git.repo is not lb1.git.repo
+                teardown()
+            assert len(labbook_cache) == 1
+            teardown()
+
+        assert len(labbook_cache) == 2
+        with app1.test_request_context():
+            flask.g.user_obj = user
+            assert LabBookLoader.get_labbook_instance(key) in (lb1, lb2)
+            labbook_cache.invalidate("default", "labbook1")
+            teardown()
+        assert len(labbook_cache) == 0
+
+    def test_cache_eviction(self, fixture_working_dir):
+        """Test the least recently used LabBook is evicted when the cache is full"""
+        lb = LabBook(fixture_working_dir[0])
+        lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+        lb1 = LabBook(fixture_working_dir[0])
+        lb1.new(owner={"username": "default"}, name="labbook2", description="my first labbook2")
+
+        cache = LabBookCache(max_size=1)
+        cache.put("default&default&labbook1", lb)
+        cache.put("default&default&labbook2", lb1)
+        cache.release_request()
+
+        assert cache.get("default&default&labbook1") is None
+        assert cache.get("default&default&labbook2") is lb1
+        assert cache.stats() == {"size": 1, "max_size": 1, "hits": 1, "misses": 1, "evictions": 1,
+                                 "invalidations": 0}
@@ -0,0 +1,169 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import flask
+import pytest
+from lmsrvlabbook.tests.fixtures import fixture_working_dir
+
+from lmsrvlabbook.dataloader.repository import RepositoryPool, private_labbook
+from lmcommon.labbook import LabBook
+
+
+def _load(config_file, name):
+    lb = LabBook(config_file)
+    lb.from_name("default", "default", name)
+    return lb
+
+
+class TestRepositoryPool(object):
+
+    def test_borrow_reuses_handle(self, fixture_working_dir):
+        """Test a second LabBook instance for the same repository gets the pooled handle once it has been returned"""
+        lb = LabBook(fixture_working_dir[0])
+        lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+        pool = RepositoryPool()
+
+        repo1 = pool.borrow(_load(fixture_working_dir[0], "labbook1"))
+        pool.release_request()
+        lb2 = _load(fixture_working_dir[0], "labbook1")
+        repo2 = pool.borrow(lb2)
+
+        assert repo1 is repo2
+        assert lb2.git.repo is repo1
+        assert len(pool) == 1
+        assert pool.stats()['opened'] == 1
+        assert pool.stats()['reused'] == 1
+
+    def test_release_request(self, fixture_working_dir):
+        """Test handles borrowed during a request are returned at teardown, and reused by the next request"""
+        lb = LabBook(fixture_working_dir[0])
+        lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+        pool = RepositoryPool()
+
+        app = flask.Flask("lmsrvlabbook")
+        with app.test_request_context():
+            lb1 = _load(fixture_working_dir[0], "labbook1")
+            repo1 = pool.borrow(lb1)
+            assert pool.borrow(lb1) is repo1
+            assert pool.stats()['borrowed'] == 1
+
+            pool.release_request()
+            assert pool.stats()['borrowed'] == 0
+            assert len(pool) == 1
+
+        with app.test_request_context():
+            assert pool.borrow(_load(fixture_working_dir[0], "labbook1")) is repo1
+            pool.release_request()
+        assert pool.stats()['reused'] == 1
+
+    def test_borrow_is_exclusive(self, fixture_working_dir):
+        """Test concurrent requests never share a handle, and each LabBook gets its own handle back when idle"""
+        lb = LabBook(fixture_working_dir[0])
+        lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+        pool = RepositoryPool()
+
+        # Separate apps, so each request has its own flask.g
+        app1 = flask.Flask("lmsrvlabbook1")
+        app2 = flask.Flask("lmsrvlabbook2")
+        lb1 = _load(fixture_working_dir[0], "labbook1")
+        lb2 = _load(fixture_working_dir[0], "labbook1")
+        with app1.test_request_context():
+            repo1 = pool.borrow(lb1)
+            with app2.test_request_context():
+                repo2 = pool.borrow(lb2)
+                assert repo2 is not repo1
+                assert pool.stats()['borrowed'] == 2
+
+                # The first LabBook's handle is in use, so another one is opened
+                lb3 = _load(fixture_working_dir[0], "labbook1")
+                lb3.git.repo = repo1
+                repo3 = pool.borrow(lb3)
+                assert repo3 not in (repo1, repo2)
+                assert lb3.git.repo is repo3
+                pool.release_request()
+            pool.release_request()
+
+        assert len(pool) == 3
+        assert pool.stats()['borrowed'] == 0
+        with app1.test_request_context():
+            assert pool.borrow(lb1) is repo1
+            assert pool.borrow(lb2) is repo2
+            pool.release_request()
+
+    def test_reap(self, fixture_working_dir):
+        """Test idle handles are closed past the timeout and beyond the pool size"""
+        lb = LabBook(fixture_working_dir[0])
+        lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+        lb.new(owner={"username": "default"}, name="labbook2", description="my first labbook2")
+        lb.new(owner={"username": "default"}, name="labbook3", description="my first labbook3")
+
+        pool = RepositoryPool(max_size=2)
+        for name in ["labbook1", "labbook2", "labbook3"]:
+            pool.borrow(_load(fixture_working_dir[0], name))
+        assert len(pool) == 3
+
+        # Borrowed handles are never closed
+        pool.reap()
+        assert len(pool) == 3
+
+        pool.release_request()
+        assert len(pool) == 2
+        assert pool.stats()['closed'] == 1
+
+        pool.idle_timeout = -1
+        pool.reap()
+        assert len(pool) == 0
+        assert pool.stats()['closed'] == 3
+
+    def test_evict(self, fixture_working_dir):
+        """Test evicting a repository closes and removes its handle"""
+        lb = LabBook(fixture_working_dir[0])
+        lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+        pool = RepositoryPool()
+
+        lb1 = _load(fixture_working_dir[0], "labbook1")
+        pool.borrow(lb1)
+        pool.release_request()
+        pool.evict(lb1.root_dir)
+        assert len(pool) == 0
+        assert pool.stats()['closed'] == 1
+
+        # A handle borrowed while the repository is evicted is closed when it is returned
+        pool.borrow(_load(fixture_working_dir[0], "labbook1"))
+        pool.evict(lb1.root_dir)
+        assert len(pool) == 1
+        pool.release_request()
+        assert len(pool) == 0
+        assert pool.stats()['closed'] == 2
+
+    def test_private_labbook(self, fixture_working_dir):
+        """Test work run off the request thread gets its own repository handle, not the pooled one"""
+        lb = LabBook(fixture_working_dir[0])
+        lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+        pool = RepositoryPool()
+
+        lb1 = _load(fixture_working_dir[0], "labbook1")
+        pooled = pool.borrow(lb1)
+        with private_labbook(lb1) as private:
+            assert private.root_dir == lb1.root_dir
+            assert private.git.repo is not pooled
+            assert private.git.commit_hash == lb1.git.commit_hash
+
+        assert lb1.git.repo is pooled
+        assert pool.stats()['opened'] == 1
@@ -0,0 +1,107 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import os
+import time
+
+import flask
+
+from graphql import parse
+
+from lmcommon.labbook import LabBook
+from lmsrvlabbook.tests.fixtures import fixture_working_dir
+from lmsrvlabbook.dataloader import fileindex
+from lmsrvlabbook.dataloader.state import LabBookStateFingerprinter, git_refs_state, working_tree_state
+
+
+class TestLabBookState(object):
+
+    def test_working_tree_state(self, fixture_working_dir, monkeypatch):
+        """Test the working tree state changes when files are added, modified or removed"""
+        lb = LabBook(fixture_working_dir[0])
+        lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+
+        def state_of_new_request():
+            # The file index is refreshed once per request, and the fixture runs the whole test in one app context
+            flask.g.pop('refreshed_file_indexes', None)
+            return working_tree_state(lb)
+
+        # A tree modified within the racy window has no state
+        assert state_of_new_request() is None
+        monkeypatch.setattr(fileindex, 'FILE_INDEX_RACY_WINDOW', 0)
+
+        state = state_of_new_request()
+        assert state_of_new_request() == state
+
+        path = os.path.join(lb.root_dir, 'code', 'test.txt')
+        with open(path, 'wt') as tf:
+            tf.write("a")
+        added = state_of_new_request()
+        assert added != state
+        assert added[1] == state[1] + 1
+
+        # Content changes are picked up straight away, without waiting for a full rescan of the file index
+        monkeypatch.setattr(fileindex, 'FILE_INDEX_FULL_SCAN_INTERVAL', 3600)
+        time.sleep(0.01)
+        with open(path, 'at') as tf:
+            tf.write("b")
+        modified = state_of_new_request()
+        assert modified[0] > added[0]
+        assert modified[2] == added[2] + 1
+
+        os.remove(path)
+        assert state_of_new_request()[1] == state[1]
+
+    def test_git_refs_state(self, fixture_working_dir):
+        """Test committing changes the git state"""
+        lb = LabBook(fixture_working_dir[0])
+        lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+
+        state = git_refs_state(lb.root_dir)
+        time.sleep(0.01)
+        with open(os.path.join(lb.root_dir, 'code', 'test.txt'), 'wt') as tf:
+            tf.write("a")
+        lb.git.add_all('code/')
+        assert git_refs_state(lb.root_dir) != state
+
+    def test_selected_labbooks(self, fixture_working_dir):
+        """Test the LabBooks and fields selected by a query are found, including through variables and fragments"""
+        schema = fixture_working_dir[3]
+        document_ast = parse("""
+            query Q($name: String) {
+                a: labbook(owner: "default", name: $name) { ...Files }
+                b: labbook(owner: "test", name: "lb2") { environment { containerStatus } }
+            }
+            fragment Files on Labbook { code { files { edges { node { key } } } } }""")
+
+        labbooks, fields = LabBookStateFingerprinter.selected_labbooks(schema, document_ast, "Q", {"name": "lb1"})
+        assert labbooks == [("default", "lb1"), ("test", "lb2")]
+        assert ("LabbookSection", "files") in fields
+        assert ("Environment", "containerStatus") in fields
+
+    def test_not_fingerprinted(self, fixture_working_dir):
+        """Test queries reading remote or global state are not fingerprinted"""
+        schema = fixture_working_dir[3]
+        for query in ('{ labbook(owner: "default", name: "lb1") { updatesAvailableCount } }',
+                      '{ labbookList { localLabbooks { edges { node { name } } } } }',
+                      '{ labbook(owner: "default", name: "lb1") { name } buildInfo }',
+                      '{ labbook(owner: "default", name: "lb1") { code { files(first: 1) { edges { node { '
+                      'contentHash } } } } } }',
+                      'mutation { __typename }'):
+            assert LabBookStateFingerprinter.selected_labbooks(schema, parse(query)) is None
@@ -0,0 +1,110 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import hashlib
+import os
+
+import flask
+import pytest
+from mock import patch
+
+from lmcommon.labbook import LabBook
+from lmsrvcore.middleware import AuthorizationMiddleware
+from lmsrvlabbook.tests.fixtures import fixture_working_dir
+
+from lmsrvlabbook.files.download import download_file, resolve_download_path
+
+
+@pytest.fixture
+def download_client(fixture_working_dir):
+    """A Flask test client with the download route, and a LabBook with a file in the input section"""
+    lb = LabBook(fixture_working_dir[0])
+    lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+    with open(os.path.join(lb.root_dir, 'input', 'data.bin'), 'wb') as f:
+        f.write(bytes(range(256)) * 4)
+
+    app = flask.current_app
+    app.add_url_rule('/download/<owner>/<labbook_name>/<section>/<path:key>', view_func=download_file)
+    with patch.object(AuthorizationMiddleware, 'authenticate', lambda self, context: None):
+        yield app.test_client(), lb
+
+
+class TestDownload(object):
+    def test_download(self, download_client):
+        """Test a file is sent whole with validators"""
+        client, lb = download_client
+        response = client.get('/download/default/labbook1/input/data.bin')
+        assert response.status_code == 200
+        assert response.data == bytes(range(256)) * 4
+        assert response.headers['Accept-Ranges'] == 'bytes'
+        assert 'Last-Modified' in response.headers
+        assert 'attachment' in response.headers['Content-Disposition']
+
+        # An unchanged file is not sent again
+        response = client.get('/download/default/labbook1/input/data.bin',
+                              headers={'If-None-Match': response.headers['ETag']})
+        assert response.status_code == 304
+
+    def test_range(self, download_client):
+        """Test partial reads only send the requested bytes"""
+        client, lb = download_client
+        response = client.get('/download/default/labbook1/input/data.bin', headers={'Range': 'bytes=256-511'})
+        assert response.status_code == 206
+        assert response.data == bytes(range(256))
+        assert response.headers['Content-Range'] == 'bytes 256-511/1024'
+
+        response = client.get('/download/default/labbook1/input/data.bin', headers={'Range': 'bytes=1000-'})
+        assert response.status_code == 206
+        assert len(response.data) == 24
+
+    def test_not_found(self, download_client):
+        """Test missing files and LabBooks"""
+        client, lb = download_client
+        assert client.get('/download/default/labbook1/input/missing.bin').status_code == 404
+        assert client.get('/download/default/labbook2/input/data.bin').status_code == 404
+        assert client.get('/download/default/labbook1/secrets/data.bin').status_code == 400
+
+    def test_outside_section(self, download_client):
+        """Test paths escaping the section are refused"""
+        client, lb = download_client
+        with pytest.raises(ValueError):
+            resolve_download_path(lb.root_dir, 'input', '../.git/config')
+        with pytest.raises(ValueError):
+            resolve_download_path(lb.root_dir, 'input', '/etc/passwd')
+
+    def test_lfs_pointer(self, download_client):
+        """Test git-lfs pointer files are resolved to their local object"""
+        client, lb = download_client
+        content = b"large file content"
+        oid = hashlib.sha256(content).hexdigest()
+        object_dir = os.path.join(lb.root_dir, '.git', 'lfs', 'objects', oid[0:2], oid[2:4])
+        os.makedirs(object_dir, exist_ok=True)
+        with open(os.path.join(object_dir, oid), 'wb') as f:
+            f.write(content)
+        with open(os.path.join(lb.root_dir, 'output', 'result.dat'), 'wt') as f:
+            f.write(f"version https://git-lfs.github.com/spec/v1\noid sha256:{oid}\nsize {len(content)}\n")
+
+        response = client.get('/download/default/labbook1/output/result.dat')
+        assert response.status_code == 200
+        assert response.data == content
+
+        # A pointer whose object was never fetched
+        with open(os.path.join(lb.root_dir, 'output', 'missing.dat'), 'wt') as f:
+            f.write(f"version https://git-lfs.github.com/spec/v1\noid sha256:{'0' * 64}\nsize 10\n")
+        assert client.get('/download/default/labbook1/output/missing.dat').status_code == 404
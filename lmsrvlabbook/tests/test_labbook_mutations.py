@@ -449,6 +449,56 @@ class TestLabBookServiceMutations(object):
         assert os.path.exists(dir_path) is False
         assert os.path.exists(os.path.join(lb.root_dir, 'code')) is True
 
+    def test_directory_totals(self, mock_create_labbooks):
+        """Test directory totals reflect files deleted by a mutation"""
+        lb = LabBook(mock_create_labbooks[0])
+        lb.from_name('default', 'default', 'labbook1')
+        FileOperations.makedir(lb, 'code/subdir')
+        for name, size in [("a.txt", 10), ("b.txt", 20)]:
+            with open(os.path.join(lb.root_dir, 'code', 'subdir', name), 'wt') as tf:
+                tf.write("x" * size)
+
+        totals_query = """
+        {
+          labbook(owner: "default", name: "labbook1") {
+            code {
+              files {
+                edges {
+                  node {
+                    key
+                    totalSize
+                    fileCount
+                  }
+                }
+              }
+            }
+          }
+        }
+        """
+        res = mock_create_labbooks[2].execute(totals_query)
+        subdir = [e['node'] for e in res['data']['labbook']['code']['files']['edges'] if e['node']['key'] == 'subdir/']
+        assert subdir == [{'key': 'subdir/', 'totalSize': '30', 'fileCount': 2}]
+
+        query = """
+        mutation deleteLabbookFile {
+          deleteLabbookFile(
+            input: {
+              owner: "default",
+              labbookName: "labbook1",
+              section: "code",
+              filePath: "subdir/b.txt"
+            }) {
+              success
+            }
+        }
+        """
+        res = mock_create_labbooks[2].execute(query)
+        assert res['data']['deleteLabbookFile']['success'] is True
+
+        res = mock_create_labbooks[2].execute(totals_query)
+        subdir = [e['node'] for e in res['data']['labbook']['code']['files']['edges'] if e['node']['key'] == 'subdir/']
+        assert subdir == [{'key': 'subdir/', 'totalSize': '10', 'fileCount': 1}]
+
     def test_makedir(self, mock_create_labbooks, snapshot):
         query = """
         mutation makeLabbookDirectory {
@@ -808,6 +858,66 @@ class TestLabBookServiceMutations(object):
         # Make sure favorite is gone now
         snapshot.assert_match(mock_create_labbooks[2].execute(fav_query))
 
+    def test_reorder_favorites(self, mock_create_labbooks):
+        """Test reordering all favorites in a section with a single mutation"""
+        keys = ["a.txt", "b.txt", "c.txt"]
+        for key in keys:
+            test_file = os.path.join(mock_create_labbooks[1], 'default', 'default', 'labbooks',
+                                     'labbook1', 'code', key)
+            with open(test_file, 'wt') as tf:
+                tf.write("a test file...")
+
+            query = f"""
+            mutation addFavorite {{
+              addFavorite(input: {{owner: "default", labbookName: "labbook1", section: "code", key: "{key}",
+                                  description: "favorite {key}"}}) {{
+                  newFavoriteEdge {{ node {{ key }} }}
+                }}
+            }}
+            """
+            result = mock_create_labbooks[2].execute(query)
+            assert 'errors' not in result
+
+        query = """
+        mutation reorderFavorites {
+          reorderFavorites(input: {owner: "default", labbookName: "labbook1", section: "code",
+                                   keys: ["c.txt", "a.txt", "b.txt"]}) {
+              updatedFavoriteEdges { node { key index description } }
+            }
+        }
+        """
+        result = mock_create_labbooks[2].execute(query)
+        assert 'errors' not in result
+        assert [e['node'] for e in result['data']['reorderFavorites']['updatedFavoriteEdges']] == \
+            [{'key': 'c.txt', 'index': 0, 'description': 'favorite c.txt'},
+             {'key': 'a.txt', 'index': 1, 'description': 'favorite a.txt'},
+             {'key': 'b.txt', 'index': 2, 'description': 'favorite b.txt'}]
+
+        fav_query = """
+        {
+          labbook(name: "labbook1", owner: "default") {
+            code {
+              favorites { edges { node { key index } } }
+            }
+          }
+        }
+        """
+        result = mock_create_labbooks[2].execute(fav_query)
+        assert [e['node'] for e in result['data']['labbook']['code']['favorites']['edges']] == \
+            [{'key': 'c.txt', 'index': 0}, {'key': 'a.txt', 'index': 1}, {'key': 'b.txt', 'index': 2}]
+
+        # Every favorite must be listed exactly once
+        query = """
+        mutation reorderFavorites {
+          reorderFavorites(input: {owner: "default", labbookName: "labbook1", section: "code",
+                                   keys: ["c.txt", "a.txt"]}) {
+              updatedFavoriteEdges { node { key } }
+            }
+        }
+        """
+        result = mock_create_labbooks[2].execute(query)
+        assert 'errors' in result
+
     def test_import_labbook(self, fixture_working_dir):
         """Test batch uploading, but not full import"""
         class DummyContext(object):
@@ -1110,6 +1110,206 @@ class TestLabBookServiceQueries(object):
                     """
         snapshot.assert_match(fixture_working_dir[2].execute(query))
 
+    def test_page_all_files(self, fixture_working_dir):
+        """Test paging through all files with keyset cursors, which stay valid when files are added"""
+        lb = LabBook(fixture_working_dir[0])
+        lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+        os.makedirs(os.path.join(lb.root_dir, 'code', 'src'))
+        for i in range(5):
+            with open(os.path.join(lb.root_dir, 'code', 'src', f"file{i}.txt"), 'wt') as tf:
+                tf.write("data")
+
+        query = """
+                    query PageFiles($after: String) {
+                      labbook(name: "labbook1", owner: "default") {
+                        code {
+                            allFiles(first: 2, after: $after) {
+                                edges {
+                                    node {
+                                        key
+                                    }
+                                    cursor
+                                }
+                                pageInfo {
+                                    hasNextPage
+                                    endCursor
+                                }
+                            }
+                        }
+                      }
+                    }
+                    """
+        r = fixture_working_dir[2].execute(query)
+        assert 'errors' not in r
+        page = r['data']['labbook']['code']['allFiles']
+        assert [e['node']['key'] for e in page['edges']] == ['src/', 'src/file0.txt']
+        assert page['pageInfo']['hasNextPage'] is True
+
+        # A file added before the cursor does not shift the next page
+        with open(os.path.join(lb.root_dir, 'code', 'src', "a.txt"), 'wt') as tf:
+            tf.write("data")
+
+        r = fixture_working_dir[2].execute(query, variable_values={"after": page['pageInfo']['endCursor']})
+        assert 'errors' not in r
+        page = r['data']['labbook']['code']['allFiles']
+        assert [e['node']['key'] for e in page['edges']] == ['src/file1.txt', 'src/file2.txt']
+
+        r = fixture_working_dir[2].execute(query, variable_values={"after": page['pageInfo']['endCursor']})
+        page = r['data']['labbook']['code']['allFiles']
+        assert [e['node']['key'] for e in page['edges']] == ['src/file3.txt', 'src/file4.txt']
+        assert page['pageInfo']['hasNextPage'] is False
+
+    def test_total_count(self, fixture_working_dir):
+        """Test totalCount reports the size of the whole connection, whatever the page size"""
+        lb = LabBook(fixture_working_dir[0])
+        lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+        os.makedirs(os.path.join(lb.root_dir, 'code', 'src'))
+        for i in range(5):
+            with open(os.path.join(lb.root_dir, 'code', 'src', f"file{i}.txt"), 'wt') as tf:
+                tf.write("data")
+        with open(os.path.join(lb.root_dir, 'code', ".hidden_file.txt"), 'wt') as tf:
+            tf.write("Should be hidden")
+        lb.create_favorite('code', 'src/file0.txt', description="Favorite")
+
+        query = """
+                    {
+                      labbook(name: "labbook1", owner: "default") {
+                        code {
+                            files(first: 1) {
+                                totalCount
+                            }
+                            srcFiles: files(rootDir: "src", first: 1) {
+                                totalCount
+                            }
+                            allFiles(first: 1) {
+                                totalCount
+                                edges {
+                                    cursor
+                                }
+                            }
+                            favorites(first: 1) {
+                                totalCount
+                            }
+                        }
+                        branches(first: 1) {
+                            totalCount
+                        }
+                      }
+                    }
+                    """
+        r = fixture_working_dir[2].execute(query)
+        assert 'errors' not in r
+        code = r['data']['labbook']['code']
+        assert code['files']['totalCount'] == 1
+        assert code['srcFiles']['totalCount'] == 5
+        assert code['allFiles']['totalCount'] == 6
+        assert len(code['allFiles']['edges']) == 1
+        assert code['favorites']['totalCount'] == 1
+        assert r['data']['labbook']['branches']['totalCount'] == len(lb.git.repo.refs)
+
+    def test_filter_and_sort_files(self, fixture_working_dir):
+        """Test files and allFiles can be filtered and sorted, and page through the sorted result"""
+        lb = LabBook(fixture_working_dir[0])
+        lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+        os.makedirs(os.path.join(lb.root_dir, 'code', 'src'))
+        for name, size in [("a.py", 30), ("b.py", 10), ("c.txt", 20), ("data.csv", 40)]:
+            with open(os.path.join(lb.root_dir, 'code', 'src', name), 'wt') as tf:
+                tf.write("x" * size)
+
+        query = """
+                    query FilterFiles($after: String) {
+                      labbook(name: "labbook1", owner: "default") {
+                        code {
+                            allFiles(extensions: ["py", "csv"], orderBy: "size", sort: "desc", first: 2,
+                                     after: $after) {
+                                totalCount
+                                edges {
+                                    node {
+                                        key
+                                    }
+                                }
+                                pageInfo {
+                                    hasNextPage
+                                    endCursor
+                                }
+                            }
+                            files(rootDir: "src", nameContains: "A", minSize: 15) {
+                                edges {
+                                    node {
+                                        key
+                                    }
+                                }
+                            }
+                            dirs: allFiles(dirsOnly: true) {
+                                edges {
+                                    node {
+                                        key
+                                    }
+                                }
+                            }
+                        }
+                      }
+                    }
+                    """
+        r = fixture_working_dir[2].execute(query)
+        assert 'errors' not in r
+        code = r['data']['labbook']['code']
+        assert code['allFiles']['totalCount'] == 3
+        assert [e['node']['key'] for e in code['allFiles']['edges']] == ['src/data.csv', 'src/a.py']
+        assert code['allFiles']['pageInfo']['hasNextPage'] is True
+        assert [e['node']['key'] for e in code['files']['edges']] == ['src/a.py', 'src/data.csv']
+        assert [e['node']['key'] for e in code['dirs']['edges']] == ['src/']
+
+        r = fixture_working_dir[2].execute(query,
+                                           variable_values={"after": code['allFiles']['pageInfo']['endCursor']})
+        assert 'errors' not in r
+        page = r['data']['labbook']['code']['allFiles']
+        assert [e['node']['key'] for e in page['edges']] == ['src/b.py']
+        assert page['pageInfo']['hasNextPage'] is False
+
+    def test_sort_files_by_modified_at(self, fixture_working_dir):
+        """Test files are sorted by modifiedAt and filtered with a negated glob"""
+        lb = LabBook(fixture_working_dir[0])
+        lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+        for name, mtime in [("a.txt", 3000), ("b.txt", 1000), ("c.txt", 2000), ("skip.txt", 4000)]:
+            file_path = os.path.join(lb.root_dir, 'code', name)
+            with open(file_path, 'wt') as tf:
+                tf.write("data")
+            os.utime(file_path, (mtime, mtime))
+
+        query = """
+                    {
+                      labbook(name: "labbook1", owner: "default") {
+                        code {
+                            files(glob: "[!s]*", orderBy: "modifiedAt") {
+                                edges {
+                                    node {
+                                        key
+                                        modifiedAt
+                                    }
+                                }
+                            }
+                            newest: allFiles(orderBy: "modifiedAt", sort: "desc", first: 1) {
+                                edges {
+                                    node {
+                                        key
+                                    }
+                                }
+                            }
+                        }
+                      }
+                    }
+                    """
+        r = fixture_working_dir[2].execute(query)
+        assert 'errors' not in r
+        code = r['data']['labbook']['code']
+        assert [e['node']['key'] for e in code['files']['edges']] == ['b.txt', 'c.txt', 'a.txt']
+        assert [e['node']['modifiedAt'] for e in code['files']['edges']] == [1000, 2000, 3000]
+        assert [e['node']['key'] for e in code['newest']['edges']] == ['skip.txt']
+
+        r = fixture_working_dir[2].execute(query.replace('"modifiedAt", sort', '"modified_at", sort'))
+        assert 'errors' in r
+
     def test_get_activity_records_next_page(self, fixture_working_dir_env_repo_scoped, snapshot, fixture_test_file):
         """Test next page logic, which requires a labbook to be created properly with an activity"""
         # Create labbook
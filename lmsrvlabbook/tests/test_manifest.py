@@ -0,0 +1,87 @@
+# Copyright (c) 2018 FlashX, LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import json
+import os
+
+import flask
+import pytest
+from mock import patch
+
+from lmcommon.files import FileOperations
+from lmcommon.labbook import LabBook
+from lmsrvcore.middleware import AuthorizationMiddleware
+from lmsrvlabbook.tests.fixtures import fixture_working_dir
+
+from lmsrvlabbook.files.manifest import manifest_lines, section_manifest
+
+
+@pytest.fixture
+def manifest_client(fixture_working_dir):
+    """A Flask test client with the manifest route, and a LabBook with files in the code section"""
+    lb = LabBook(fixture_working_dir[0])
+    lb.new(owner={"username": "default"}, name="labbook1", description="my first labbook1")
+    os.makedirs(os.path.join(lb.root_dir, 'code', 'src'))
+    for i in range(20):
+        with open(os.path.join(lb.root_dir, 'code', 'src', f"file{i:02d}.py"), 'wt') as f:
+            f.write("x" * i)
+    with open(os.path.join(lb.root_dir, 'code', '.hidden'), 'wt') as f:
+        f.write("hidden")
+
+    app = flask.current_app
+    app.add_url_rule('/manifest/<owner>/<labbook_name>/<section>', view_func=section_manifest)
+    with patch.object(AuthorizationMiddleware, 'authenticate', lambda self, context: None):
+        yield app.test_client(), lb
+
+
+class TestManifest(object):
+    def test_manifest_lines(self):
+        """Test entries are written one per line, buffered into blocks"""
+        edges = [{"key": f"file{i}", "size": i, "modified_at": 1.5, "is_dir": False, "is_favorite": False}
+                 for i in range(100)]
+        blocks = list(manifest_lines(iter(edges), write_size=200))
+        assert len(blocks) > 1
+        lines = "".join(blocks).splitlines()
+        assert [json.loads(line) for line in lines] == \
+            [{"key": f"file{i}", "size": i, "modified_at": 1.5, "is_dir": False} for i in range(100)]
+
+    def test_manifest(self, manifest_client):
+        """Test the manifest lists the same entries, in the same order, as a walk of the section"""
+        client, lb = manifest_client
+        response = client.get('/manifest/default/labbook1/code')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+
+        entries = [json.loads(line) for line in response.data.decode().splitlines()]
+        expected = FileOperations.walkdir(lb, section='code', show_hidden=False)
+        assert [(e['key'], e['is_dir']) for e in entries] == [(e['key'], e['is_dir']) for e in expected]
+        assert entries[1] == {"key": "src/file00.py", "size": 0, "modified_at": entries[1]['modified_at'],
+                              "is_dir": False}
+
+        # Resume after a key
+        response = client.get('/manifest/default/labbook1/code?after=src/file17.py')
+        assert [json.loads(line)['key'] for line in response.data.decode().splitlines()] == \
+            ['src/file18.py', 'src/file19.py']
+
+    def test_invalid(self, manifest_client):
+        """Test unsupported sections and invalid resume keys are rejected before streaming"""
+        client, lb = manifest_client
+        assert client.get('/manifest/default/labbook1/secrets').status_code == 400
+        assert client.get('/manifest/default/labbook1/code?after=/').status_code == 400
+        assert client.get('/manifest/default/labbook2/code').status_code == 404
@@ -11,6 +11,7 @@ from werkzeug.datastructures import FileStorage
 from lmcommon.labbook import LabBook
 from lmcommon.files import FileOperations
 from lmcommon.fixtures import remote_labbook_repo, mock_config_file
+from lmsrvcore.api.mutations import ChunkUploadMutation
 from lmsrvcore.middleware import LabBookLoaderMiddleware
 from lmsrvlabbook.tests.fixtures import fixture_working_dir_env_repo_scoped, fixture_working_dir
 
@@ -105,6 +106,9 @@ class TestUploadFilesMutations(object):
                             }}
                             """
                 r = client.execute(query, context_value=DummyContext(file))
+                if chunk_index == 0:
+                    staged_inode = os.stat(ChunkUploadMutation.get_temp_filename("fdsfdsfdsfdfs",
+                                                                                 "myValidFile.dat")).st_ino
         assert 'errors' not in r
         # So, these will only be populated once the last chunk is uploaded. Will be None otherwise.
         assert r['data']['addLabbookFile']['newLabbookFileEdge']['node']['isDir'] is False
@@ -113,6 +117,8 @@ class TestUploadFilesMutations(object):
         # When done uploading, file should exist in the labbook
         assert os.path.exists(target_file)
         assert os.path.isfile(target_file)
+        # The staged file was renamed into place, not copied
+        assert os.stat(target_file).st_ino == staged_inode
 
         complete_query = f"""
         mutation completeQuery {{
@@ -23,7 +23,7 @@ import base64
 import subprocess
 
 from confhttpproxy import ProxyRouter
-from flask import Flask, jsonify, request, abort
+from flask import Flask, jsonify, request, abort, Response
 import flask
 from flask_cors import CORS, cross_origin
 import redis
@@ -37,6 +37,14 @@ from lmcommon.auth.identity import AuthenticationError, get_identity_manager
 from lmcommon.labbook.lock import reset_all_locks
 from lmcommon.labbook import LabBook
 from lmsrvcore.auth.user import get_logged_in_author
+from lmsrvcore.api.mutations import upload_staging
+from lmsrvcore.auth.cache import token_cache
+from lmsrvcore.middleware import resolver_profiler
+from lmsrvlabbook.dataloader.labbook import labbook_cache
+from lmsrvlabbook.dataloader.repository import repository_pool
+from lmsrvlabbook.dataloader.fileindex import file_index_manager
+from lmsrvlabbook.dataloader.contenthash import content_hash_cache
+from lmsrvlabbook.dataloader.favorites import favorites_cache
 
 
 logger = LMLogger.get_logger()
@@ -89,6 +97,27 @@ def ping():
     return jsonify(config.config['build_info'])
 
 
+def _render_stats(prefix: str, stats: dict) -> str:
+    """Render a flat dictionary of counters as untyped Prometheus samples"""
+    return "".join([f"{prefix}_{k} {v}\n" for k, v in stats.items()])
+
+
+# Unauth'd route for scraping resolver latency histograms and cache statistics
+@app.route(f"{api_prefix}/metrics")
+def metrics():
+    """Endpoint exposing process metrics in the Prometheus text exposition format"""
+    body = resolver_profiler.render_prometheus()
+    body += _render_stats("labmanager_labbook_cache", labbook_cache.stats())
+    body += _render_stats("labmanager_repository_pool", repository_pool.stats())
+    body += _render_stats("labmanager_document_cache", blueprint.document_backend.stats())
+    body += _render_stats("labmanager_token_cache", token_cache.stats())
+    body += _render_stats("labmanager_file_index", file_index_manager.stats())
+    body += _render_stats("labmanager_content_hash", content_hash_cache.stats())
+    body += _render_stats("labmanager_favorites_cache", favorites_cache.stats())
+    body += _render_stats("labmanager_upload_staging", upload_staging.stats())
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+
 @app.route(f'{api_prefix}/savehook/<username>/<owner>/<labbook_name>')
 def savehook(username, owner, labbook_name):
     try:
@@ -126,21 +155,17 @@ def savehook(username, owner, labbook_name):
         return abort(400)
 
 
-# TEMPORARY KLUDGE
-# Due to GitPython implementation, resources leak. This block deletes all GitPython instances at the end of the request
-# Future work will remove GitPython, at which point this block should be removed.
-@app.after_request
-def cleanup_git(response):
-    loader = getattr(flask.request, 'labbook_loader', None)
-    if loader:
-        for key in loader.__dict__["_promise_cache"]:
-            try:
-                lb = loader.__dict__["_promise_cache"][key].value
-                lb.git.repo.__del__()
-            except AttributeError:
-                continue
-    return response
-# TEMPORARY KLUDGE
+# GitPython handles leak file descriptors and `git cat-file` subprocesses if never closed. Rather than destroying every
+# handle at the end of each request, handles are borrowed from a process-wide pool and returned here. Idle handles are
+# closed once they exceed the pool's idle timeout or size limit. Cached LabBook instances checked out to the request
+# are returned here too.
+@app.teardown_request
+def release_git_repositories(exception=None):
+    try:
+        labbook_cache.release_request()
+        repository_pool.release_request()
+    except Exception as e:
+        logger.exception(e)
 
 
 logger.info("Cloning/Updating environment repositories.")
@@ -192,6 +217,10 @@ with open(os.path.join(share_dir, 'jupyterhooks', '__init__.py'), 'w') as initpy
     initpy.write(post_save_hook_code)
 
 
+# Remove abandoned chunked uploads now and periodically, so failed uploads can not fill the disk
+logger.info("Starting upload staging reaper")
+upload_staging.start_reaper()
+
 # Reset distributed lock, if desired
 if config.config["lock"]["reset_on_start"]:
     logger.info("Resetting ALL distributed locks")